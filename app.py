@@ -1,9 +1,27 @@
+import time
+_startup_begin = time.perf_counter()
+
 import os
+import gc
 import logging
+from contextlib import contextmanager
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config
+
+# Seconds spent per startup phase, and on the first use of lazily built services; see /api/system-stats
+startup_timings = {'imports': round(time.perf_counter() - _startup_begin, 4)}
+
+@contextmanager
+def startup_phase(name: str):
+    """Record how long a startup phase takes in startup_timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[name] = round(time.perf_counter() - start, 4)
 
 # Configure logging for debug mode
 logging.basicConfig(level=logging.DEBUG)
@@ -38,10 +56,30 @@ os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 with app.app_context():
     # Import models to ensure tables are created
     import models  # noqa: F401
-    db.create_all()
+    if Config.AUTO_CREATE_TABLES:
+        with startup_phase('create_tables'):
+            db.create_all()
     
     # Import and register routes
-    import routes  # noqa: F401
+    with startup_phase('routes'):
+        import routes  # noqa: F401
+    
+    # Register CLI commands (flask --app main <command>)
+    import commands  # noqa: F401
+    
+    if Config.PRELOAD_INDEX:
+        # Under gunicorn --preload this runs once in the master, and forked workers share the loaded index
+        with startup_phase('preload_index'):
+            from services.document_processor import get_document_processor
+            get_document_processor()
+        # Move everything loaded so far out of the collector's reach, so workers' GC passes don't copy its pages
+        gc.freeze()
+
+    # Close the connections opened above; under gunicorn --preload, forked workers would share their sockets
+    db.engine.dispose()
+
+startup_timings['total'] = round(time.perf_counter() - _startup_begin, 4)
+logging.info(f"Startup timings (s): {startup_timings}")
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,139 @@
+"""Benchmark memory held per indexed chunk: column-wise ChunkColumns against dicts.
+
+Writes a synthetic index file, then loads it twice under tracemalloc: as
+the dict-per-chunk layout the store used to keep (json.load of the file),
+and through VectorStore, which keeps chunks in ChunkColumns. Reports bytes
+per chunk for each, the store's own memory_usage() estimate, and search
+latency for each layout.
+
+    python -m benchmarks.bench_memory --chunks 100000
+"""
+import os
+import gc
+import json
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+from benchmarks.common import setup_environment, percentiles, peak_rss_bytes, run_metadata, write_report
+from benchmarks.bench_pipeline import build_vocabulary, PARAGRAPH_WORDS
+
+
+def write_index(path: str, chunks: int, chunks_per_document: int, rng: random.Random, words, weights):
+    """Write an index file in the VectorStore format, with the metadata DocumentProcessor stores"""
+    from utils.similarity import simhash
+
+    documents = {}
+    for index in range(chunks):
+        document_id = index // chunks_per_document + 1
+        chunk_index = index % chunks_per_document
+        content = ' '.join(rng.choices(words, weights, k=PARAGRAPH_WORDS))
+        documents[f"doc_{document_id}_chunk_{chunk_index}"] = {
+            'content': content,
+            'metadata': {
+                'document_id': document_id,
+                'chunk_index': chunk_index,
+                'page_number': chunk_index // 3 + 1,
+                'paragraph_number': chunk_index + 1,
+                'document_filename': f"quarterly_report_{document_id:06d}.pdf",
+                'file_type': 'pdf',
+                'uploaded_at': f"2024-{document_id % 12 + 1:02d}-01T09:30:00.{document_id:06d}",
+                'simhash': simhash(content)
+            }
+        }
+    with open(path, 'w') as f:
+        json.dump({'documents': documents}, f)
+
+
+def measure(load):
+    """Bytes still allocated after load() returns, and its result"""
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def time_searches(search, questions):
+    latencies = []
+    for question in questions:
+        start = time.perf_counter()
+        search(question)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--chunks-per-document', type=int, default=50)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--queries', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work-dir', help='directory for the index file (default: temporary)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='membench_')
+    setup_environment(work_dir)
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    from services.vector_store import VectorStore
+
+    rng = random.Random(args.seed)
+    words, weights = build_vocabulary(rng, args.vocabulary)
+    index_file = os.path.join(work_dir, 'vector_store.json')
+    write_index(index_file, args.chunks, args.chunks_per_document, rng, words, weights)
+    head = words[:max(10, len(words) // 2)]
+    questions = [' '.join(rng.choices(head, weights[:len(head)], k=3)) for _ in range(args.queries)]
+
+    def load_dicts():
+        with open(index_file) as f:
+            return json.load(f)['documents']
+
+    dict_bytes, documents = measure(load_dicts)
+    scorer = VectorStore.__new__(VectorStore)
+
+    def search_dicts(question):
+        # The former VectorStore.search loop over dict-per-chunk storage
+        query = question.lower()
+        results = [(scorer._calculate_relevance_score(query, doc_data['content'].lower()), vector_id)
+                   for vector_id, doc_data in documents.items()]
+        return sorted((result for result in results if result[0] > 0), reverse=True)[:60]
+
+    dict_search = time_searches(search_dicts, questions)
+    del documents
+
+    column_bytes, store = measure(lambda: VectorStore(index_file))
+    column_search = time_searches(lambda question: store.search(question, limit=60), questions)
+    estimate = store.memory_usage()
+
+    write_report({
+        'benchmark': 'memory',
+        'metadata': run_metadata(),
+        'parameters': vars(args),
+        'work_dir': work_dir,
+        'chunks': len(store.documents),
+        'dict_layout': {
+            'bytes': dict_bytes,
+            'bytes_per_chunk': round(dict_bytes / args.chunks, 1),
+            'search_latency': dict_search
+        },
+        'column_layout': {
+            'bytes': column_bytes,
+            'bytes_per_chunk': round(column_bytes / args.chunks, 1),
+            'estimated_bytes': estimate,
+            'search_latency': column_search
+        },
+        'reduction': round(dict_bytes / column_bytes, 2) if column_bytes else None,
+        'peak_rss_bytes': peak_rss_bytes()
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Offline benchmark for the ingestion and query paths.
+
+Generates a synthetic corpus, ingests it through DocumentProcessor and runs
+queries through AIService.process_query against a deterministic fake LLM, then
+prints a JSON report (throughput, p50/p95/p99 latency, peak RSS).
+
+    python -m benchmarks.bench_pipeline --chunks 1000 --queries 50 --output run.json
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.common import setup_environment, percentiles, peak_rss_bytes, run_metadata, write_report
+
+# ~900 characters per paragraph so each paragraph becomes one chunk at CHUNK_SIZE=1000
+PARAGRAPH_WORDS = 140
+
+
+def build_vocabulary(rng: random.Random, size: int):
+    """Pseudo-words with Zipf-like frequencies, so queries hit realistic posting sizes"""
+    syllables = ['ka', 'lo', 'mi', 'ren', 'tus', 'vo', 'shi', 'pra', 'den', 'gal', 'or', 'nex']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    words = sorted(words)
+    weights = [1.0 / (rank + 1) for rank in range(len(words))]
+    return words, weights
+
+
+def generate_corpus(directory: str, chunks: int, chunks_per_document: int, rng: random.Random,
+                    words, weights):
+    """Write synthetic text documents; returns their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    document_count = max(1, (chunks + chunks_per_document - 1) // chunks_per_document)
+    remaining = chunks
+    for doc_index in range(document_count):
+        paragraph_count = min(chunks_per_document, remaining)
+        remaining -= paragraph_count
+        paragraphs = [' '.join(rng.choices(words, weights, k=PARAGRAPH_WORDS)) for _ in range(paragraph_count)]
+        path = os.path.join(directory, f"synthetic_{doc_index:06d}.txt")
+        with open(path, 'w') as f:
+            f.write('\n\n'.join(paragraphs))
+        paths.append(path)
+    return paths
+
+
+def run_ingest(app, db, paths, document_processor):
+    from models import Document
+
+    latencies = []
+    chunk_count = 0
+    start = time.perf_counter()
+    with app.app_context():
+        for path in paths:
+            document = Document(
+                filename=os.path.basename(path),
+                original_filename=os.path.basename(path),
+                file_path=path,
+                file_type='text',
+                file_size=os.path.getsize(path),
+                processing_status='pending'
+            )
+            db.session.add(document)
+            db.session.commit()
+
+            doc_start = time.perf_counter()
+            document_processor.process_document(document.id)
+            latencies.append(time.perf_counter() - doc_start)
+        chunk_count = len(document_processor.vector_store.documents)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'documents': len(paths),
+        'chunks': chunk_count,
+        'elapsed_s': round(elapsed, 3),
+        'documents_per_s': round(len(paths) / elapsed, 3) if elapsed else None,
+        'chunks_per_s': round(chunk_count / elapsed, 3) if elapsed else None,
+        'document_latency': percentiles(latencies)
+    }
+
+
+def run_queries(app, ai_service, questions):
+    from services.tracing import QueryTrace
+
+    query_latencies = []
+    retrieval_latencies = []
+    stage_samples = {}
+    answer_counts = []
+    start = time.perf_counter()
+    with app.app_context():
+        for question in questions:
+            retrieval_start = time.perf_counter()
+            ai_service.document_processor.search_similar_chunks(question)
+            retrieval_latencies.append(time.perf_counter() - retrieval_start)
+
+            trace = QueryTrace()
+            query_start = time.perf_counter()
+            with trace.activate():
+                answers, _ = ai_service.process_query(question)
+            query_latencies.append(time.perf_counter() - query_start)
+            answer_counts.append(len(answers))
+
+            for name, stage in trace.to_dict()['stages'].items():
+                stage_samples.setdefault(name, []).append(stage['total_ms'] / 1000.0)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'queries': len(questions),
+        'elapsed_s': round(elapsed, 3),
+        'queries_per_s': round(len(questions) / elapsed, 3) if elapsed else None,
+        'latency': percentiles(query_latencies),
+        'retrieval_latency': percentiles(retrieval_latencies),
+        'stage_latency': {name: percentiles(samples) for name, samples in sorted(stage_samples.items())},
+        'mean_answers': round(sum(answer_counts) / len(answer_counts), 2) if answer_counts else 0,
+        'llm_calls': ai_service.client.calls
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=1000, help='synthetic corpus size in chunks (1k-1M)')
+    parser.add_argument('--chunks-per-document', type=int, default=50)
+    parser.add_argument('--vocabulary', type=int, default=5000, help='distinct synthetic words')
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--query-words', type=int, default=3)
+    parser.add_argument('--latency-ms', type=float, default=200.0, help='fake LLM base latency per call')
+    parser.add_argument('--jitter-ms', type=float, default=50.0, help='fake LLM deterministic jitter range')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work-dir', help='directory for the corpus, database and index (default: temporary)')
+    parser.add_argument('--database-url', help='database to use instead of a fresh SQLite file, '
+                                               'e.g. a disposable local PostgreSQL')
+    parser.add_argument('--skip-queries', action='store_true')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='docbench_')
+    setup_environment(work_dir, args.database_url)
+
+    import logging
+    from app import app, db
+    logging.getLogger().setLevel(logging.WARNING)
+    from services.document_processor import DocumentProcessor
+    from benchmarks.fake_llm import FakeLLMClient, FakeAIService
+
+    rng = random.Random(args.seed)
+    words, weights = build_vocabulary(rng, args.vocabulary)
+
+    corpus_start = time.perf_counter()
+    paths = generate_corpus(os.path.join(work_dir, 'corpus'), args.chunks, args.chunks_per_document,
+                            rng, words, weights)
+    corpus_elapsed = time.perf_counter() - corpus_start
+
+    document_processor = DocumentProcessor()
+    report = {
+        'benchmark': 'pipeline',
+        'metadata': run_metadata(),
+        'parameters': vars(args),
+        'work_dir': work_dir,
+        'corpus_generation_s': round(corpus_elapsed, 3),
+        'ingest': run_ingest(app, db, paths, document_processor)
+    }
+
+    if not args.skip_queries:
+        client = FakeLLMClient(args.latency_ms, args.jitter_ms)
+        ai_service = FakeAIService(document_processor, client, os.path.join(work_dir, 'rate_limiter.json'))
+        # Draw query words from the frequent half of the vocabulary so queries match chunks
+        head = words[:max(10, len(words) // 2)]
+        questions = [' '.join(rng.choices(head, weights[:len(head)], k=args.query_words))
+                     for _ in range(args.queries)]
+        report['query'] = run_queries(app, ai_service, questions)
+
+    report['peak_rss_bytes'] = peak_rss_bytes()
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Benchmark search latency of the sharded vector store against shard count.
+
+Builds one synthetic chunk corpus, loads it into a VectorStore and into
+ShardedVectorStores with each requested shard count, checks that every layout
+returns the same top scores, and prints a JSON report of per-query latency.
+Shards are searched from threads; scoring holds the GIL, so the fan-out buys
+concurrency with writes to other shards more than speed.
+
+    python -m benchmarks.bench_shards --chunks 200000 --shards 1,2,4,8 --queries 30
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.common import setup_environment, percentiles, peak_rss_bytes, run_metadata, write_report
+from benchmarks.bench_pipeline import build_vocabulary, PARAGRAPH_WORDS
+
+
+def build_items(chunks: int, chunks_per_document: int, rng: random.Random, words, weights):
+    """(content, metadata) pairs shaped like DocumentProcessor's"""
+    items = []
+    for index in range(chunks):
+        document_id = index // chunks_per_document + 1
+        items.append((' '.join(rng.choices(words, weights, k=PARAGRAPH_WORDS)), {
+            'document_id': document_id,
+            'chunk_index': index % chunks_per_document,
+            'page_number': 1,
+            'paragraph_number': index % chunks_per_document + 1,
+            'document_filename': f"synthetic_{document_id:06d}.txt",
+            'file_type': 'text',
+            'uploaded_at': None
+        }))
+    return items
+
+
+def run_layout(store, questions, limit: int):
+    """Time each question once, after a warm-up query (which starts the shard search threads)"""
+    warm_start = time.perf_counter()
+    store.search(questions[0], limit=limit)
+    warm_up = time.perf_counter() - warm_start
+
+    latencies = []
+    top_scores = []
+    for question in questions:
+        start = time.perf_counter()
+        results = store.search(question, limit=limit)
+        latencies.append(time.perf_counter() - start)
+        top_scores.append([result['score'] for result in results])
+    return {'warm_up_s': round(warm_up, 3), 'latency': percentiles(latencies)}, top_scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--chunks-per-document', type=int, default=50)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--shards', default='1,2,4', help='comma-separated shard counts; 1 is the unsharded store')
+    parser.add_argument('--sequential', action='store_true', help='search shards one after another, without threads')
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--query-words', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=60, help='results per search (MAX_DOCUMENTS_PER_QUERY x pool)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--work-dir', help='directory for the shard files (default: temporary)')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='shardbench_')
+    setup_environment(work_dir)
+
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    from config import Config
+    from services.vector_store import VectorStore, ShardedVectorStore
+    Config.VECTOR_STORE_SEARCH_THREADS = not args.sequential
+
+    rng = random.Random(args.seed)
+    words, weights = build_vocabulary(rng, args.vocabulary)
+    items = build_items(args.chunks, args.chunks_per_document, rng, words, weights)
+    head = words[:max(10, len(words) // 2)]
+    questions = [' '.join(rng.choices(head, weights[:len(head)], k=args.query_words)) for _ in range(args.queries)]
+
+    report = {
+        'benchmark': 'shards',
+        'metadata': run_metadata(),
+        'parameters': vars(args),
+        'work_dir': work_dir,
+        'layouts': {}
+    }
+    baseline_scores = None
+    baseline_p50 = None
+
+    for shard_count in [int(value) for value in args.shards.split(',') if value.strip()]:
+        # A directory per layout, so no run reshards another's files
+        Config.CHROMA_PERSIST_DIRECTORY = os.path.join(work_dir, f"index_{shard_count}")
+        load_start = time.perf_counter()
+        store = VectorStore() if shard_count == 1 else ShardedVectorStore(shard_count)
+        store.add_documents(items)
+        load_elapsed = time.perf_counter() - load_start
+
+        result, top_scores = run_layout(store, questions, args.limit)
+        result['load_s'] = round(load_elapsed, 3)
+        if baseline_scores is None:
+            baseline_scores = top_scores
+            baseline_p50 = result['latency']['p50_ms']
+        result['same_top_scores'] = top_scores == baseline_scores
+        result['speedup_p50'] = round(baseline_p50 / result['latency']['p50_ms'], 2) if result['latency']['p50_ms'] else None
+        report['layouts'][str(shard_count)] = result
+
+    report['peak_rss_bytes'] = peak_rss_bytes()
+    write_report(report, args.output)
+
+
+if __name__ == '__main__':
+    main()
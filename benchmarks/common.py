@@ -0,0 +1,81 @@
+import os
+import sys
+import json
+import math
+import time
+import resource
+import platform
+import subprocess
+from typing import Dict, List
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_environment(work_dir: str, database_url: str = None):
+    """Point the app at an isolated database and storage directory.
+
+    Must run before ``app``/``config`` are imported, since they read the
+    environment at import time.
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    os.environ['DATABASE_URL'] = database_url or f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}"
+    os.environ['CHROMA_PERSIST_DIRECTORY'] = os.path.join(work_dir, 'index')
+    os.environ['RATE_LIMIT_STATE_FILE'] = os.path.join(work_dir, 'rate_limiter.json')
+    os.environ['METRICS_DIR'] = os.path.join(work_dir, 'metrics')
+    # routes.py builds an AIService at import; the benchmark replaces it with the fake provider
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark-fake-key')
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """Summarize latency samples (seconds) as milliseconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+
+    def pick(p):
+        # Nearest-rank percentile
+        index = min(len(ordered) - 1, max(0, math.ceil(p / 100.0 * len(ordered)) - 1))
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': pick(50),
+        'p95_ms': pick(95),
+        'p99_ms': pick(99),
+        'max_ms': round(ordered[-1] * 1000, 3)
+    }
+
+
+def peak_rss_bytes() -> int:
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run_metadata() -> Dict[str, str]:
+    """Identify the code and machine a result came from, so runs can be compared"""
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                           stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = 'unknown'
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_revision': revision,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def write_report(report: Dict, output: str = None):
+    """Write a JSON report to a file, or stdout when no path is given"""
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
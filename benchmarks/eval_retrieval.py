@@ -0,0 +1,330 @@
+"""Retrieval quality/speed evaluation over a labeled question set.
+
+Sweeps CHUNK_SIZE, the scoring function, MAX_DOCUMENTS_PER_QUERY (k) and
+SIMILARITY_THRESHOLD over the VectorStore search and diversification used by
+search_similar_chunks (--diversification overrides DIVERSIFICATION_STRATEGY),
+and reports recall@k, MRR, search latency and the number of chunks that would
+be sent to the LLM (one answer-extraction call each) per configuration.
+
+    python -m benchmarks.eval_retrieval --corpus-dir docs/ --labels labels.jsonl \\
+        --chunk-sizes 500,1000,2000 --limits 5,10,20 --thresholds 0.3,0.5,0.7 --target-recall 0.9
+
+Labels are JSON lines; a relevant chunk is identified by its document file name
+and a piece of text it contains, so labels stay valid across chunk sizes:
+
+    {"question": "...", "relevant": [{"document": "report.txt", "text": "quoted evidence"}]}
+
+Run with --synthetic N instead of --corpus-dir/--labels for a generated corpus.
+"""
+import os
+import re
+import math
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+
+from benchmarks.common import setup_environment, percentiles, run_metadata, write_report
+
+WORD_RE = re.compile(r'\b\w+\b')
+
+
+def normalize(text: str) -> str:
+    return ' '.join(text.lower().split())
+
+
+def parse_list(value: str, cast):
+    return [cast(item) for item in value.split(',') if item.strip()]
+
+
+def load_corpus(corpus_dir: str) -> Dict[str, str]:
+    """Read every text file in a directory, keyed by file name"""
+    from utils.file_utils import extract_text_from_txt
+
+    corpus = {}
+    for name in sorted(os.listdir(corpus_dir)):
+        path = os.path.join(corpus_dir, name)
+        if os.path.isfile(path) and name.rsplit('.', 1)[-1].lower() in ('txt', 'md', 'text'):
+            corpus[name] = extract_text_from_txt(path)
+    return corpus
+
+
+def load_labels(path: str) -> List[Dict]:
+    import json
+
+    labels = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if not entry.get('question') or not entry.get('relevant'):
+                raise ValueError(f"{path}:{line_number}: 'question' and 'relevant' are required")
+            labels.append(entry)
+    return labels
+
+
+def synthetic_dataset(questions: int, documents: int, paragraphs: int, seed: int):
+    """Generated corpus plus questions drawn from a contiguous window of one paragraph"""
+    from benchmarks.bench_pipeline import build_vocabulary, PARAGRAPH_WORDS
+
+    rng = random.Random(seed)
+    words, weights = build_vocabulary(rng, 5000)
+    corpus = {}
+    for doc_index in range(documents):
+        corpus[f"synthetic_{doc_index:06d}.txt"] = '\n\n'.join(
+            ' '.join(rng.choices(words, weights, k=PARAGRAPH_WORDS)) for _ in range(paragraphs)
+        )
+
+    names = sorted(corpus)
+    labels = []
+    for _ in range(questions):
+        name = rng.choice(names)
+        paragraph = rng.choice(corpus[name].split('\n\n')).split()
+        start = rng.randrange(0, len(paragraph) - 8)
+        window = paragraph[start:start + 8]
+        labels.append({
+            'question': ' '.join(rng.sample(window, 3)),
+            'relevant': [{'document': name, 'text': ' '.join(window)}]
+        })
+    return corpus, labels
+
+
+def make_store(scorer: str):
+    """VectorStore whose relevance score is replaced by the named scoring function"""
+    from services.vector_store import VectorStore
+
+    class EvalVectorStore(VectorStore):
+        def __init__(self):
+            super().__init__()
+            self.scorer = scorer
+            self.idf = {}
+
+        def build_idf(self):
+            document_frequency = {}
+            for doc_data in self.documents.values():
+                for word in set(WORD_RE.findall(doc_data['content'].lower())):
+                    document_frequency[word] = document_frequency.get(word, 0) + 1
+            total = len(self.documents)
+            self.idf = {word: math.log(1 + total / count) for word, count in document_frequency.items()}
+
+        def _score_rows(self, query_words, partial_terms, rows):
+            if self.scorer == 'keyword':
+                # The keyword index computes the keyword score without reading chunk text
+                return super()._score_rows(query_words, partial_terms, rows)
+            query = ' '.join(query_words)
+            scored = []
+            for row, content in self.documents.contents(rows):
+                score = self._calculate_relevance_score(query, content.lower())
+                if score > 0:
+                    scored.append((score, row))
+            return scored
+
+        def _calculate_relevance_score(self, query: str, content: str) -> float:
+            if self.scorer == 'keyword':
+                return super()._calculate_relevance_score(query, content)
+
+            query_words = set(WORD_RE.findall(query.lower()))
+            if not query_words:
+                return 0.0
+            content_words = set(WORD_RE.findall(content.lower()))
+            matched = query_words & content_words
+            if self.scorer == 'exact':
+                # Keyword overlap without the partial-substring fallback
+                return len(matched) / len(query_words)
+            # 'idf': overlap weighted by word rarity, so common words count for less
+            default_idf = math.log(1 + len(self.documents))
+            total = sum(self.idf.get(word, default_idf) for word in query_words)
+            return sum(self.idf.get(word, default_idf) for word in matched) / total
+
+    return EvalVectorStore()
+
+
+def build_index(corpus: Dict[str, str], chunk_size: int, scorer: str):
+    """Chunk the corpus like DocumentProcessor and load it into an evaluation store"""
+    from utils.file_utils import split_into_chunks
+
+    from services.chunk_store import ChunkColumns
+
+    store = make_store(scorer)
+    # Filled in memory: the evaluation never persists, so skip add_document's per-chunk save
+    store.documents = ChunkColumns()
+    for document_id, name in enumerate(sorted(corpus), 1):
+        for piece in split_into_chunks(corpus[name], chunk_size):
+            vector_id = f"doc_{document_id}_chunk_{piece['chunk_index']}"
+            store.documents[vector_id] = {
+                'content': piece['content'],
+                'metadata': {
+                    'document_id': document_id,
+                    'chunk_index': piece['chunk_index'],
+                    'page_number': piece['page_number'],
+                    'paragraph_number': piece['paragraph_number'],
+                    'document_filename': name
+                }
+            }
+    store.build_idf()
+    return store
+
+
+def relevant_ids(store, label: Dict) -> set:
+    """Vector ids of the chunks that satisfy a label's relevance judgements"""
+    ids = set()
+    for judgement in label['relevant']:
+        evidence = normalize(judgement.get('text', ''))
+        for vector_id, doc_data in store.documents.items():
+            metadata = doc_data['metadata']
+            if metadata['document_filename'] != judgement['document']:
+                continue
+            if 'chunk_index' in judgement and metadata['chunk_index'] != judgement['chunk_index']:
+                continue
+            if evidence and evidence not in normalize(doc_data['content']):
+                continue
+            ids.add(vector_id)
+    return ids
+
+
+def evaluate(results_by_question, relevant_by_question, limit: int, threshold: float,
+             strategy: str) -> Dict:
+    """Quality of the chunks that would reach the LLM under one (k, threshold) setting"""
+    from utils.similarity import diversify_results
+
+    recalls, reciprocal_ranks, hits, llm_calls = [], [], 0, []
+    for results, relevant in zip(results_by_question, relevant_by_question):
+        # Same selection as DocumentProcessor.search_similar_chunks and AIService._find_relevant_chunks
+        selected = [r['id'] for r in diversify_results(results, limit, strategy) if r['score'] >= threshold]
+        llm_calls.append(len(selected))
+        if not relevant:
+            continue
+        found = relevant.intersection(selected)
+        recalls.append(len(found) / len(relevant))
+        hits += 1 if found else 0
+        rank = next((i for i, vector_id in enumerate(selected, 1) if vector_id in relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+
+    judged = len(recalls)
+    return {
+        'recall_at_k': round(sum(recalls) / judged, 4) if judged else None,
+        'hit_rate': round(hits / judged, 4) if judged else None,
+        'mrr': round(sum(reciprocal_ranks) / judged, 4) if judged else None,
+        'mean_llm_calls': round(sum(llm_calls) / len(llm_calls), 3) if llm_calls else 0
+    }
+
+
+def pareto_front(configurations: List[Dict]) -> List[Dict]:
+    """Configurations no other configuration beats on both recall and LLM calls"""
+    front = []
+    for config in configurations:
+        dominated = any(
+            other['recall_at_k'] >= config['recall_at_k'] and other['mean_llm_calls'] <= config['mean_llm_calls']
+            and (other['recall_at_k'] > config['recall_at_k'] or other['mean_llm_calls'] < config['mean_llm_calls'])
+            for other in configurations
+        )
+        if not dominated:
+            front.append(config)
+    return sorted(front, key=lambda c: c['mean_llm_calls'])
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus-dir', help='directory of .txt/.md documents')
+    parser.add_argument('--labels', help='JSONL file of labeled questions')
+    parser.add_argument('--synthetic', type=int, metavar='N', help='generate a corpus and N labeled questions')
+    parser.add_argument('--synthetic-documents', type=int, default=40)
+    parser.add_argument('--synthetic-paragraphs', type=int, default=25)
+    parser.add_argument('--chunk-sizes', default=str(Config.CHUNK_SIZE))
+    parser.add_argument('--scorers', default='keyword', help='comma list of keyword, exact, idf')
+    parser.add_argument('--limits', default=f"5,10,{Config.MAX_DOCUMENTS_PER_QUERY}")
+    parser.add_argument('--thresholds', default=f"0.0,0.3,0.5,{Config.SIMILARITY_THRESHOLD}")
+    parser.add_argument('--diversification', default=Config.DIVERSIFICATION_STRATEGY,
+                        choices=('mmr', 'per_document', 'none'))
+    parser.add_argument('--target-recall', type=float, default=0.9)
+    parser.add_argument('--repeat', type=int, default=3, help='timed search passes per index')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        corpus, labels = synthetic_dataset(args.synthetic, args.synthetic_documents,
+                                           args.synthetic_paragraphs, args.seed)
+    elif args.corpus_dir and args.labels:
+        corpus, labels = load_corpus(args.corpus_dir), load_labels(args.labels)
+    else:
+        parser.error('either --synthetic or both --corpus-dir and --labels are required')
+
+    chunk_sizes = parse_list(args.chunk_sizes, int)
+    scorers = parse_list(args.scorers, str)
+    limits = sorted(parse_list(args.limits, int))
+    thresholds = sorted(parse_list(args.thresholds, float))
+    for scorer in scorers:
+        if scorer not in ('keyword', 'exact', 'idf'):
+            parser.error(f"unknown scorer: {scorer}")
+
+    configurations = []
+    indexes = []
+    for chunk_size in chunk_sizes:
+        for scorer in scorers:
+            build_start = time.perf_counter()
+            store = build_index(corpus, chunk_size, scorer)
+            build_elapsed = time.perf_counter() - build_start
+            relevant_by_question = [relevant_ids(store, label) for label in labels]
+            unmatched = sum(1 for relevant in relevant_by_question if not relevant)
+
+            # Search once at the widest k, over-fetched like search_similar_chunks;
+            # narrower k and thresholds are diversified and filtered from the same candidates
+            pool = limits[-1] if args.diversification == 'none' else limits[-1] * Config.DIVERSITY_CANDIDATE_POOL
+            latencies = []
+            results_by_question = []
+            for _ in range(max(1, args.repeat)):
+                results_by_question = []
+                for label in labels:
+                    start = time.perf_counter()
+                    results_by_question.append(store.search(label['question'], limit=pool))
+                    latencies.append(time.perf_counter() - start)
+            latency = percentiles(latencies)
+
+            indexes.append({
+                'chunk_size': chunk_size,
+                'scorer': scorer,
+                'chunks': len(store.documents),
+                'build_s': round(build_elapsed, 3),
+                'unmatched_labels': unmatched,
+                'search_latency': latency
+            })
+            for limit in limits:
+                for threshold in thresholds:
+                    configuration = {
+                        'chunk_size': chunk_size,
+                        'scorer': scorer,
+                        'limit': limit,
+                        'threshold': threshold,
+                        'search_p50_ms': latency.get('p50_ms'),
+                        'search_p95_ms': latency.get('p95_ms')
+                    }
+                    configuration.update(evaluate(results_by_question, relevant_by_question, limit, threshold,
+                                                   args.diversification))
+                    configurations.append(configuration)
+
+    scored = [c for c in configurations if c['recall_at_k'] is not None]
+    meeting_target = [c for c in scored if c['recall_at_k'] >= args.target_recall]
+    recommended = min(meeting_target, key=lambda c: (c['mean_llm_calls'], c['search_p50_ms']),
+                      default=None)
+
+    write_report({
+        'benchmark': 'retrieval',
+        'metadata': run_metadata(),
+        'parameters': vars(args),
+        'questions': len(labels),
+        'documents': len(corpus),
+        'indexes': indexes,
+        'configurations': configurations,
+        'pareto_front': pareto_front(scored),
+        'recommended': recommended
+    }, args.output)
+
+
+if __name__ == '__main__':
+    setup_environment(tempfile.mkdtemp(prefix='doceval_'))
+    main()
@@ -0,0 +1,80 @@
+import re
+import json
+import time
+import hashlib
+from types import SimpleNamespace
+from typing import Iterator
+
+from services.ai_service import AIService
+from services.rate_limiter import RateLimiter
+from services.metrics import get_metrics
+
+
+class FakeLLMClient:
+    """Deterministic stand-in for the OpenAI client used by AIService.
+
+    Responses depend only on the prompt, and each call sleeps for a fixed
+    latency plus prompt-derived jitter, so runs are reproducible while still
+    exercising the real prompt building, parsing and scheduling code.
+    """
+
+    def __init__(self, latency_ms: float = 200.0, jitter_ms: float = 50.0, stream_chunk_chars: int = 16):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.stream_chunk_chars = stream_chunk_chars
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    @staticmethod
+    def _digest(prompt: str) -> int:
+        return int(hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8], 16)
+
+    def _respond(self, prompt: str) -> str:
+        digest = self._digest(prompt)
+        if '"themes"' in prompt:
+            answer_count = len(re.findall(r'Answer \d+ \(from', prompt))
+            ids = sorted(set(re.findall(r'DOC\d{3,}', prompt)))
+            themes = []
+            for i in range(min(3, max(1, answer_count // 3))):
+                themes.append({
+                    'title': f"Synthetic theme {i + 1}",
+                    'summary': f"Deterministic summary {digest % 1000} for theme {i + 1}.",
+                    'supporting_documents': ids[i::3] or ids[:1],
+                    'confidence': 0.75 + 0.05 * (i % 4)
+                })
+            return json.dumps({'themes': themes})
+        if '"follow_up_questions"' in prompt:
+            return json.dumps({'follow_up_questions': ['What else?', 'Why?', 'How?']})
+        confidence = 0.4 + (digest % 60) / 100.0
+        return json.dumps({
+            'answer': f"Synthetic answer {digest % 100000}",
+            'confidence': round(confidence, 2),
+            'relevant': digest % 5 != 0
+        })
+
+    def _create(self, model: str = None, messages=None, stream: bool = False, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]['content']
+        jitter = (self._digest(prompt) % 1000) / 1000.0 * self.jitter_ms
+        time.sleep((self.latency_ms + jitter) / 1000.0)
+        text = self._respond(prompt)
+        if stream:
+            return self._stream(text)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+    def _stream(self, text: str) -> Iterator[SimpleNamespace]:
+        for i in range(0, len(text), self.stream_chunk_chars):
+            delta = SimpleNamespace(content=text[i:i + self.stream_chunk_chars])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class FakeAIService(AIService):
+    """AIService wired to the fake client instead of a real provider"""
+
+    def __init__(self, document_processor, client: FakeLLMClient, rate_limit_state: str):
+        # Skip provider selection; 'fake' is served by the OpenAI-compatible code path
+        self.client = client
+        self.ai_provider = 'fake'
+        self.document_processor = document_processor
+        self.rate_limiter = RateLimiter(rate_limit_state, {'fake': {'rpm': 10 ** 9, 'tpm': 10 ** 12}})
+        self.metrics = get_metrics()
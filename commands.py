@@ -0,0 +1,100 @@
+import logging
+import click
+from app import app, db
+from models import Document, DocumentChunk
+from config import Config
+from services.vector_store import create_vector_store, ShardedVectorStore
+
+
+@app.cli.command('init-db')
+def init_db():
+    """Create missing tables; for deployments that set AUTO_CREATE_TABLES=0"""
+    db.create_all()
+    click.echo("Tables created")
+
+
+@app.cli.command('migrate-document-content')
+@click.option('--batch-size', default=100, show_default=True, help='Documents per commit')
+def migrate_document_content(batch_size):
+    """Move legacy extracted_text into the compressed content store and clear vector_ids JSON"""
+    migrated = 0
+    raw_bytes = 0
+    compressed_bytes = 0
+    last_id = 0
+
+    while True:
+        documents = Document.query.filter(
+            Document.id > last_id,
+            db.or_(Document.extracted_text.isnot(None), Document.vector_ids.isnot(None))
+        ).order_by(Document.id).limit(batch_size).all()
+        if not documents:
+            break
+
+        for document in documents:
+            last_id = document.id
+            try:
+                if document.extracted_text is not None:
+                    document.set_extracted_text(document.extracted_text)
+                    raw_bytes += document.content.original_size
+                    compressed_bytes += len(document.content.data)
+
+                # The chunks already carry the vector IDs; only drop the JSON copy when they agree
+                chunk_ids = [row.vector_id for row in db.session.query(DocumentChunk.vector_id)
+                             .filter(DocumentChunk.document_id == document.id,
+                                     DocumentChunk.vector_id.isnot(None))]
+                if document.vector_ids is not None and (chunk_ids or document.vector_ids in ('', '[]')):
+                    document.vector_ids = None
+                migrated += 1
+            except Exception as e:
+                logging.error(f"Error migrating content of document {document.id}: {str(e)}")
+
+        db.session.commit()
+        # Keep memory flat on large tables
+        db.session.expunge_all()
+        click.echo(f"Migrated {migrated} documents")
+
+    ratio = compressed_bytes / raw_bytes if raw_bytes else 0.0
+    click.echo(f"Done: {migrated} documents, {raw_bytes} bytes of text stored as "
+               f"{compressed_bytes} bytes ({ratio:.0%})")
+
+
+@app.cli.command('reshard-vector-store')
+def reshard_vector_store():
+    """Move an unsharded index or one with another shard count into the VECTOR_STORE_SHARDS layout.
+    
+    Run with the app stopped: running workers keep their own copy of the index and would overwrite it.
+    """
+    if Config.VECTOR_STORE_SHARDS <= 1:
+        raise click.ClickException("Set VECTOR_STORE_SHARDS to the number of shards first")
+    
+    chunks, files = ShardedVectorStore().reshard_existing()
+    if not files:
+        click.echo(f"Nothing to reshard: no index files, or the {Config.VECTOR_STORE_SHARDS}-shard layout already exists")
+        return
+    click.echo(f"Resharded {chunks} chunks from {files} files into {Config.VECTOR_STORE_SHARDS} shards; "
+               f"the old files are kept with a .resharded suffix")
+
+
+@app.cli.command('backfill-vector-metadata')
+def backfill_vector_metadata():
+    """Add file type and upload date to indexed chunks stored before filtered search existed.
+
+    Run with the app stopped: running workers keep their own copy of the index and would overwrite it.
+    """
+    vector_store = create_vector_store()
+    missing = {doc_data['metadata'].get('document_id') for doc_data in vector_store.documents.values()
+               if 'file_type' not in doc_data['metadata'] or 'uploaded_at' not in doc_data['metadata']}
+    missing.discard(None)
+
+    updates = {}
+    for row in db.session.query(Document.id, Document.file_type, Document.uploaded_at).filter(
+            Document.id.in_(missing)):
+        updates[row.id] = {
+            'file_type': row.file_type,
+            'uploaded_at': row.uploaded_at.isoformat() if row.uploaded_at else None
+        }
+
+    if updates:
+        vector_store.update_document_metadata(updates)
+    click.echo(f"Updated chunk metadata for {len(updates)} documents "
+               f"({len(missing) - len(updates)} without a document row)")
@@ -9,6 +9,12 @@ class Config:
     # ChromaDB Configuration
     CHROMA_PERSIST_DIRECTORY = os.environ.get("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
     CHROMA_COLLECTION_NAME = "document_embeddings"
+    VECTOR_STORE_SHARDS = int(os.environ.get("VECTOR_STORE_SHARDS", "1"))  # >1 partitions chunks by document id into shard files
+    VECTOR_STORE_SEARCH_THREADS = True  # Search shards concurrently, one thread per shard
+    
+    # Startup Configuration
+    AUTO_CREATE_TABLES = os.environ.get("AUTO_CREATE_TABLES", "1") == "1"  # Run db.create_all() when the app is imported
+    PRELOAD_INDEX = os.environ.get("PRELOAD_INDEX", "0") == "1"  # Load the index at import, for gunicorn --preload
     
     # OCR Configuration
     TESSERACT_CMD = os.environ.get("TESSERACT_CMD", "tesseract")
@@ -16,6 +22,9 @@ class Config:
     # Processing Configuration
     CHUNK_SIZE = 1000  # Characters per chunk for embeddings
     CHUNK_OVERLAP = 200  # Overlap between chunks
+    CHUNK_INSERT_BATCH_SIZE = 1000  # Chunk rows per INSERT batch during ingestion
+    TEXT_MMAP_THRESHOLD = 8 * 1024 * 1024  # Text files at least this large are memory-mapped, not read
+    TEXT_DETECTION_SAMPLE_SIZE = 64 * 1024  # Bytes given to the charset detector for non-UTF-8 text
     
     # Supported file types
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'tiff', 'bmp', 'txt', 'docx'}
@@ -27,7 +36,74 @@ class Config:
     # Query Configuration
     MAX_DOCUMENTS_PER_QUERY = 20  # Maximum documents to process per query
     SIMILARITY_THRESHOLD = 0.7  # Minimum similarity score for relevant chunks
-    
+    DIVERSIFICATION_STRATEGY = 'mmr'  # 'mmr', 'per_document' (caps and duplicates only) or 'none'
+    DIVERSITY_CANDIDATE_POOL = 3  # Candidates retrieved per result slot for diversification to choose from
+    MAX_CHUNKS_PER_DOCUMENT = 3  # Most chunks a single document may contribute to one query
+    MMR_LAMBDA = 0.7  # Relevance weight against novelty when picking by MMR (1.0 = relevance only)
+    NEAR_DUPLICATE_MAX_DISTANCE = 8  # SimHash bits two chunks may differ in and still count as duplicates
+    SNIPPET_LENGTH = 240  # Characters of chunk text shown around the query matches in results
+    PARTIAL_MATCH_MIN_LENGTH = 3  # Shorter query words and terms take no part in substring matching
+    PARTIAL_MATCH_STOP_WORDS = frozenset({  # Query words too common to substring-match
+        'the', 'and', 'for', 'are', 'was', 'were', 'with', 'that', 'this', 'from', 'has', 'have',
+        'not', 'but', 'its', 'what', 'which', 'who', 'how', 'why', 'when', 'where', 'does', 'did', 'can'
+    })
+
+    # LLM Rate Limiting (requests/tokens per minute, shared across workers)
+    LLM_RATE_LIMITS = {
+        'google': {'rpm': 15, 'tpm': 1000000},  # Google AI Studio free tier
+        'openrouter': {'rpm': 60, 'tpm': 200000},
+        'anthropic': {'rpm': 50, 'tpm': 40000},
+        'openai': {'rpm': 500, 'tpm': 30000},
+        'default': {'rpm': 60, 'tpm': 100000},
+    }
+    RATE_LIMIT_STATE_FILE = os.environ.get(
+        "RATE_LIMIT_STATE_FILE", os.path.join(CHROMA_PERSIST_DIRECTORY, "rate_limiter.json")
+    )
+    LLM_MAX_RETRIES = 2  # Retries after a provider rate-limit error
+    LLM_RATE_LIMIT_BACKOFF = 10.0  # Seconds to pause a provider after a rate-limit error
+
+    # Prompt Budgets (tokens of document content / answers embedded per prompt)
+    LLM_PROMPT_BUDGETS = {
+        'google': {'chunk_tokens': 2000, 'answers_tokens': 12000},
+        'openrouter': {'chunk_tokens': 1500, 'answers_tokens': 8000},
+        'anthropic': {'chunk_tokens': 1500, 'answers_tokens': 8000},
+        'openai': {'chunk_tokens': 1500, 'answers_tokens': 8000},
+        'default': {'chunk_tokens': 1000, 'answers_tokens': 4000},
+    }
+
+    # Metrics Configuration (per-worker snapshots aggregated by /metrics)
+    METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join(CHROMA_PERSIST_DIRECTORY, "metrics"))
+    METRICS_FLUSH_INTERVAL = 1.0  # Seconds between per-worker snapshot writes
+
+    # Dashboard Stats Cache (document/query counts shown by index and /api/system-stats)
+    STATS_CACHE_TTL = 5.0  # Seconds before cached counts are recomputed
+
+    # Document Library Pagination
+    DOCUMENTS_PAGE_SIZE = 50  # Rows per page of /documents and /api/documents
+    DOCUMENTS_MAX_PAGE_SIZE = 200  # Largest ?limit accepted by /api/documents
+
+    # Background Tasks (bulk deletes)
+    BACKGROUND_TASK_WORKERS = 1  # Threads per worker process running background tasks
+    BULK_DELETE_BATCH_SIZE = 500  # Documents deleted per transaction
+
+    # Chunked Uploads (/api/uploads)
+    UPLOAD_PARTIAL_FOLDER = os.environ.get("UPLOAD_PARTIAL_FOLDER", os.path.join("uploads", "partial"))
+    MAX_UPLOAD_SIZE = 2 * 1024 * 1024 * 1024  # Largest file accepted through chunked uploads (2GB)
+    UPLOAD_PART_SIZE = 8 * 1024 * 1024  # Suggested bytes per PUT; must stay below MAX_CONTENT_LENGTH
+    UPLOAD_STREAM_BLOCK_SIZE = 1024 * 1024  # Bytes read from the request stream at a time
+
+    # Document Status Streaming (/api/document-status/stream)
+    PROGRESS_UPDATE_INTERVAL = 0.5  # Minimum seconds between ingestion progress commits
+    STATUS_STREAM_POLL_INTERVAL = 2.0  # Seconds between database re-reads, for changes made by other workers
+    STATUS_STREAM_TIMEOUT = 300  # Seconds before a stream closes and the browser reconnects
+
+    # Query Pipeline Configuration
+    ANSWER_EXTRACTION_WORKERS = 4  # Concurrent answer-extraction LLM calls per query
+    THEME_PIPELINE_ENABLED = True  # Start theme synthesis before all answers are extracted
+    THEME_PIPELINE_TOP_N = 5  # Confident answers needed to start theme synthesis early
+    THEME_PIPELINE_MIN_CONFIDENCE = 0.7  # Confidence counted towards THEME_PIPELINE_TOP_N
+    THEME_PIPELINE_TIME_BUDGET = 8.0  # Seconds after which themes start with whatever answers exist
+
     @staticmethod
     def validate_config():
         """Validate that required configuration is present"""
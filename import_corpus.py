@@ -0,0 +1,268 @@
+"""Import an existing corpus (a directory tree or a ZIP archive) into the document library.
+
+Text extraction runs across a process pool; chunking and indexing run in this
+process through DocumentProcessor, since the vector store is a single file.
+Progress is appended to a checkpoint file, so an interrupted import can be
+re-run with the same arguments and continues where it stopped. The index is
+saved every --save-every files rather than after each one, and files are
+only checkpointed as imported once the index holding them has been saved.
+
+    python import_corpus.py /data/corpus --workers 8
+    python import_corpus.py backlog.zip --checkpoint backlog.checkpoint.jsonl
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+def iter_sources(source: str):
+    """Yield (key, filename, opener) for every file in a directory tree or ZIP archive"""
+    if zipfile.is_zipfile(source):
+        archive = zipfile.ZipFile(source)
+        for info in archive.infolist():
+            if not info.is_dir():
+                yield (f"{os.path.abspath(source)}!{info.filename}:{info.file_size}:{info.CRC}",
+                       os.path.basename(info.filename),
+                       lambda info=info: archive.open(info))
+        return
+
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            yield (f"{os.path.abspath(path)}:{stat.st_size}:{int(stat.st_mtime)}",
+                   name,
+                   lambda path=path: open(path, 'rb'))
+
+
+def load_checkpoint(path: str):
+    """Sources handled by an earlier run: (keys imported or failed, {key: document id} of rows created but unfinished)"""
+    done = set()
+    created = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    key = entry['key']
+                except (ValueError, KeyError):
+                    continue  # A line cut short by an interruption
+                if entry.get('status') == 'created':
+                    created[key] = entry.get('document_id')
+                else:
+                    done.add(key)
+    return done, {key: document_id for key, document_id in created.items() if key not in done}
+
+
+def copy_into_uploads(opener, filename: str, upload_folder: str):
+    """Copy a source file into the upload folder, hashing it on the way; returns (path, size, sha256)"""
+    from utils.file_utils import timestamped_filename
+
+    digest = hashlib.sha256()
+    file_path = os.path.join(upload_folder, timestamped_filename(filename))
+    # Timestamps only have second resolution; keep names unique within a fast import
+    base, extension = os.path.splitext(file_path)
+    suffix = 1
+    while os.path.exists(file_path):
+        file_path = f"{base}_{suffix}{extension}"
+        suffix += 1
+
+    size = 0
+    with opener() as src, open(file_path, 'wb') as dst:
+        while True:
+            block = src.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block)
+            dst.write(block)
+            size += len(block)
+    return file_path, size, digest.hexdigest()
+
+
+def extract_worker(file_path: str, file_type: str):
+    """Runs in a pool process: extract text and count pages"""
+    from services.ocr_service import OCRService
+    from services.document_processor import extract_document_text
+
+    pages = [0]
+
+    def on_page(pages_done, page_count):
+        pages[0] = page_count
+
+    start = time.perf_counter()
+    text = extract_document_text(file_path, file_type, OCRService(), on_page)
+    return text, pages[0] or 1, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='directory or .zip archive to import')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='extraction processes')
+    parser.add_argument('--checkpoint', help='progress file (default: <source>.import-checkpoint.jsonl)')
+    parser.add_argument('--limit', type=int, help='import at most this many new files')
+    parser.add_argument('--save-every', type=int, default=50, help='imported files per index save')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    checkpoint_path = args.checkpoint or f"{args.source.rstrip(os.sep)}.import-checkpoint.jsonl"
+
+    from app import app, db
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    from models import Document
+    from services.document_processor import DocumentProcessor
+    from utils.file_utils import allowed_file, get_file_type
+
+    done, created = load_checkpoint(checkpoint_path)
+    pending = []
+    skipped = 0
+    for key, filename, opener in iter_sources(args.source):
+        if not allowed_file(filename):
+            continue
+        if key in done:
+            skipped += 1
+            continue
+        pending.append((key, filename, opener))
+    if args.limit:
+        pending = pending[:args.limit]
+    print(f"{len(pending)} files to import, {skipped} already imported, checkpoint {checkpoint_path}")
+    if not pending:
+        return
+
+    totals = {'files': 0, 'failed': 0, 'pages': 0, 'bytes': 0}
+    start = time.perf_counter()
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    with app.app_context(), open(checkpoint_path, 'a') as checkpoint, \
+            ProcessPoolExecutor(max_workers=args.workers) as pool:
+        document_processor = DocumentProcessor()
+        vector_store = document_processor.vector_store
+        in_flight = {}
+        unsaved = []  # Checkpoint entries of imported files whose vectors are not saved yet
+        queue = iter(pending)
+
+        def record(key, filename, status, document_id=None, error=None):
+            checkpoint.write(json.dumps({'key': key, 'filename': filename, 'status': status,
+                                         'document_id': document_id, 'error': error}) + '\n')
+            checkpoint.flush()
+
+        def save_index():
+            # Each save rewrites the whole index, so it is done once per batch of files
+            vector_store.flush()
+            for entry in unsaved:
+                record(*entry)
+            unsaved.clear()
+
+        def resumed_document(key):
+            """The row (and uploads copy) an interrupted run created for this source, if both still exist"""
+            document = db.session.get(Document, created[key]) if created.get(key) else None
+            if document is not None and os.path.exists(document.file_path):
+                return document
+            return None
+
+        def submit_next():
+            for key, filename, opener in queue:
+                document = resumed_document(key)
+                if document is not None:
+                    future = pool.submit(extract_worker, document.file_path, document.file_type)
+                    in_flight[future] = (key, filename, document.id)
+                    return True
+                try:
+                    file_path, size, content_hash = copy_into_uploads(opener, filename, upload_folder)
+                    document = Document(
+                        filename=os.path.basename(file_path),
+                        original_filename=filename,
+                        file_path=file_path,
+                        file_type=get_file_type(filename),
+                        file_size=size,
+                        content_hash=content_hash,
+                        processing_status='pending'
+                    )
+                    db.session.add(document)
+                    db.session.commit()
+                    # Recorded before extraction, so a resumed run reuses this row instead of adding another
+                    record(key, filename, 'created', document.id)
+                except Exception as e:
+                    logging.error(f"Error copying {filename}: {str(e)}")
+                    db.session.rollback()
+                    totals['failed'] += 1
+                    record(key, filename, 'failed', error=str(e))
+                    continue
+                totals['bytes'] += size
+                future = pool.submit(extract_worker, document.file_path, document.file_type)
+                in_flight[future] = (key, filename, document.id)
+                return True
+            return False
+
+        last_report = 0
+
+        # Keep a bounded number of extracted texts in memory
+        for _ in range(args.workers * 2):
+            if not submit_next():
+                break
+
+        with vector_store.deferred_saves():
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    key, filename, document_id = in_flight.pop(future)
+                    try:
+                        text, pages, _ = future.result()
+                    except Exception as e:
+                        logging.error(f"Error extracting text from {filename}: {str(e)}")
+                        document = db.session.get(Document, document_id)
+                        document.processing_status = 'failed'
+                        document.error_message = str(e)
+                        db.session.commit()
+                        totals['failed'] += 1
+                        record(key, filename, 'failed', document_id, str(e))
+                        submit_next()
+                        continue
+                    
+                    try:
+                        document_processor.process_document(document_id, extracted_text=text, page_count=pages)
+                        totals['files'] += 1
+                        totals['pages'] += pages
+                        unsaved.append((key, filename, 'completed', document_id))
+                        if len(unsaved) >= args.save_every:
+                            save_index()
+                    except Exception as e:
+                        # process_document has already marked the document failed
+                        totals['failed'] += 1
+                        record(key, filename, 'failed', document_id, str(e))
+                    submit_next()
+
+                processed = totals['files'] + totals['failed']
+                # Several files can finish between checks, so compare with the last report
+                if processed - last_report >= 50:
+                    last_report = processed
+                    elapsed = time.perf_counter() - start
+                    print(f"  {processed}/{len(pending)} files, {totals['files'] / elapsed:.2f} files/s, "
+                          f"{totals['pages'] / elapsed:.2f} pages/s")
+            
+            save_index()
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'imported': totals['files'],
+        'failed': totals['failed'],
+        'skipped': skipped,
+        'pages': totals['pages'],
+        'bytes': totals['bytes'],
+        'elapsed_s': round(elapsed, 3),
+        'files_per_s': round(totals['files'] / elapsed, 3) if elapsed else None,
+        'pages_per_s': round(totals['pages'] / elapsed, 3) if elapsed else None,
+        'workers': args.workers
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,39 +1,104 @@
 from app import db
 from datetime import datetime
 import json
+from utils.compression import compress_text, decompress_text
 
 class Document(db.Model):
     """Model for storing document metadata and content"""
+    __table_args__ = (
+        # Keyset pagination of the document library, newest first
+        db.Index('ix_document_uploaded_at_id', 'uploaded_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)  # pdf, image, text
     file_size = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), index=True)  # SHA-256 of the uploaded file
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     processed_at = db.Column(db.DateTime)
     
-    # Content and processing status
-    extracted_text = db.Column(db.Text)
+    # Content and processing status (large columns load on first access)
+    extracted_text = db.deferred(db.Column(db.Text))  # Legacy; new text lives in DocumentContent
     page_count = db.Column(db.Integer, default=1)
     processing_status = db.Column(db.String(50), default='pending')  # pending, processing, completed, failed
     error_message = db.Column(db.Text)
     
+    # Ingestion progress, updated while the document is processed
+    pages_extracted = db.Column(db.Integer, default=0)
+    chunks_total = db.Column(db.Integer, default=0)
+    chunks_indexed = db.Column(db.Integer, default=0)
+    
     # Vector store reference
-    vector_ids = db.Column(db.Text)  # JSON array of vector IDs for ChromaDB
+    vector_ids = db.deferred(db.Column(db.Text))  # Legacy JSON array; derived from DocumentChunk.vector_id now
+    
+    # Compressed extracted text, loaded only when accessed
+    content = db.relationship('DocumentContent', uselist=False, lazy='select', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<Document {self.filename}>'
     
+    def get_extracted_text(self):
+        """Get extracted text, decompressing it from the content store"""
+        if self.content is not None:
+            return self.content.get_text()
+        return self.extracted_text or ""
+    
+    def set_extracted_text(self, text):
+        """Store extracted text compressed in the content store"""
+        if self.content is None:
+            self.content = DocumentContent()
+        self.content.set_text(text)
+        self.extracted_text = None
+    
     def get_vector_ids(self):
-        """Get vector IDs as list"""
-        if self.vector_ids:
+        """Get vector IDs as list, in chunk order"""
+        ids = [row.vector_id for row in db.session.query(DocumentChunk.vector_id)
+               .filter(DocumentChunk.document_id == self.id, DocumentChunk.vector_id.isnot(None))
+               .order_by(DocumentChunk.chunk_index)]
+        if not ids and self.vector_ids:
             return json.loads(self.vector_ids)
-        return []
+        return ids
     
-    def set_vector_ids(self, ids):
-        """Set vector IDs from list"""
-        self.vector_ids = json.dumps(ids)
+    def get_progress(self):
+        """Get processing progress as a percentage"""
+        return Document.progress_percent(self.processing_status, self.page_count, self.pages_extracted,
+                                         self.chunks_total, self.chunks_indexed)
+    
+    @staticmethod
+    def progress_percent(status, page_count, pages_extracted, chunks_total, chunks_indexed):
+        """Progress from the progress columns: extraction is the first 40%, indexing the rest"""
+        if status == 'completed':
+            return 100
+        if status == 'pending':
+            return 0
+        progress = 0.0
+        if page_count:
+            progress += 40.0 * min(pages_extracted or 0, page_count) / page_count
+        if chunks_total:
+            progress += 60.0 * min(chunks_indexed or 0, chunks_total) / chunks_total
+        return int(progress)
+
+class DocumentContent(db.Model):
+    """Model for storing a document's extracted text compressed, outside the document row"""
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'), primary_key=True)
+    codec = db.Column(db.String(16), nullable=False)  # zstd, zlib
+    original_size = db.Column(db.Integer, nullable=False)  # Bytes of UTF-8 text before compression
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    
+    def __repr__(self):
+        return f'<DocumentContent {self.document_id} {self.codec}>'
+    
+    def get_text(self):
+        """Get the decompressed text"""
+        return decompress_text(self.codec, self.data)
+    
+    def set_text(self, text):
+        """Compress and store text"""
+        self.codec, self.data = compress_text(text)
+        self.original_size = len((text or "").encode('utf-8'))
 
 class Query(db.Model):
     """Model for storing user queries and results"""
@@ -45,6 +110,7 @@ class Query(db.Model):
     individual_answers = db.Column(db.Text)  # JSON array of document answers
     themes = db.Column(db.Text)  # JSON array of identified themes
     processing_time = db.Column(db.Float)
+    trace = db.Column(db.Text)  # JSON per-stage timings, token counts and pipeline stats
     
     def __repr__(self):
         return f'<Query {self.id}: {self.question[:50]}...>'
@@ -68,9 +134,23 @@ class Query(db.Model):
     def set_themes(self, themes):
         """Set themes from list"""
         self.themes = json.dumps(themes)
+    
+    def get_trace(self):
+        """Get query trace as dict"""
+        if self.trace:
+            return json.loads(self.trace)
+        return {}
+    
+    def set_trace(self, trace):
+        """Set query trace from dict"""
+        self.trace = json.dumps(trace)
 
 class DocumentChunk(db.Model):
     """Model for storing document chunks for better citation tracking"""
+    __table_args__ = (
+        db.Index('ix_document_chunk_document_id_chunk_index', 'document_id', 'chunk_index'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     document_id = db.Column(db.Integer, db.ForeignKey('document.id'), nullable=False)
     chunk_index = db.Column(db.Integer, nullable=False)
@@ -84,3 +164,55 @@ class DocumentChunk(db.Model):
     
     def __repr__(self):
         return f'<DocumentChunk {self.document_id}-{self.chunk_index}>'
+
+class BackgroundTask(db.Model):
+    """Model for tracking work run outside the request, such as bulk deletes"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(50), default='queued')  # queued, running, completed, failed
+    progress = db.Column(db.Integer, default=0)  # Percentage
+    params = db.Column(db.Text)  # JSON task input
+    result = db.Column(db.Text)  # JSON task output
+    error_message = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<BackgroundTask {self.id} {self.kind} {self.status}>'
+    
+    def get_params(self):
+        """Get params as dict"""
+        if self.params:
+            return json.loads(self.params)
+        return {}
+    
+    def set_params(self, params):
+        """Set params from dict"""
+        self.params = json.dumps(params)
+    
+    def get_result(self):
+        """Get result as dict"""
+        if self.result:
+            return json.loads(self.result)
+        return {}
+    
+    def set_result(self, result):
+        """Set result from dict"""
+        self.result = json.dumps(result)
+
+class UploadSession(db.Model):
+    """Model for tracking a resumable chunked upload"""
+    id = db.Column(db.String(32), primary_key=True)  # Random hex token
+    original_filename = db.Column(db.String(255), nullable=False)
+    total_size = db.Column(db.BigInteger, nullable=False)
+    received_size = db.Column(db.BigInteger, default=0)
+    expected_sha256 = db.Column(db.String(64))  # Optional, checked on completion
+    part_path = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(50), default='uploading')  # uploading, completed
+    document_id = db.Column(db.Integer, db.ForeignKey('document.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_size}/{self.total_size}>'
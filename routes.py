@@ -1,35 +1,46 @@
 import os
+import json
 import time
 import logging
-from flask import render_template, request, redirect, url_for, flash, jsonify
-from werkzeug.utils import secure_filename
-from app import app, db
-from models import Document, Query, DocumentChunk
-from services.document_processor import DocumentProcessor
-from services.ai_service import AIService
-from utils.file_utils import allowed_file, get_file_type
+from datetime import datetime
+from flask import render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context, make_response
+from app import app, db, startup_timings
+from models import Document, Query, DocumentChunk, BackgroundTask, UploadSession
+from services.document_processor import get_document_processor, loaded_document_processor
+from services.ai_service import get_ai_service
+from services.rate_limiter import get_rate_limiter
+from services.structured_output import parse_stats
+from services.tracing import QueryTrace, trace_span
+from services.metrics import get_metrics
+from services.stats_cache import get_stats_cache
+from services.status_events import get_status_broadcaster
+from services.background_tasks import get_task_runner
+from services.upload_service import get_upload_service, UploadError
+from utils.file_utils import allowed_file, get_file_type, timestamped_filename
 from config import Config
 
-# Initialize services
-document_processor = DocumentProcessor()
-ai_service = AIService()
+# Initialize services; the document processor (which loads the index) and AI service are built on first use
+metrics = get_metrics()
+stats_cache = get_stats_cache()
+status_events = get_status_broadcaster()
+task_runner = get_task_runner()
+upload_service = get_upload_service()
 
 @app.route('/')
 def index():
     """Home page showing system status and overview"""
     # Get system statistics
-    total_documents = Document.query.count()
-    processed_documents = Document.query.filter_by(processing_status='completed').count()
-    total_queries = Query.query.count()
+    stats = stats_cache.get()
     
     # Check configuration
     config_errors = Config.validate_config()
     
-    return render_template('index.html', 
-                         total_documents=total_documents,
-                         processed_documents=processed_documents,
-                         total_queries=total_queries,
-                         config_errors=config_errors)
+    response = make_response(render_template('index.html', 
+                         total_documents=stats['total'],
+                         processed_documents=stats['completed'],
+                         total_queries=stats['total_queries'],
+                         config_errors=config_errors))
+    return conditional_response(response)
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload_documents():
@@ -52,10 +63,7 @@ def upload_documents():
                 if allowed_file(file.filename):
                     try:
                         # Save file
-                        filename = secure_filename(file.filename)
-                        # Add timestamp to avoid conflicts
-                        timestamp = str(int(time.time()))
-                        filename = f"{timestamp}_{filename}"
+                        filename = timestamped_filename(file.filename)
                         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
                         file.save(file_path)
                         
@@ -71,10 +79,11 @@ def upload_documents():
                         
                         db.session.add(document)
                         db.session.commit()
+                        stats_cache.invalidate()
                         
                         # Process document asynchronously (in background)
                         try:
-                            document_processor.process_document(document.id)
+                            get_document_processor().process_document(document.id)
                             uploaded_count += 1
                         except Exception as e:
                             logging.error(f"Error processing document {filename}: {str(e)}")
@@ -99,11 +108,135 @@ def upload_documents():
     
     return render_template('upload.html')
 
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """API endpoint starting a resumable upload: {"filename", "size", optional "sha256"}"""
+    data = request.get_json(silent=True) or {}
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size must be an integer'}), 400
+    
+    try:
+        upload = upload_service.create(data.get('filename', ''), size, data.get('sha256'))
+    except UploadError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    
+    return jsonify(upload_payload(upload)), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_part(upload_id):
+    """API endpoint for an upload: GET its offset, PUT the next part at Upload-Offset, DELETE to abort"""
+    upload = UploadSession.query.get_or_404(upload_id)
+    
+    if request.method == 'DELETE':
+        upload_service.discard(upload)
+        return '', 204
+    
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+            upload_service.append(upload, offset, request.stream)
+        except UploadError as e:
+            return jsonify({'error': str(e), 'offset': e.offset}), e.status_code
+        except ValueError:
+            return jsonify({'error': 'Upload-Offset header is required'}), 400
+    
+    return jsonify(upload_payload(upload))
+
+@app.route('/api/uploads/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """API endpoint finishing an upload and queueing the document for processing"""
+    upload = UploadSession.query.get_or_404(upload_id)
+    try:
+        document = upload_service.complete(upload)
+    except UploadError as e:
+        return jsonify({'error': str(e), 'offset': e.offset}), e.status_code
+    stats_cache.invalidate()
+    
+    document_id = document.id
+    task = task_runner.submit(
+        'process_document',
+        {'document_id': document_id},
+        lambda task, report_progress: get_document_processor().process_document(document_id) or {'document_id': document_id}
+    )
+    duplicate = upload_service.find_duplicate(document)
+    
+    return jsonify({
+        'document_id': document_id,
+        'content_hash': document.content_hash,
+        'duplicate_of': duplicate.id if duplicate else None,
+        'task_id': task.id,
+        'status_url': url_for('document_status', doc_id=document_id)
+    }), 202
+
+def upload_payload(upload):
+    """Upload progress for the chunked upload endpoints"""
+    return {
+        'upload_id': upload.id,
+        'filename': upload.original_filename,
+        'size': upload.total_size,
+        'offset': upload_service.received_size(upload) if upload.status == 'uploading' else upload.total_size,
+        'status': upload.status,
+        'document_id': upload.document_id,
+        'part_size': Config.UPLOAD_PART_SIZE,
+        'upload_url': url_for('upload_part', upload_id=upload.id)
+    }
+
 @app.route('/documents')
 def documents():
-    """Display all uploaded documents"""
-    documents = Document.query.order_by(Document.uploaded_at.desc()).all()
-    return render_template('documents.html', documents=documents)
+    """Display uploaded documents, one keyset page at a time"""
+    cursor = request.args.get('cursor')
+    try:
+        documents, next_cursor = fetch_documents_page(cursor, Config.DOCUMENTS_PAGE_SIZE)
+    except ValueError:
+        return redirect(url_for('documents'))
+    
+    return render_template('documents.html',
+                         documents=documents,
+                         stats=stats_cache.get(),
+                         next_cursor=next_cursor,
+                         is_first_page=not cursor)
+
+@app.route('/api/documents')
+def api_documents():
+    """API endpoint listing documents newest first; pass next_cursor back as ?cursor= for the next page"""
+    try:
+        limit = min(max(int(request.args.get('limit', Config.DOCUMENTS_PAGE_SIZE)), 1),
+                    Config.DOCUMENTS_MAX_PAGE_SIZE)
+        documents, next_cursor = fetch_documents_page(request.args.get('cursor'), limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or limit'}), 400
+    
+    return jsonify({
+        'documents': [dict(document_status_payload(document),
+                           file_type=document.file_type,
+                           file_size=document.file_size,
+                           uploaded_at=document.uploaded_at.isoformat() if document.uploaded_at else None,
+                           processed_at=document.processed_at.isoformat() if document.processed_at else None)
+                      for document in documents],
+        'next_cursor': next_cursor
+    })
+
+def fetch_documents_page(cursor, limit):
+    """Documents ordered by (uploaded_at, id) descending, starting after an opaque cursor.
+    
+    Raises ValueError for a malformed cursor.
+    """
+    query = Document.query.order_by(Document.uploaded_at.desc(), Document.id.desc())
+    if cursor:
+        uploaded_at, _, doc_id = cursor.rpartition('_')
+        after = (datetime.fromisoformat(uploaded_at), int(doc_id))
+        query = query.filter(db.tuple_(Document.uploaded_at, Document.id) < after)
+    
+    # One extra row tells whether another page follows
+    documents = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        next_cursor = f"{last.uploaded_at.isoformat()}_{last.id}"
+    return documents, next_cursor
 
 @app.route('/documents/<int:doc_id>/delete', methods=['POST'])
 def delete_document(doc_id):
@@ -116,8 +249,9 @@ def delete_document(doc_id):
             os.remove(document.file_path)
         
         # Delete from vector store
-        if document.get_vector_ids():
-            document_processor.vector_store.delete_vectors(document.get_vector_ids())
+        vector_ids = document.get_vector_ids()
+        if vector_ids:
+            get_document_processor().vector_store.delete_vectors(vector_ids)
         
         # Delete document chunks
         DocumentChunk.query.filter_by(document_id=doc_id).delete()
@@ -125,6 +259,7 @@ def delete_document(doc_id):
         # Delete document record
         db.session.delete(document)
         db.session.commit()
+        stats_cache.invalidate()
         
         flash(f'Document "{document.original_filename}" deleted successfully', 'success')
         
@@ -135,6 +270,56 @@ def delete_document(doc_id):
     
     return redirect(url_for('documents'))
 
+@app.route('/api/documents/bulk-delete', methods=['POST'])
+def bulk_delete_documents():
+    """API endpoint deleting documents by ids, status and/or upload date range, in the background"""
+    data = request.get_json(silent=True) or {}
+    query = db.session.query(Document.id)
+    
+    try:
+        if 'ids' in data:
+            query = query.filter(Document.id.in_([int(doc_id) for doc_id in data['ids']]))
+        if 'status' in data:
+            query = query.filter(Document.processing_status == data['status'])
+        if 'uploaded_after' in data:
+            query = query.filter(Document.uploaded_at >= datetime.fromisoformat(data['uploaded_after']))
+        if 'uploaded_before' in data:
+            query = query.filter(Document.uploaded_at < datetime.fromisoformat(data['uploaded_before']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid ids or dates'}), 400
+    
+    if not any(key in data for key in ('ids', 'status', 'uploaded_after', 'uploaded_before')):
+        return jsonify({'error': 'Provide ids, status, uploaded_after and/or uploaded_before'}), 400
+    
+    document_ids = [row.id for row in query.order_by(Document.id)]
+    task = task_runner.submit(
+        'bulk_delete',
+        {'filters': data, 'document_ids': document_ids},
+        lambda task, report_progress: get_document_processor().delete_documents(document_ids, report_progress)
+    )
+    
+    return jsonify({
+        'task_id': task.id,
+        'matched': len(document_ids),
+        'status_url': url_for('task_status', task_id=task.id)
+    }), 202
+
+@app.route('/api/tasks/<int:task_id>')
+def task_status(task_id):
+    """API endpoint to check a background task"""
+    task = BackgroundTask.query.get_or_404(task_id)
+    
+    return jsonify({
+        'id': task.id,
+        'kind': task.kind,
+        'status': task.status,
+        'progress': task.progress,
+        'result': task.get_result(),
+        'error': task.error_message,
+        'created_at': task.created_at.isoformat() if task.created_at else None,
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None
+    })
+
 @app.route('/query', methods=['GET', 'POST'])
 def query_documents():
     """Handle document querying"""
@@ -145,6 +330,12 @@ def query_documents():
             flash('Please enter a question', 'error')
             return redirect(request.url)
         
+        try:
+            filters = search_filters(request.form)
+        except ValueError:
+            flash('Invalid document or date filter', 'error')
+            return redirect(request.url)
+        
         # Check if we have processed documents
         processed_docs = Document.query.filter_by(processing_status='completed').count()
         if processed_docs == 0:
@@ -153,20 +344,27 @@ def query_documents():
         
         try:
             start_time = time.time()
+            trace = QueryTrace()
+            stats = {'filters': filters} if filters else {}
             
-            # Create query record
-            query = Query(question=question)
-            db.session.add(query)
-            db.session.commit()
-            
-            # Process the query
-            individual_answers, themes = ai_service.process_query(question)
+            with trace.activate():
+                # Create query record
+                query = Query(question=question)
+                db.session.add(query)
+                with trace_span('db.commit'):
+                    db.session.commit()
+                stats_cache.invalidate()
+                
+                # Process the query
+                individual_answers, themes = get_ai_service().process_query(question, stats=stats, filters=filters)
             
             # Update query with results
             query.set_individual_answers(individual_answers)
             query.set_themes(themes)
+            query.set_trace(dict(trace.to_dict(), stats=stats))
             query.processing_time = time.time() - start_time
             db.session.commit()
+            metrics.observe('query_duration_seconds', query.processing_time, mode='form')
             
             return redirect(url_for('query_results', query_id=query.id))
             
@@ -177,11 +375,86 @@ def query_documents():
     
     # Get recent queries for display
     recent_queries = Query.query.order_by(Query.created_at.desc()).limit(5).all()
-    processed_docs_count = Document.query.filter_by(processing_status='completed').count()
+    processed_docs_count = stats_cache.get()['completed']
+    
+    # Choices for the search scope; ?document_id= preselects documents, which are listed even if older
+    selected_document_ids = request.args.getlist('document_id', type=int)
+    scope_documents = db.session.query(Document.id, Document.original_filename).filter(
+        Document.processing_status == 'completed'
+    ).order_by(Document.id.in_(selected_document_ids).desc(), Document.uploaded_at.desc(), Document.id.desc()
+    ).limit(Config.DOCUMENTS_MAX_PAGE_SIZE + len(selected_document_ids)).all()
+    file_types = [row.file_type for row in db.session.query(Document.file_type).filter(
+        Document.processing_status == 'completed'
+    ).distinct().order_by(Document.file_type)]
     
     return render_template('query.html', 
                          recent_queries=recent_queries,
-                         processed_docs_count=processed_docs_count)
+                         processed_docs_count=processed_docs_count,
+                         scope_documents=scope_documents,
+                         file_types=file_types,
+                         selected_document_ids=selected_document_ids)
+
+@app.route('/api/query/stream')
+def query_stream():
+    """Stream query progress as server-sent events, persisting the query when done"""
+    question = request.args.get('question', '').strip()
+    if not question:
+        return jsonify({'error': 'Please enter a question'}), 400
+    try:
+        filters = search_filters(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid document or date filter'}), 400
+    
+    def generate():
+        start_time = time.time()
+        trace = QueryTrace()
+        stats = {'filters': filters} if filters else {}
+        query = Query(question=question)
+        db.session.add(query)
+        with trace.activate(), trace_span('db.commit'):
+            db.session.commit()
+        stats_cache.invalidate()
+        
+        try:
+            # Activate around each step only; a context variable must not be held across a yield
+            events = get_ai_service().stream_query(question, stats=stats, filters=filters)
+            while True:
+                with trace.activate():
+                    event = next(events, None)
+                if event is None:
+                    break
+                if event['event'] == 'done':
+                    query.set_individual_answers(event['individual_answers'])
+                    query.set_themes(event['themes'])
+                    query.set_trace(dict(trace.to_dict(), stats=stats))
+                    query.processing_time = time.time() - start_time
+                    db.session.commit()
+                    metrics.observe('query_duration_seconds', query.processing_time, mode='stream')
+                    event = {'event': 'done', 'query_id': query.id,
+                             'results_url': url_for('query_results', query_id=query.id)}
+                yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            logging.error(f"Error streaming query: {str(e)}")
+            db.session.rollback()
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def search_filters(values):
+    """Search scope from query form fields or arguments; None searches everything"""
+    filters = {}
+    document_ids = [int(doc_id) for doc_id in values.getlist('document_id') if doc_id.strip()]
+    if document_ids:
+        filters['document_ids'] = document_ids
+    file_types = [file_type for file_type in values.getlist('file_type') if file_type]
+    if file_types:
+        filters['file_types'] = file_types
+    for key in ('uploaded_after', 'uploaded_before'):
+        if values.get(key):
+            # Validate here; the vector store compares normalized ISO strings
+            filters[key] = datetime.fromisoformat(values[key]).isoformat()
+    return filters or None
 
 @app.route('/results/<int:query_id>')
 def query_results(query_id):
@@ -198,6 +471,7 @@ def query_results(query_id):
                          query=query,
                          individual_answers=individual_answers,
                          themes=themes,
+                         trace=query.get_trace(),
                          unique_document_count=unique_document_count)
 
 @app.route('/api/document-status/<int:doc_id>')
@@ -205,26 +479,118 @@ def document_status(doc_id):
     """API endpoint to check document processing status"""
     document = Document.query.get_or_404(doc_id)
     
-    return jsonify({
+    return jsonify(document_status_payload(document))
+
+@app.route('/api/document-status/stream')
+def document_status_stream():
+    """Stream status and progress changes for a batch of documents as server-sent events"""
+    try:
+        doc_ids = [int(doc_id) for doc_id in request.args.get('ids', '').split(',') if doc_id.strip()]
+    except ValueError:
+        return jsonify({'error': 'ids must be a comma-separated list of document IDs'}), 400
+    
+    if not doc_ids:
+        # Default to everything still being ingested
+        doc_ids = [row.id for row in db.session.query(Document.id)
+                   .filter(Document.processing_status.in_(('pending', 'processing'))).all()]
+    
+    def generate():
+        sent = {}
+        version = status_events.version
+        deadline = time.time() + Config.STATUS_STREAM_TIMEOUT
+        
+        while True:
+            rows = db.session.query(*STATUS_COLUMNS).filter(Document.id.in_(doc_ids)).all() if doc_ids else []
+            # Hand the connection back to the pool while waiting
+            db.session.rollback()
+            
+            for row in rows:
+                payload = document_status_payload(row)
+                if sent.get(row.id) != payload:
+                    sent[row.id] = payload
+                    yield f"event: status\ndata: {json.dumps(payload)}\n\n"
+            
+            if all(row.processing_status in ('completed', 'failed') for row in rows):
+                yield "event: done\ndata: {}\n\n"
+                return
+            if time.time() >= deadline:
+                # EventSource reconnects on its own
+                return
+            
+            # Wake early when ingestion in this worker commits a change
+            version = status_events.wait(version, Config.STATUS_STREAM_POLL_INTERVAL)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+STATUS_COLUMNS = (Document.id, Document.original_filename, Document.processing_status, Document.error_message,
+                  Document.page_count, Document.pages_extracted, Document.chunks_total, Document.chunks_indexed)
+
+def document_status_payload(document):
+    """Status fields shared by the status endpoint and stream (a Document or a STATUS_COLUMNS row)"""
+    return {
         'id': document.id,
         'filename': document.original_filename,
         'status': document.processing_status,
-        'error': document.error_message
-    })
+        'error': document.error_message,
+        'progress': Document.progress_percent(document.processing_status, document.page_count,
+                                              document.pages_extracted, document.chunks_total,
+                                              document.chunks_indexed),
+        'pages_extracted': document.pages_extracted or 0,
+        'page_count': document.page_count or 0,
+        'chunks_indexed': document.chunks_indexed or 0,
+        'chunks_total': document.chunks_total or 0
+    }
 
 @app.route('/api/system-stats')
 def system_stats():
     """API endpoint for system statistics"""
-    return jsonify({
-        'total_documents': Document.query.count(),
-        'processed_documents': Document.query.filter_by(processing_status='completed').count(),
-        'processing_documents': Document.query.filter_by(processing_status='processing').count(),
-        'failed_documents': Document.query.filter_by(processing_status='failed').count(),
-        'total_queries': Query.query.count()
+    stats = stats_cache.get()
+    # None until this worker has loaded the index; reporting it must not trigger the load
+    document_processor = loaded_document_processor()
+    memory_bytes = document_processor.vector_store.memory_usage() if document_processor is not None else None
+    response = jsonify({
+        'startup': startup_timings,
+        'total_documents': stats['total'],
+        'processed_documents': stats['completed'],
+        'processing_documents': stats['processing'],
+        'failed_documents': stats['failed'],
+        'total_queries': stats['total_queries'],
+        'llm_queue_depth': get_rate_limiter().queue_depth(),
+        'llm_parse_stats': parse_stats.snapshot(),
+        'memory_bytes': memory_bytes
     })
+    return conditional_response(response)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics aggregated across all workers"""
+    # Values only this worker knows are refreshed at scrape time; other workers report on their own flushes.
+    # A scrape must not load the index in a worker that has not needed it yet.
+    document_processor = loaded_document_processor()
+    if document_processor is not None:
+        vector_store = document_processor.vector_store
+        metrics.set_gauge('vector_store_chunks', len(vector_store.documents))
+        metrics.set_gauge('vector_store_bytes', vector_store.memory_usage()['total'])
+    queue_depth = get_rate_limiter().queue_depth()
+    extra_gauges = [('llm_queue_depth', {'priority': priority}, depth) for priority, depth in queue_depth.items()]
+    
+    return Response(metrics.render(extra_gauges), mimetype='text/plain; version=0.0.4')
+
+def conditional_response(response):
+    """Tag a response with an ETag and answer a matching If-None-Match with 304"""
+    # no-cache lets browsers keep the body but revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
 
 @app.errorhandler(413)
 def too_large(e):
+    if request.path.startswith('/api/'):
+        # API clients (resumable upload parts) need an error they can act on, not a redirect
+        return jsonify({'error': 'Request body too large',
+                        'max_bytes': app.config['MAX_CONTENT_LENGTH'],
+                        'part_size': Config.UPLOAD_PART_SIZE}), 413
     flash('File too large. Maximum size is 50MB.', 'error')
     return redirect(url_for('upload_documents'))
 
@@ -1,9 +1,23 @@
-import json
+import time
+import queue
 import logging
-from typing import List, Dict, Tuple, Any
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import List, Dict, Tuple, Any, Callable, Iterator
 import os
-from services.document_processor import DocumentProcessor
+import threading
+from services.document_processor import get_document_processor
+from services.rate_limiter import get_rate_limiter, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from services.tracing import trace_span, trace_count
+from services.metrics import get_metrics
+from services.structured_output import (
+    ANSWER_SCHEMA, THEMES_SCHEMA, FOLLOW_UP_SCHEMA, StructuredOutputError,
+    IncrementalJSONParser, parse_structured, describe_schema, parse_stats
+)
+from utils.token_utils import count_tokens, truncate_to_tokens, pack_answers
+from utils.highlight import build_snippet
 from models import Document
+from app import startup_phase
 from config import Config
 
 class AIService:
@@ -32,7 +46,10 @@ class AIService:
         else:
             self._init_openai()
             
-        self.document_processor = DocumentProcessor()
+        # Shared with routes, so the process holds one copy of the index
+        self.document_processor = get_document_processor()
+        self.rate_limiter = get_rate_limiter()
+        self.metrics = get_metrics()
     
     def _init_google_ai(self):
         """Initialize Google AI Studio client"""
@@ -66,32 +83,30 @@ class AIService:
         else:
             raise ValueError("No valid AI API key found")
     
-    def process_query(self, question: str) -> Tuple[List[Dict], List[Dict]]:
-        """Process a query and return individual answers and themes"""
+    def process_query(self, question: str, priority: str = PRIORITY_INTERACTIVE,
+                      stats: Dict[str, Any] = None, filters: Dict[str, Any] = None) -> Tuple[List[Dict], List[Dict]]:
+        """Process a query and return individual answers and themes.
+        
+        If ``stats`` is given it is filled with context-packing and pipeline statistics.
+        ``filters`` restricts the search to some documents (see VectorStore.search).
+        """
+        if stats is None:
+            stats = {}
         try:
-            # Search for relevant document chunks
-            relevant_chunks = self.document_processor.search_similar_chunks(
-                question, 
-                limit=Config.MAX_DOCUMENTS_PER_QUERY
-            )
-            
-            if not relevant_chunks:
-                return [], []
-            
-            # Filter by similarity threshold
-            filtered_chunks = [
-                (chunk, score) for chunk, score in relevant_chunks
-                if score >= Config.SIMILARITY_THRESHOLD
-            ]
+            filtered_chunks = self._find_relevant_chunks(question, filters)
             
             if not filtered_chunks:
                 return [], []
             
+            if Config.THEME_PIPELINE_ENABLED:
+                # Start theme synthesis while the remaining extractions are still running
+                return self._process_pipelined(question, filtered_chunks, priority, stats)
+            
             # Extract individual answers from each relevant chunk
-            individual_answers = self._extract_individual_answers(question, filtered_chunks)
+            individual_answers = self._extract_individual_answers(question, filtered_chunks, priority, stats)
             
             # Identify themes across all answers
-            themes = self._identify_themes(question, individual_answers)
+            themes = self._identify_themes(question, individual_answers, priority, stats)
             
             return individual_answers, themes
             
@@ -99,117 +114,550 @@ class AIService:
             logging.error(f"Error processing query: {str(e)}")
             raise
     
-    def _extract_individual_answers(self, question: str, chunks_with_scores: List[Tuple]) -> List[Dict]:
-        """Extract answers from individual document chunks"""
-        individual_answers = []
+    def _find_relevant_chunks(self, question: str, filters: Dict[str, Any] = None) -> List[Tuple]:
+        """Search for document chunks relevant to the question above the similarity threshold"""
+        # Search for relevant document chunks
+        relevant_chunks = self.document_processor.search_similar_chunks(
+            question, 
+            limit=Config.MAX_DOCUMENTS_PER_QUERY,
+            filters=filters
+        )
+        
+        # Filter by similarity threshold
+        return [
+            (chunk, score, matches) for chunk, score, matches in relevant_chunks
+            if score >= Config.SIMILARITY_THRESHOLD
+        ]
+    
+    def stream_query(self, question: str, priority: str = PRIORITY_INTERACTIVE,
+                     stats: Dict[str, Any] = None, filters: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Process a query, yielding events as partial results are generated.
+        
+        Themes start on the same trigger as _process_pipelined when THEME_PIPELINE_ENABLED,
+        otherwise once every answer is in. Events are dicts with an ``event`` key:
+        - ``search``: number of relevant chunks found
+        - ``answer_partial``: the answer text generated so far for a chunk
+        - ``answer``: a finished individual answer (``late_answer`` if themes had started)
+        - ``answer_skipped``: the chunk held no relevant answer
+        - ``answer_failed``: extraction failed for a chunk
+        - ``themes_partial``: the partially generated themes list
+        - ``done``: final ``individual_answers`` and ``themes``
+        """
+        if stats is None:
+            stats = {}
+        
+        filtered_chunks = self._find_relevant_chunks(question, filters)
+        yield {'event': 'search', 'chunks': len(filtered_chunks)}
+        if not filtered_chunks:
+            yield {'event': 'done', 'individual_answers': [], 'themes': []}
+            return
+        
+        snapshots = [self._chunk_snapshot(chunk, score, matches) for chunk, score, matches in filtered_chunks]
+        chunk_budget = self._prompt_budget()['chunk_tokens']
+        deadline = time.time() + Config.THEME_PIPELINE_TIME_BUDGET
+        events = queue.Queue()
         
-        for chunk, similarity_score in chunks_with_scores:
+        def extract(snapshot):
+            def on_partial(value):
+                if isinstance(value, dict) and isinstance(value.get('answer'), str):
+                    events.put({'event': 'answer_partial', 'chunk_id': snapshot['chunk_id'],
+                                'document_id': snapshot['document_id'], 'answer': value['answer']})
             try:
-                # Prepare the prompt for answer extraction
-                prompt = f"""
-                You are an expert document analyst. Given the following question and document excerpt, 
-                extract a precise answer if one exists. If no relevant answer exists, respond with "No relevant answer found."
+                answer = self._extract_answer(question, snapshot, chunk_budget, priority, on_partial)
+                events.put({'event': 'answer', 'chunk_id': snapshot['chunk_id'], 'answer': answer})
+            except Exception as e:
+                logging.error(f"Error extracting answer from chunk {snapshot['chunk_id']}: {str(e)}")
+                events.put({'event': 'answer_failed', 'chunk_id': snapshot['chunk_id']})
+        
+        def identify(answers):
+            def on_partial(value):
+                if isinstance(value, dict) and isinstance(value.get('themes'), list):
+                    events.put({'event': 'themes_partial', 'themes': value['themes']})
+            themes = []
+            try:
+                themes = self._identify_themes(question, answers, priority, stats, on_partial)
+            except Exception as e:
+                logging.error(f"Error identifying themes: {str(e)}")
+            finally:
+                events.put({'event': 'themes', 'themes': themes})
+        
+        answers = []
+        failed_chunks = 0
+        themes = None
+        themed_count = None
+        speculative = False
+        # One extra worker so theme synthesis never waits behind queued extractions
+        with ThreadPoolExecutor(max_workers=Config.ANSWER_EXTRACTION_WORKERS + 1) as executor:
+            for snapshot in snapshots:
+                self._submit(executor, extract, snapshot)
+            
+            remaining = len(snapshots)
+            while remaining or themes is None:
+                if themed_count is None and (not remaining or (Config.THEME_PIPELINE_ENABLED
+                                                               and self._themes_ready(answers, deadline))):
+                    themed_count = len(answers)
+                    speculative = remaining > 0
+                    self._submit(executor, identify, sorted(answers, key=self._answer_sort_key, reverse=True))
                 
-                Question: {question}
+                # Before the deadline, wake up at it so the time-based trigger can fire
+                remaining_time = deadline - time.time()
+                timed = themed_count is None and Config.THEME_PIPELINE_ENABLED and remaining_time > 0
+                try:
+                    event = events.get(timeout=remaining_time if timed else None)
+                except queue.Empty:
+                    continue
                 
-                Document Content: {chunk.content}
+                if event['event'] == 'answer':
+                    remaining -= 1
+                    if event['answer'] is None:
+                        yield {'event': 'answer_skipped', 'chunk_id': event['chunk_id']}
+                        continue
+                    if themed_count is not None:
+                        event['answer']['late_answer'] = True
+                    answers.append(event['answer'])
+                elif event['event'] == 'answer_failed':
+                    remaining -= 1
+                    failed_chunks += 1
+                elif event['event'] == 'themes':
+                    themes = event['themes']
+                    continue
+                yield event
+        
+        answers.sort(key=self._answer_sort_key, reverse=True)
+        stats['failed_chunks'] = failed_chunks
+        stats['truncated_chunks'] = self._count_truncated(snapshots, chunk_budget)
+        stats['theme_pipeline'] = {
+            'speculative': speculative,
+            'themed_answers': themed_count,
+            'late_answers': len(answers) - themed_count
+        }
+        yield {'event': 'done', 'individual_answers': answers, 'themes': themes}
+    
+    def _process_pipelined(self, question: str, chunks_with_scores: List[Tuple], priority: str,
+                           stats: Dict[str, Any]) -> Tuple[List[Dict], List[Dict]]:
+        """Overlap theme identification with answer extraction.
+        
+        Themes are synthesized as soon as THEME_PIPELINE_TOP_N confident answers are in,
+        or once THEME_PIPELINE_TIME_BUDGET has elapsed with at least one answer. Answers
+        that arrive afterwards are returned alongside, flagged with ``late_answer``.
+        """
+        snapshots = [self._chunk_snapshot(chunk, score, matches) for chunk, score, matches in chunks_with_scores]
+        chunk_budget = self._prompt_budget()['chunk_tokens']
+        deadline = time.time() + Config.THEME_PIPELINE_TIME_BUDGET
+        
+        answers = []
+        failed_chunks = []
+        theme_future = None
+        themed_count = 0
+        
+        # One extra worker so theme synthesis never waits behind queued extractions
+        with ThreadPoolExecutor(max_workers=Config.ANSWER_EXTRACTION_WORKERS + 1) as executor:
+            pending = {
+                self._submit(executor, self._extract_answer, question, snapshot, chunk_budget, priority): snapshot
+                for snapshot in snapshots
+            }
+            
+            while pending:
+                # Past the deadline only a completed extraction can fire the trigger, so block for one
+                remaining = deadline - time.time()
+                timeout = None if theme_future or remaining <= 0 else remaining
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
                 
-                Provide your response in JSON format:
-                {{
-                    "answer": "extracted answer or 'No relevant answer found'",
-                    "confidence": 0.0-1.0,
-                    "relevant": true/false
-                }}
-                """
+                for future in done:
+                    snapshot = pending.pop(future)
+                    try:
+                        answer = future.result()
+                    except Exception as e:
+                        logging.error(f"Error extracting answer from chunk {snapshot['chunk_id']}: {str(e)}")
+                        failed_chunks.append(snapshot['chunk_id'])
+                        continue
+                    if answer:
+                        if theme_future:
+                            answer['late_answer'] = True
+                        answers.append(answer)
                 
+                if theme_future is None and pending:
+                    if self._themes_ready(answers, deadline):
+                        early_answers = sorted(answers, key=self._answer_sort_key, reverse=True)
+                        themed_count = len(early_answers)
+                        theme_future = self._submit(
+                            executor, self._identify_themes, question, early_answers, priority, stats
+                        )
+            
+            answers.sort(key=self._answer_sort_key, reverse=True)
+            if theme_future is None:
+                # Everything finished before the trigger fired; synthesize over all answers
+                themed_count = len(answers)
+                themes = self._identify_themes(question, answers, priority, stats)
+            else:
+                themes = theme_future.result()
+        
+        stats['failed_chunks'] = len(failed_chunks)
+        stats['truncated_chunks'] = self._count_truncated(snapshots, chunk_budget)
+        stats['theme_pipeline'] = {
+            'speculative': theme_future is not None,
+            'themed_answers': themed_count,
+            'late_answers': len(answers) - themed_count
+        }
+        if failed_chunks:
+            logging.warning(f"Answer extraction failed for {len(failed_chunks)} of {len(snapshots)} chunks: {failed_chunks}")
+        
+        return answers, themes
+    
+    def _complete(self, prompt: str, system_prompt: str = None, temperature: float = 0.3,
+                  max_tokens: int = None, json_mode: bool = True,
+                  priority: str = PRIORITY_INTERACTIVE) -> str:
+        """Send a prompt to the configured provider through the rate limiter and return the raw text"""
+        # Providers bill prompt plus completion; the completion size is only known afterwards
+        prompt_tokens = count_tokens(prompt) + count_tokens(system_prompt)
+        estimated_tokens = prompt_tokens + (max_tokens or 1000)
+        
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            waited = self.rate_limiter.acquire(self.ai_provider, estimated_tokens, priority)
+            trace_count('rate_limit_wait_ms', round(waited * 1000, 1))
+            self._record_call(prompt_tokens)
+            try:
+                text = self._complete_once(prompt, system_prompt, temperature, max_tokens, json_mode)
+                self._record_completion(text)
+                return text
+            except Exception as e:
+                self._record_error(e)
+                if not self._is_rate_limit_error(e) or attempt == Config.LLM_MAX_RETRIES:
+                    raise
+                logging.warning(f"{self.ai_provider} rate limit hit, backing off (attempt {attempt + 1}): {str(e)}")
+                self.rate_limiter.penalize(self.ai_provider, Config.LLM_RATE_LIMIT_BACKOFF)
+    
+    def _complete_once(self, prompt: str, system_prompt: str, temperature: float,
+                       max_tokens: int, json_mode: bool) -> str:
+        """Make a single non-streaming call to the configured provider"""
+        if self.ai_provider == 'google':
+            response = self.client.generate_content(prompt)
+            return response.text
+        elif self.ai_provider == 'openrouter':
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            kwargs = {'max_tokens': max_tokens} if max_tokens else {}
+            response = self.client.chat.completions.create(
+                model="anthropic/claude-3.5-sonnet",  # Using Claude via OpenRouter
+                messages=messages,
+                temperature=temperature,
+                **kwargs
+            )
+            return response.choices[0].message.content
+        elif self.ai_provider == 'anthropic':
+            kwargs = {'system': system_prompt} if system_prompt else {}
+            response = self.client.messages.create(
+                model="claude-3-5-sonnet-20241022",  # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
+                max_tokens=max_tokens or 1024,
+                temperature=temperature,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+            return response.content[0].text
+        else:
+            messages = [{"role": "user", "content": prompt}]
+            if system_prompt:
+                messages.insert(0, {"role": "system", "content": system_prompt})
+            kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
+            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+            # do not change this unless explicitly requested by the user
+            response = self.client.chat.completions.create(
+                model=Config.OPENAI_MODEL,
+                messages=messages,
+                temperature=temperature,
+                **kwargs
+            )
+            return response.choices[0].message.content
+    
+    def _complete_stream(self, prompt: str, system_prompt: str = None, temperature: float = 0.3,
+                         max_tokens: int = None, json_mode: bool = True,
+                         priority: str = PRIORITY_INTERACTIVE) -> Iterator[str]:
+        """Stream a completion from the configured provider, yielding text deltas as they arrive"""
+        prompt_tokens = count_tokens(prompt) + count_tokens(system_prompt)
+        estimated_tokens = prompt_tokens + (max_tokens or 1000)
+        
+        for attempt in range(Config.LLM_MAX_RETRIES + 1):
+            waited = self.rate_limiter.acquire(self.ai_provider, estimated_tokens, priority)
+            trace_count('rate_limit_wait_ms', round(waited * 1000, 1))
+            self._record_call(prompt_tokens)
+            started = False
+            try:
                 if self.ai_provider == 'google':
-                    response = self.client.generate_content(prompt)
-                    try:
-                        answer_data = json.loads(response.text)
-                    except json.JSONDecodeError:
-                        # Handle malformed JSON by extracting relevant parts
-                        content = response.text
-                        answer_data = {'answer': content, 'confidence': 0.5, 'relevant': True}
-                elif self.ai_provider == 'openrouter':
-                    response = self.client.chat.completions.create(
-                        model="anthropic/claude-3.5-sonnet",  # Using Claude via OpenRouter
-                        messages=[
-                            {"role": "system", "content": "You are a precise document analyst that extracts specific answers from text."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        max_tokens=500,
-                        temperature=0.3
-                    )
-                    try:
-                        answer_data = json.loads(response.choices[0].message.content)
-                    except json.JSONDecodeError:
-                        # Handle malformed JSON by extracting relevant parts
-                        content = response.choices[0].message.content
-                        answer_data = {'answer': content, 'confidence': 0.5, 'relevant': True}
+                    for chunk in self.client.generate_content(prompt, stream=True):
+                        if chunk.text:
+                            started = True
+                            yield chunk.text
                 elif self.ai_provider == 'anthropic':
-                    response = self.client.messages.create(
-                        model="claude-3-5-sonnet-20241022",  # the newest Anthropic model is "claude-3-5-sonnet-20241022" which was released October 22, 2024
-                        max_tokens=500,
-                        temperature=0.3,
-                        messages=[{"role": "user", "content": prompt}]
-                    )
-                    try:
-                        answer_data = json.loads(response.content[0].text)
-                    except json.JSONDecodeError:
-                        content = response.content[0].text
-                        answer_data = {'answer': content, 'confidence': 0.5, 'relevant': True}
+                    kwargs = {'system': system_prompt} if system_prompt else {}
+                    with self.client.messages.stream(
+                        model="claude-3-5-sonnet-20241022",
+                        max_tokens=max_tokens or 1024,
+                        temperature=temperature,
+                        messages=[{"role": "user", "content": prompt}],
+                        **kwargs
+                    ) as stream:
+                        for text in stream.text_stream:
+                            started = True
+                            yield text
                 else:
-                    # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                    # do not change this unless explicitly requested by the user
+                    messages = [{"role": "user", "content": prompt}]
+                    if system_prompt:
+                        messages.insert(0, {"role": "system", "content": system_prompt})
+                    if self.ai_provider == 'openrouter':
+                        model = "anthropic/claude-3.5-sonnet"
+                        kwargs = {'max_tokens': max_tokens} if max_tokens else {}
+                    else:
+                        model = Config.OPENAI_MODEL
+                        kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
                     response = self.client.chat.completions.create(
-                        model=Config.OPENAI_MODEL,
-                        messages=[
-                            {"role": "system", "content": "You are a precise document analyst that extracts specific answers from text."},
-                            {"role": "user", "content": prompt}
-                        ],
-                        response_format={"type": "json_object"},
-                        temperature=0.1
+                        model=model,
+                        messages=messages,
+                        temperature=temperature,
+                        stream=True,
+                        **kwargs
                     )
-                    try:
-                        answer_data = json.loads(response.choices[0].message.content)
-                    except json.JSONDecodeError:
-                        content = response.choices[0].message.content
-                        answer_data = {'answer': content, 'confidence': 0.5, 'relevant': True}
-                
-                # Only include relevant answers
-                if answer_data.get('relevant', False) and answer_data.get('answer', '').lower() != 'no relevant answer found':
-                    answer_entry = {
-                        'document_id': chunk.document.id,
-                        'document_filename': chunk.document.original_filename,
-                        'answer': answer_data['answer'],
-                        'citation': f"Page {chunk.page_number}, Para {chunk.paragraph_number}",
-                        'confidence': answer_data.get('confidence', 0.0),
-                        'similarity_score': similarity_score,
-                        'page_number': chunk.page_number,
-                        'paragraph_number': chunk.paragraph_number
-                    }
-                    individual_answers.append(answer_entry)
-                
+                    for event in response:
+                        if event.choices and event.choices[0].delta.content:
+                            started = True
+                            yield event.choices[0].delta.content
+                return
             except Exception as e:
-                logging.error(f"Error extracting answer from chunk {chunk.id}: {str(e)}")
-                continue
+                self._record_error(e)
+                # Text already forwarded to the caller cannot be retracted, so only retry before it
+                if started or not self._is_rate_limit_error(e) or attempt == Config.LLM_MAX_RETRIES:
+                    raise
+                logging.warning(f"{self.ai_provider} rate limit hit, backing off (attempt {attempt + 1}): {str(e)}")
+                self.rate_limiter.penalize(self.ai_provider, Config.LLM_RATE_LIMIT_BACKOFF)
+    
+    def _complete_structured(self, prompt: str, schema: Dict[str, Any], schema_name: str,
+                             priority: str = PRIORITY_INTERACTIVE,
+                             on_partial: Callable[[Any], None] = None, **kwargs) -> Dict[str, Any]:
+        """Complete a prompt and parse the response against a schema.
+        
+        Fenced or prose-wrapped JSON is unwrapped first; if the response still does not
+        validate, the model gets one targeted repair request. Raises StructuredOutputError
+        if the repaired response is also unusable.
+        
+        With ``on_partial`` the completion is streamed and the callback receives each
+        new partial parse of the JSON as it grows.
+        """
+        with trace_span(f"llm.{schema_name}"):
+            if on_partial:
+                parser = IncrementalJSONParser()
+                last_value = None
+                for delta in self._complete_stream(prompt, priority=priority, **kwargs):
+                    value = parser.feed(delta)
+                    if value is not None and value != last_value:
+                        last_value = value
+                        on_partial(value)
+                content = parser.buffer
+                self._record_completion(content)
+            else:
+                content = self._complete(prompt, priority=priority, **kwargs)
+        try:
+            result = parse_structured(content, schema)
+            parse_stats.record(schema_name, 'ok')
+            return result
+        except StructuredOutputError as e:
+            logging.warning(f"Unparseable {schema_name} response ({str(e)}), requesting repair")
+            error = e
+        
+        repair_prompt = f"""
+        Your previous response could not be parsed: {str(error)}
+        
+        Previous response:
+        {truncate_to_tokens(content, 2000)}
+        
+        Return ONLY a JSON object with exactly this structure, no markdown fences and no commentary:
+        {describe_schema(schema)}
+        """
+        with trace_span(f"llm.{schema_name}.repair"):
+            repaired = self._complete(repair_prompt, priority=priority, temperature=0.0,
+                                      max_tokens=kwargs.get('max_tokens'))
+        try:
+            result = parse_structured(repaired, schema)
+            parse_stats.record(schema_name, 'repaired')
+            return result
+        except StructuredOutputError as e:
+            parse_stats.record(schema_name, 'failed')
+            raise StructuredOutputError(f"{schema_name} response unparseable after repair: {str(e)}")
+    
+    def _record_call(self, prompt_tokens: int):
+        trace_count('llm_calls')
+        trace_count('prompt_tokens', prompt_tokens)
+        self.metrics.inc('llm_requests_total', provider=self.ai_provider)
+        self.metrics.inc('llm_tokens_total', prompt_tokens, provider=self.ai_provider, direction='prompt')
+    
+    def _record_completion(self, text: str):
+        completion_tokens = count_tokens(text)
+        trace_count('completion_tokens', completion_tokens)
+        self.metrics.inc('llm_tokens_total', completion_tokens, provider=self.ai_provider, direction='completion')
+    
+    def _record_error(self, error: Exception):
+        kind = 'rate_limit' if self._is_rate_limit_error(error) else type(error).__name__
+        self.metrics.inc('llm_errors_total', provider=self.ai_provider, kind=kind)
+    
+    def _prompt_budget(self) -> Dict[str, int]:
+        """Token budgets for content embedded in prompts for the active provider"""
+        return Config.LLM_PROMPT_BUDGETS.get(self.ai_provider, Config.LLM_PROMPT_BUDGETS['default'])
+    
+    @staticmethod
+    def _is_rate_limit_error(error: Exception) -> bool:
+        """Check whether a provider SDK exception is a rate-limit (HTTP 429) error"""
+        if getattr(error, 'status_code', None) == 429 or getattr(error, 'code', None) == 429:
+            return True
+        name = type(error).__name__
+        return 'RateLimit' in name or 'ResourceExhausted' in name or 'TooManyRequests' in name
+    
+    @staticmethod
+    def _submit(executor: ThreadPoolExecutor, fn: Callable, *args):
+        """Submit work to a pool so it inherits the caller's context (e.g. the active query trace)"""
+        return executor.submit(contextvars.copy_context().run, fn, *args)
+    
+    @staticmethod
+    def _chunk_snapshot(chunk, similarity_score: float, matches: List[List[int]]) -> Dict[str, Any]:
+        """Copy the chunk fields used for extraction so worker threads never touch the ORM session"""
+        return {
+            'chunk_id': chunk.id,
+            'content': chunk.content,
+            'document_id': chunk.document.id,
+            'document_filename': chunk.document.original_filename,
+            'page_number': chunk.page_number,
+            'paragraph_number': chunk.paragraph_number,
+            'similarity_score': similarity_score,
+            'matches': matches
+        }
+    
+    @staticmethod
+    def _count_truncated(snapshots: List[Dict[str, Any]], chunk_budget: int) -> int:
+        return sum(1 for snapshot in snapshots if count_tokens(snapshot['content']) > chunk_budget)
+    
+    @staticmethod
+    def _themes_ready(answers: List[Dict], deadline: float) -> bool:
+        """Pipelining trigger: enough confident answers, or the time budget spent with at least one answer"""
+        confident = [a for a in answers if a['confidence'] >= Config.THEME_PIPELINE_MIN_CONFIDENCE]
+        return len(confident) >= Config.THEME_PIPELINE_TOP_N or bool(answers and time.time() >= deadline)
+    
+    @staticmethod
+    def _answer_sort_key(answer: Dict) -> Tuple:
+        return (answer['confidence'], answer['similarity_score'])
+    
+    def _extract_individual_answers(self, question: str, chunks_with_scores: List[Tuple],
+                                    priority: str = PRIORITY_INTERACTIVE,
+                                    stats: Dict[str, Any] = None) -> List[Dict]:
+        """Extract answers from individual document chunks"""
+        individual_answers = []
+        failed_chunks = []
+        chunk_budget = self._prompt_budget()['chunk_tokens']
+        snapshots = [self._chunk_snapshot(chunk, score, matches) for chunk, score, matches in chunks_with_scores]
+        
+        with ThreadPoolExecutor(max_workers=Config.ANSWER_EXTRACTION_WORKERS) as executor:
+            futures = {
+                self._submit(executor, self._extract_answer, question, snapshot, chunk_budget, priority): snapshot
+                for snapshot in snapshots
+            }
+            for future, snapshot in futures.items():
+                try:
+                    answer = future.result()
+                    if answer:
+                        individual_answers.append(answer)
+                except Exception as e:
+                    logging.error(f"Error extracting answer from chunk {snapshot['chunk_id']}: {str(e)}")
+                    failed_chunks.append(snapshot['chunk_id'])
+        
+        if stats is not None:
+            stats['failed_chunks'] = len(failed_chunks)
+            stats['truncated_chunks'] = self._count_truncated(snapshots, chunk_budget)
+        
+        if failed_chunks:
+            logging.warning(f"Answer extraction failed for {len(failed_chunks)} of {len(chunks_with_scores)} chunks: {failed_chunks}")
         
         # Sort by confidence and similarity
-        individual_answers.sort(key=lambda x: (x['confidence'], x['similarity_score']), reverse=True)
+        individual_answers.sort(key=self._answer_sort_key, reverse=True)
         
         return individual_answers
     
-    def _identify_themes(self, question: str, individual_answers: List[Dict]) -> List[Dict]:
+    def _extract_answer(self, question: str, snapshot: Dict[str, Any], chunk_budget: int,
+                        priority: str = PRIORITY_INTERACTIVE,
+                        on_partial: Callable[[Any], None] = None) -> Dict:
+        """Extract an answer from a single chunk snapshot; returns None if the chunk is not relevant"""
+        chunk_content = truncate_to_tokens(snapshot['content'], chunk_budget)
+        
+        # Prepare the prompt for answer extraction
+        prompt = f"""
+        You are an expert document analyst. Given the following question and document excerpt, 
+        extract a precise answer if one exists. If no relevant answer exists, respond with "No relevant answer found."
+        
+        Question: {question}
+        
+        Document Content: {chunk_content}
+        
+        Provide your response in JSON format:
+        {{
+            "answer": "extracted answer or 'No relevant answer found'",
+            "confidence": 0.0-1.0,
+            "relevant": true/false
+        }}
+        """
+        
+        # Unparseable responses raise rather than leaking raw model text into the theme prompt
+        answer_data = self._complete_structured(
+            prompt,
+            ANSWER_SCHEMA,
+            'answer',
+            system_prompt="You are a precise document analyst that extracts specific answers from text.",
+            # OpenAI extractions have always run cooler than the other providers
+            temperature=0.1 if self.ai_provider == 'openai' else 0.3,
+            max_tokens=500,
+            priority=priority,
+            on_partial=on_partial
+        )
+        
+        # Only include relevant answers
+        if not answer_data.get('relevant', False) or answer_data['answer'].strip().rstrip('.').lower() == 'no relevant answer found':
+            return None
+        
+        return {
+            'document_id': snapshot['document_id'],
+            'document_filename': snapshot['document_filename'],
+            'answer': answer_data['answer'],
+            'citation': f"Page {snapshot['page_number']}, Para {snapshot['paragraph_number']}",
+            'confidence': answer_data.get('confidence', 0.0),
+            'similarity_score': snapshot['similarity_score'],
+            'page_number': snapshot['page_number'],
+            'paragraph_number': snapshot['paragraph_number'],
+            # Chunk text around the query words, highlighted from the search's match offsets
+            'snippet': build_snippet(snapshot['content'], snapshot['matches'])
+        }
+    
+    def _identify_themes(self, question: str, individual_answers: List[Dict],
+                         priority: str = PRIORITY_INTERACTIVE,
+                         stats: Dict[str, Any] = None,
+                         on_partial: Callable[[Any], None] = None) -> List[Dict]:
         """Identify common themes across individual answers"""
         if not individual_answers:
             return []
         
         try:
+            # Fit the answers into the provider's prompt budget, best answers first
+            packed_answers, packing_stats = pack_answers(
+                individual_answers,
+                self._prompt_budget()['answers_tokens'],
+                lambda a: f"Answer 0 (from {a['document_filename']}): {a['answer']}\n\n"
+            )
+            if stats is not None:
+                stats['context_packing'] = packing_stats
+            if packing_stats['dropped_answers']:
+                logging.info(f"Theme prompt dropped {packing_stats['dropped_answers']} answers "
+                             f"({packing_stats['dropped_tokens']} tokens) to fit budget of "
+                             f"{packing_stats['budget_tokens']} tokens")
+            
             # Prepare answers for theme analysis
             answers_text = ""
             document_references = {}
             
-            for i, answer in enumerate(individual_answers):
+            for i, answer in enumerate(packed_answers):
                 answers_text += f"Answer {i+1} (from {answer['document_filename']}): {answer['answer']}\n\n"
                 doc_key = f"DOC{answer['document_id']:03d}"
                 if doc_key not in document_references:
@@ -251,45 +699,15 @@ class AIService:
             - Minimum confidence threshold is 0.7
             """
             
-            if self.ai_provider == 'google':
-                response = self.client.generate_content(prompt)
-                try:
-                    result = json.loads(response.text)
-                except json.JSONDecodeError:
-                    # Handle malformed JSON
-                    content = response.text
-                    result = {'themes': [{'title': 'Analysis Result', 'summary': content, 'supporting_documents': [], 'confidence': 0.8}]}
-            elif self.ai_provider == 'openrouter':
-                response = self.client.chat.completions.create(
-                    model="anthropic/claude-3.5-sonnet",
-                    messages=[
-                        {"role": "system", "content": "You are an expert thematic analyst who identifies patterns and synthesizes insights across multiple documents."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.2
-                )
-                try:
-                    result = json.loads(response.choices[0].message.content)
-                except json.JSONDecodeError:
-                    content = response.choices[0].message.content
-                    result = {'themes': [{'title': 'Analysis Result', 'summary': content, 'supporting_documents': [], 'confidence': 0.8}]}
-            else:
-                # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-                # do not change this unless explicitly requested by the user
-                response = self.client.chat.completions.create(
-                    model=Config.OPENAI_MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are an expert thematic analyst who identifies patterns and synthesizes insights across multiple documents."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.2
-                )
-                try:
-                    result = json.loads(response.choices[0].message.content)
-                except json.JSONDecodeError:
-                    content = response.choices[0].message.content
-                    result = {'themes': [{'title': 'Analysis Result', 'summary': content, 'supporting_documents': [], 'confidence': 0.8}]}
+            result = self._complete_structured(
+                prompt,
+                THEMES_SCHEMA,
+                'themes',
+                system_prompt="You are an expert thematic analyst who identifies patterns and synthesizes insights across multiple documents.",
+                temperature=0.2,
+                priority=priority,
+                on_partial=on_partial
+            )
             themes = result.get('themes', [])
             
             # Enhance themes with document details
@@ -345,21 +763,32 @@ class AIService:
             }}
             """
             
-            # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            # do not change this unless explicitly requested by the user
-            response = self.client.chat.completions.create(
-                model=Config.OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are a helpful assistant that generates insightful follow-up questions."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.3
+            # Follow-up suggestions are not on the interactive path
+            result = self._complete_structured(
+                prompt,
+                FOLLOW_UP_SCHEMA,
+                'follow_up',
+                system_prompt="You are a helpful assistant that generates insightful follow-up questions.",
+                temperature=0.3,
+                priority=PRIORITY_BACKGROUND
             )
-            
-            result = json.loads(response.choices[0].message.content)
             return result.get('follow_up_questions', [])
             
         except Exception as e:
             logging.error(f"Error generating follow-up questions: {str(e)}")
             return []
+
+
+_ai_service = None
+_ai_service_lock = threading.Lock()
+
+
+def get_ai_service() -> AIService:
+    """Return the process-wide AI service, creating the provider client on first use"""
+    global _ai_service
+    if _ai_service is None:
+        with _ai_service_lock:
+            if _ai_service is None:
+                with startup_phase('ai_service'):
+                    _ai_service = AIService()
+    return _ai_service
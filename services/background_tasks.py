@@ -0,0 +1,66 @@
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from app import app, db
+from models import BackgroundTask
+from config import Config
+
+
+class BackgroundTaskRunner:
+    """Runs long operations on a worker thread, tracking them as BackgroundTask rows.
+
+    Task state lives in the database, so any worker can report on a task; the
+    work itself runs in the worker that accepted it.
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or Config.BACKGROUND_TASK_WORKERS,
+                                           thread_name_prefix='background-task')
+
+    def submit(self, kind: str, params: Dict[str, Any],
+               fn: Callable[[BackgroundTask, Callable[[int], None]], Dict[str, Any]]) -> BackgroundTask:
+        """Record a task and run fn(task, report_progress) in the background; fn returns the result"""
+        task = BackgroundTask(kind=kind, status='queued')
+        task.set_params(params)
+        db.session.add(task)
+        db.session.commit()
+        self.executor.submit(self._run, task.id, fn)
+        return task
+
+    def _run(self, task_id: int, fn):
+        with app.app_context():
+            task = db.session.get(BackgroundTask, task_id)
+            try:
+                task.status = 'running'
+                task.started_at = datetime.utcnow()
+                db.session.commit()
+
+                def report_progress(percent: int):
+                    task.progress = max(0, min(100, int(percent)))
+                    db.session.commit()
+
+                result = fn(task, report_progress)
+                task.set_result(result or {})
+                task.status = 'completed'
+                task.progress = 100
+            except Exception as e:
+                logging.error(f"Error running background task {task_id} ({task.kind}): {str(e)}")
+                db.session.rollback()
+                task.status = 'failed'
+                task.error_message = str(e)
+            finally:
+                task.finished_at = datetime.utcnow()
+                db.session.commit()
+                db.session.remove()
+
+
+_runner = None
+
+
+def get_task_runner() -> BackgroundTaskRunner:
+    """Return the process-wide background task runner"""
+    global _runner
+    if _runner is None:
+        _runner = BackgroundTaskRunner()
+    return _runner
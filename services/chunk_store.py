@@ -0,0 +1,307 @@
+import re
+import sys
+import bisect
+from array import array
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# Metadata kept in typed columns; any other keys go to a sparse per-row dict
+INT_FIELDS = ('page_number', 'paragraph_number')
+STRING_FIELDS = ('document_filename', 'file_type', 'uploaded_at')
+MISSING = -1  # Column value of an absent metadata entry
+
+
+# Positional keyword postings: a row and a character offset per occurrence of each lowercased word
+WORD_RE = re.compile(r'\w+')
+POSITIONS_PER_TERM = 4  # Occurrences kept per term and chunk; enough to place a snippet
+OFFSET_UNKNOWN = 0xFFFF  # Offsets are 16-bit; a word starting past that is indexed without one
+
+
+def _parse_vector_id(vector_id: str) -> Optional[Tuple[int, int]]:
+    """(document id, chunk index) of a VectorStore.vector_id_for id ("doc_<id>_chunk_<index>")"""
+    parts = vector_id.split('_')
+    if len(parts) != 4 or parts[0] != 'doc' or parts[2] != 'chunk':
+        return None
+    try:
+        return int(parts[1]), int(parts[3])
+    except ValueError:
+        return None
+
+
+class StringTable:
+    """Interned strings referenced by index, so a value repeated on every chunk is stored once"""
+
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def id_for(self, value: Optional[str]) -> int:
+        if value is None:
+            return MISSING
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+    def value(self, string_id: int) -> Optional[str]:
+        return None if string_id == MISSING else self.values[string_id]
+
+    def nbytes(self) -> int:
+        return (sys.getsizeof(self.values) + sys.getsizeof(self.ids)
+                + sum(sys.getsizeof(value) for value in self.values))
+
+
+class ChunkColumns(MutableMapping):
+    """Chunks stored column-wise, as the mapping vector id -> {'content', 'metadata'}.
+
+    Text lives UTF-8 encoded in one buffer addressed by offsets, numeric metadata
+    in typed arrays and repeated strings (file names, types, dates) in interned
+    tables, instead of two dicts and a dozen objects per chunk; rows are found
+    through one array per document, indexed by chunk index. Reading an item
+    builds its dicts on demand; search code should use ``rows``/``content`` and
+    build dicts only for results. Every lowercased word is indexed with the
+    offsets where it occurs (``term_rows``/``positions``), so searches and
+    highlighting never re-tokenize chunk text. Removed rows are skipped until
+    enough of them accumulate, then the columns are compacted.
+    """
+
+    def __init__(self):
+        self._text = bytearray()
+        self._offsets = array('q')  # Start of each row's text; a row ends where the next starts
+        self._document_ids = array('q')
+        self._chunk_indexes = array('l')
+        self._ints = {field: array('l') for field in INT_FIELDS}
+        self._strings = {field: array('l') for field in STRING_FIELDS}
+        self._tables = {field: StringTable() for field in STRING_FIELDS}
+        self._simhashes = array('Q')  # 0 when unknown; recomputed from the text when needed
+        self._live = bytearray()
+        self._extras = {}  # row -> metadata keys without a column
+        self._index = {}  # document id -> row of each chunk index, MISSING where there is none
+        self._count = 0  # Live rows
+        self._postings = {}  # term -> array of rows, one per occurrence kept, ascending
+        self._positions = {}  # term -> array of character offsets, parallel to its postings
+        self._dead = 0
+
+    # Mapping interface
+
+    def __getitem__(self, vector_id: str) -> Dict[str, Any]:
+        row = self.row_of(vector_id)
+        if row is None:
+            raise KeyError(vector_id)
+        return {'content': self.content(row), 'metadata': self.metadata(row)}
+
+    def __setitem__(self, vector_id: str, doc_data: Dict[str, Any]):
+        metadata = doc_data['metadata']
+        document_id, chunk_index = int(metadata['document_id']), int(metadata['chunk_index'])
+        if (document_id, chunk_index) != _parse_vector_id(vector_id) or chunk_index < 0:
+            raise ValueError(f"Vector id {vector_id} does not match its metadata")
+
+        old_row = self.row_for_chunk(document_id, chunk_index)
+        if old_row is not None:
+            self._kill(old_row)
+        slots = self._index.get(document_id)
+        if slots is None:
+            slots = self._index[document_id] = array('i')
+        if chunk_index >= len(slots):
+            slots.extend([MISSING] * (chunk_index + 1 - len(slots)))
+        slots[chunk_index] = self._append(doc_data['content'], metadata)
+        self._count += 1
+
+    def __delitem__(self, vector_id: str):
+        row = self.row_of(vector_id)
+        if row is None:
+            raise KeyError(vector_id)
+        slots = self._index[self._document_ids[row]]
+        slots[self._chunk_indexes[row]] = MISSING
+        while slots and slots[-1] == MISSING:
+            slots.pop()
+        if not slots:
+            del self._index[self._document_ids[row]]
+        self._kill(row)
+        if self._dead > 1024 and self._dead > self._count // 4:
+            self.compact()
+
+    def __contains__(self, vector_id) -> bool:
+        return self.row_of(vector_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.vector_id(row) for row in self.rows())
+
+    def __len__(self) -> int:
+        return self._count
+
+    # Row access
+
+    def rows(self) -> Iterator[int]:
+        """Live rows in insertion order"""
+        live = self._live
+        return (row for row in range(len(live)) if live[row])
+
+    def row_of(self, vector_id: str) -> Optional[int]:
+        chunk = _parse_vector_id(vector_id) if isinstance(vector_id, str) else None
+        return self.row_for_chunk(*chunk) if chunk is not None else None
+
+    def row_for_chunk(self, document_id: int, chunk_index: int) -> Optional[int]:
+        slots = self._index.get(document_id)
+        if slots is None or not 0 <= chunk_index < len(slots) or slots[chunk_index] == MISSING:
+            return None
+        return slots[chunk_index]
+
+    def document_rows(self, document_id: int) -> List[int]:
+        """Live rows of a document's chunks, in chunk order"""
+        return [row for row in self._index.get(document_id, ()) if row != MISSING]
+
+    def has_document(self, document_id: int) -> bool:
+        return document_id in self._index
+
+    def vector_id(self, row: int) -> str:
+        return f"doc_{self._document_ids[row]}_chunk_{self._chunk_indexes[row]}"
+
+    def document_id(self, row: int) -> int:
+        return self._document_ids[row]
+
+    def content(self, row: int) -> str:
+        start = self._offsets[row]
+        end = self._offsets[row + 1] if row + 1 < len(self._offsets) else len(self._text)
+        return str(memoryview(self._text)[start:end], 'utf-8')
+
+    def contents(self, rows: Iterable[int] = None) -> Iterator[Tuple[int, str]]:
+        """(row, text) for the given rows, or all live rows"""
+        for row in (self.rows() if rows is None else rows):
+            yield row, self.content(row)
+
+    # Keyword index
+
+    def terms(self) -> Iterable[str]:
+        """Every indexed term, including some only found in removed rows"""
+        return self._postings.keys()
+
+    def term_rows(self, term: str, rows: Set[int] = None) -> Set[int]:
+        """Live rows whose text contains the term, only among the given rows if any"""
+        entries = self._postings.get(term)
+        if not entries:
+            return set()
+        if rows is not None and len(rows) < len(entries):
+            # Fewer candidates than postings: look each one up rather than reading the whole list
+            found = set()
+            for row in rows:
+                position = bisect.bisect_left(entries, row)
+                if position < len(entries) and entries[position] == row:
+                    found.add(row)
+        else:
+            found = set(entries)
+            if rows is not None:
+                found &= rows
+        if self._dead:
+            live = self._live
+            found = {row for row in found if live[row]}
+        return found
+
+    def positions(self, row: int, term: str) -> List[int]:
+        """Character offsets of the term in a row's text (at most POSITIONS_PER_TERM)"""
+        entries = self._postings.get(term)
+        if not entries:
+            return []
+        start = bisect.bisect_left(entries, row)
+        end = bisect.bisect_right(entries, row, start)
+        return [offset for offset in self._positions[term][start:end] if offset != OFFSET_UNKNOWN]
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        metadata = {
+            'document_id': self._document_ids[row],
+            'chunk_index': self._chunk_indexes[row]
+        }
+        for field, column in self._ints.items():
+            if column[row] != MISSING:
+                metadata[field] = column[row]
+        for field, column in self._strings.items():
+            if column[row] != MISSING:
+                metadata[field] = self._tables[field].value(column[row])
+        if self._simhashes[row]:
+            metadata['simhash'] = self._simhashes[row]
+        metadata.update(self._extras.get(row, {}))
+        return metadata
+
+    def update_metadata(self, row: int, values: Dict[str, Any]):
+        """Change metadata values of a row in place (not its document id or chunk index)"""
+        for field, value in values.items():
+            if field in self._ints:
+                self._ints[field][row] = MISSING if value is None else int(value)
+            elif field in self._strings:
+                self._strings[field][row] = self._tables[field].id_for(value)
+            elif field == 'simhash':
+                self._simhashes[row] = value or 0
+            elif field not in ('document_id', 'chunk_index'):
+                self._extras.setdefault(row, {})[field] = value
+
+    # Storage
+
+    def _append(self, content: str, metadata: Dict[str, Any]) -> int:
+        row = len(self._offsets)
+        self._offsets.append(len(self._text))
+        self._text += content.encode('utf-8')
+        self._document_ids.append(int(metadata['document_id']))
+        self._chunk_indexes.append(int(metadata['chunk_index']))
+        for field, column in self._ints.items():
+            value = metadata.get(field)
+            column.append(MISSING if value is None else int(value))
+        for field, column in self._strings.items():
+            column.append(self._tables[field].id_for(metadata.get(field)))
+        self._simhashes.append(metadata.get('simhash') or 0)
+        self._live.append(1)
+        self._index_terms(row, content)
+
+        known = ('document_id', 'chunk_index', 'simhash') + INT_FIELDS + STRING_FIELDS
+        extras = {field: value for field, value in metadata.items() if field not in known}
+        if extras:
+            self._extras[row] = extras
+        return row
+
+    def _index_terms(self, row: int, content: str):
+        postings, positions = self._postings, self._positions
+        seen = {}
+        for match in WORD_RE.finditer(content):
+            term = match.group().lower()
+            count = seen.get(term, 0)
+            if count == POSITIONS_PER_TERM:
+                continue
+            seen[term] = count + 1
+            entries = postings.get(term)
+            if entries is None:
+                entries = postings[term] = array('i')
+                positions[term] = array('H')
+            entries.append(row)
+            positions[term].append(min(match.start(), OFFSET_UNKNOWN))
+
+    def _kill(self, row: int):
+        self._live[row] = 0
+        self._extras.pop(row, None)
+        self._dead += 1
+        self._count -= 1
+
+    def compact(self):
+        """Rebuild the columns from live rows, releasing removed text, postings and unused strings"""
+        compacted = ChunkColumns()
+        for row in self.rows():
+            compacted[self.vector_id(row)] = {'content': self.content(row), 'metadata': self.metadata(row)}
+        self.__dict__.update(compacted.__dict__)
+
+    def nbytes(self) -> Dict[str, int]:
+        """Approximate memory held, per component"""
+        arrays = [self._offsets, self._document_ids, self._chunk_indexes, self._simhashes]
+        arrays += list(self._ints.values()) + list(self._strings.values())
+        usage = {
+            'text': sys.getsizeof(self._text),
+            'columns': sum(sys.getsizeof(column) for column in arrays) + sys.getsizeof(self._live),
+            'strings': sum(table.nbytes() for table in self._tables.values()),
+            # One entry per document, not per chunk, so it is cheap to walk
+            'index': sys.getsizeof(self._index) + sum(sys.getsizeof(document_id) + sys.getsizeof(slots)
+                                                      for document_id, slots in self._index.items()),
+            'extras': sys.getsizeof(self._extras) + sum(sys.getsizeof(extra) for extra in self._extras.values()),
+            'postings': sys.getsizeof(self._postings) + sys.getsizeof(self._positions)
+                        + sum(sys.getsizeof(term) + sys.getsizeof(entries) + sys.getsizeof(self._positions[term])
+                              for term, entries in self._postings.items())
+        }
+        usage['total'] = sum(usage.values())
+        return usage
@@ -1,191 +1,304 @@
 import os
 import logging
 import time
-from typing import List, Tuple
-from app import db
-from models import Document, DocumentChunk
-from services.vector_store import VectorStore
+import threading
+from typing import Any, List, Dict, Tuple, Callable, Optional
+from sqlalchemy import insert
+from app import db, startup_phase
+from models import Document, DocumentChunk, DocumentContent
+from services.vector_store import create_vector_store
 from services.ocr_service import OCRService
-from utils.file_utils import extract_text_from_pdf, extract_text_from_txt
+from services.tracing import trace_span, trace_count
+from services.metrics import get_metrics
+from services.stats_cache import get_stats_cache
+from services.status_events import get_status_broadcaster
+from utils.file_utils import extract_text_from_pdf, extract_text_from_docx, extract_text_from_txt, split_into_chunks, delete_file_safe
+from utils.similarity import simhash, diversify_results
 from config import Config
 
+def extract_document_text(file_path: str, file_type: str, ocr_service: OCRService,
+                          on_page: Callable[[int, int], None] = None) -> str:
+    """Extract text from a file based on its type, falling back to OCR for scanned PDFs.
+    
+    Touches neither the database nor the index, so it can run in worker processes.
+    """
+    if file_type == 'pdf':
+        text = extract_text_from_pdf(file_path, on_page)
+        
+        # If PDF text extraction fails or returns minimal text, try OCR
+        if len(text.strip()) < 50:
+            logging.info(f"PDF text extraction minimal, attempting OCR for {os.path.basename(file_path)}")
+            text = ocr_service.extract_text_from_pdf(file_path)
+            
+    elif file_type == 'image':
+        text = ocr_service.extract_text_from_image(file_path)
+        
+    elif file_type == 'docx':
+        text = extract_text_from_docx(file_path, on_page)
+        
+    elif file_type == 'text':
+        text = extract_text_from_txt(file_path)
+        
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+    
+    return text
+
 class DocumentProcessor:
     """Service for processing and indexing documents"""
     
     def __init__(self):
-        self.vector_store = VectorStore()
+        self.vector_store = create_vector_store()
         self.ocr_service = OCRService()
+        self.metrics = get_metrics()
+        self.stats_cache = get_stats_cache()
+        self.status_events = get_status_broadcaster()
+        
+    def process_document(self, document_id: int, extracted_text: str = None, page_count: int = None):
+        """Process a document: extract text, create chunks, generate embeddings.
         
-    def process_document(self, document_id: int):
-        """Process a document: extract text, create chunks, generate embeddings"""
+        Pass extracted_text (and page_count) when the text was already extracted elsewhere.
+        """
         document = Document.query.get(document_id)
         if not document:
             raise ValueError(f"Document with ID {document_id} not found")
         
+        indexed_ids = []
+        previous_vectors = {}
         try:
             document.processing_status = 'processing'
+            document.pages_extracted = 0
+            document.chunks_total = 0
+            document.chunks_indexed = 0
             db.session.commit()
+            self.stats_cache.invalidate()
+            self.status_events.publish()
+            report_progress = self._progress_reporter()
             
             logging.info(f"Processing document: {document.original_filename}")
             
             # Extract text based on file type
-            extracted_text = self._extract_text(document)
+            def on_page(pages_done, page_count):
+                document.page_count = page_count
+                document.pages_extracted = pages_done
+                report_progress()
+            
+            if extracted_text is None:
+                with self.metrics.time('ingest_stage_seconds', stage='extract'):
+                    extracted_text = self._extract_text(document, on_page)
+            elif page_count:
+                document.page_count = page_count
+                document.pages_extracted = page_count
+            if not document.pages_extracted:
+                document.page_count = 1
+                document.pages_extracted = 1
             
             if not extracted_text.strip():
                 raise ValueError("No text could be extracted from the document")
             
-            # Update document with extracted text
-            document.extracted_text = extracted_text
-            
             # Create text chunks with better citation tracking
-            chunks = self._create_chunks(extracted_text, document.id)
+            with self.metrics.time('ingest_stage_seconds', stage='chunk'):
+                chunks = self._create_chunks(extracted_text, document)
+            document.chunks_total = len(chunks)
+            report_progress(force=True)
             
-            # Generate embeddings and store in vector database
-            vector_ids = self._store_embeddings(chunks)
+            # From here on, text, chunks, index entries and status are written in one transaction
+            document.set_extracted_text(extracted_text)
             
-            # Update document with vector IDs
-            document.set_vector_ids(vector_ids)
+            # Store chunks and their embeddings, replacing any left by an earlier attempt.
+            # Progress cannot be committed inside this transaction, so chunks_indexed goes
+            # from 0 to chunks_total at the commit below; this phase is a few bulk writes.
+            with self.metrics.time('ingest_stage_seconds', stage='index'):
+                # An earlier attempt's vectors share the derived IDs; keep them to restore on failure
+                previous_vectors = self.vector_store.get_vectors(document.get_vector_ids())
+                DocumentChunk.query.filter_by(document_id=document.id).delete()
+                self._insert_chunks(chunks)
+                indexed_ids = [chunk['vector_id'] for chunk in chunks]
+                self._store_embeddings(chunks, document)
+                # An earlier attempt with more chunks leaves vectors this one did not overwrite
+                stale_ids = set(previous_vectors) - set(indexed_ids)
+                if stale_ids:
+                    self.vector_store.delete_vectors(list(stale_ids))
+            
+            document.chunks_indexed = len(chunks)
             document.processing_status = 'completed'
             from datetime import datetime
             document.processed_at = datetime.utcnow()
             
             db.session.commit()
+            self.stats_cache.invalidate()
+            self.status_events.publish()
             
+            self.metrics.inc('ingest_documents_total', status='completed')
+            self.metrics.set_gauge('vector_store_chunks', len(self.vector_store.documents))
             logging.info(f"Successfully processed document: {document.original_filename}")
             
         except Exception as e:
+            db.session.rollback()
+            if indexed_ids:
+                # Keep the index consistent with the rolled-back chunks: drop this attempt's
+                # vectors and put back those of the attempt whose chunk rows were restored
+                self.vector_store.delete_vectors(indexed_ids)
+                if previous_vectors:
+                    self.vector_store.add_documents([(doc_data['content'], doc_data['metadata'])
+                                                     for doc_data in previous_vectors.values()])
             logging.error(f"Error processing document {document.original_filename}: {str(e)}")
             document.processing_status = 'failed'
             document.error_message = str(e)
             db.session.commit()
+            self.stats_cache.invalidate()
+            self.status_events.publish()
+            self.metrics.inc('ingest_documents_total', status='failed')
             raise
     
-    def _extract_text(self, document: Document) -> str:
-        """Extract text from document based on file type"""
-        file_path = document.file_path
+    def _progress_reporter(self) -> Callable[..., None]:
+        """Return a function that commits progress columns, at most every PROGRESS_UPDATE_INTERVAL"""
+        last_report = time.monotonic()
         
-        if document.file_type == 'pdf':
-            text = extract_text_from_pdf(file_path)
-            
-            # If PDF text extraction fails or returns minimal text, try OCR
-            if len(text.strip()) < 50:
-                logging.info(f"PDF text extraction minimal, attempting OCR for {document.original_filename}")
-                text = self.ocr_service.extract_text_from_pdf(file_path)
-                
-        elif document.file_type == 'image':
-            text = self.ocr_service.extract_text_from_image(file_path)
-            
-        elif document.file_type == 'text':
-            text = extract_text_from_txt(file_path)
-            
-        else:
-            raise ValueError(f"Unsupported file type: {document.file_type}")
+        def report(force: bool = False):
+            nonlocal last_report
+            now = time.monotonic()
+            if not force and now - last_report < Config.PROGRESS_UPDATE_INTERVAL:
+                return
+            last_report = now
+            db.session.commit()
+            self.status_events.publish()
         
-        return text
+        return report
+    
+    def _extract_text(self, document: Document, on_page: Callable[[int, int], None] = None) -> str:
+        """Extract text from document based on file type"""
+        return extract_document_text(document.file_path, document.file_type, self.ocr_service, on_page)
     
-    def _create_chunks(self, text: str, document_id: int) -> List[DocumentChunk]:
-        """Create text chunks for better citation and embedding"""
+    def _create_chunks(self, text: str, document: Document) -> List[Dict]:
+        """Create text chunks for better citation and embedding, as rows ready for insertion"""
         chunks = []
         
-        # Split text into paragraphs
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-        
-        current_chunk = ""
-        chunk_index = 0
-        page_number = 1  # Simple page estimation
-        paragraph_number = 1
-        
-        for paragraph in paragraphs:
-            # If adding this paragraph would exceed chunk size, save current chunk
-            if len(current_chunk) + len(paragraph) > Config.CHUNK_SIZE and current_chunk:
-                chunk = DocumentChunk(
-                    document_id=document_id,
-                    chunk_index=chunk_index,
-                    page_number=page_number,
-                    paragraph_number=paragraph_number,
-                    content=current_chunk.strip()
-                )
-                chunks.append(chunk)
-                db.session.add(chunk)
-                
-                chunk_index += 1
-                current_chunk = paragraph
-                
-                # Simple page estimation (every 10 chunks = new page)
-                if chunk_index % 10 == 0:
-                    page_number += 1
-                    paragraph_number = 1
-                else:
-                    paragraph_number += 1
-            else:
-                if current_chunk:
-                    current_chunk += "\n\n" + paragraph
-                else:
-                    current_chunk = paragraph
-        
-        # Add final chunk if there's remaining content
-        if current_chunk.strip():
-            chunk = DocumentChunk(
-                document_id=document_id,
-                chunk_index=chunk_index,
-                page_number=page_number,
-                paragraph_number=paragraph_number,
-                content=current_chunk.strip()
-            )
+        for piece in split_into_chunks(text, Config.CHUNK_SIZE):
+            chunk = dict(piece, document_id=document.id)
+            chunk['vector_id'] = self.vector_store.vector_id_for(chunk)
             chunks.append(chunk)
-            db.session.add(chunk)
         
-        db.session.commit()
         return chunks
     
-    def _store_embeddings(self, chunks: List[DocumentChunk]) -> List[str]:
+    def _insert_chunks(self, chunks: List[Dict]):
+        """Insert chunk rows in batches within the current transaction"""
+        for start in range(0, len(chunks), Config.CHUNK_INSERT_BATCH_SIZE):
+            # executemany; batched into multi-row INSERTs on PostgreSQL
+            db.session.execute(insert(DocumentChunk), chunks[start:start + Config.CHUNK_INSERT_BATCH_SIZE])
+    
+    def _store_embeddings(self, chunks: List[Dict], document: Document) -> List[str]:
         """Generate embeddings and store in vector database"""
-        vector_ids = []
+        items = []
         
         for chunk in chunks:
             # Create metadata for the chunk
             metadata = {
-                'document_id': chunk.document_id,
-                'chunk_index': chunk.chunk_index,
-                'page_number': chunk.page_number,
-                'paragraph_number': chunk.paragraph_number,
-                'document_filename': chunk.document.original_filename
+                'document_id': chunk['document_id'],
+                'chunk_index': chunk['chunk_index'],
+                'page_number': chunk['page_number'],
+                'paragraph_number': chunk['paragraph_number'],
+                'document_filename': document.original_filename,
+                # Used by filtered search
+                'file_type': document.file_type,
+                'uploaded_at': document.uploaded_at.isoformat() if document.uploaded_at else None,
+                # Near-duplicate suppression at query time
+                'simhash': simhash(chunk['content'])
             }
+            items.append((chunk['content'], metadata))
+        
+        # Store in vector database with a single save
+        return self.vector_store.add_documents(items)
+    
+    def delete_documents(self, document_ids: List[int], on_progress: Callable[[int], None] = None) -> dict:
+        """Delete documents with their chunks, content, files and vectors, in batches with one index save.
+        
+        Documents that are currently processing are skipped.
+        """
+        batch_size = Config.BULK_DELETE_BATCH_SIZE
+        deleted = 0
+        files_removed = 0
+        vector_ids = []
+        
+        for start in range(0, len(document_ids), batch_size):
+            batch = document_ids[start:start + batch_size]
+            rows = db.session.query(Document.id, Document.file_path).filter(
+                Document.id.in_(batch),
+                Document.processing_status != 'processing'
+            ).all()
+            ids = [row.id for row in rows]
             
-            # Store in vector database
-            vector_id = self.vector_store.add_document(
-                content=chunk.content,
-                metadata=metadata
-            )
+            if ids:
+                vector_ids.extend(row.vector_id for row in db.session.query(DocumentChunk.vector_id).filter(
+                    DocumentChunk.document_id.in_(ids),
+                    DocumentChunk.vector_id.isnot(None)
+                ))
+                DocumentChunk.query.filter(DocumentChunk.document_id.in_(ids)).delete(synchronize_session=False)
+                DocumentContent.query.filter(DocumentContent.document_id.in_(ids)).delete(synchronize_session=False)
+                Document.query.filter(Document.id.in_(ids)).delete(synchronize_session=False)
+                db.session.commit()
+                deleted += len(ids)
+                
+                # Files go only after their rows are gone
+                files_removed += sum(1 for row in rows if delete_file_safe(row.file_path))
             
-            # Update chunk with vector ID
-            chunk.vector_id = vector_id
-            vector_ids.append(vector_id)
+            if on_progress:
+                on_progress(100 * min(start + batch_size, len(document_ids)) // len(document_ids))
+        
+        # Search skips vectors whose chunks are gone, so the index can be saved once at the end
+        if vector_ids:
+            self.vector_store.delete_vectors(vector_ids)
+        self.stats_cache.invalidate()
+        self.metrics.set_gauge('vector_store_chunks', len(self.vector_store.documents))
         
-        db.session.commit()
-        return vector_ids
+        return {
+            'requested': len(document_ids),
+            'deleted': deleted,
+            'skipped': len(document_ids) - deleted,
+            'files_removed': files_removed,
+            'vectors_removed': len(vector_ids)
+        }
     
-    def search_similar_chunks(self, query: str, limit: int = 20) -> List[Tuple[DocumentChunk, float]]:
-        """Search for similar chunks across all documents"""
+    def search_similar_chunks(self, query: str, limit: int = 20,
+                              filters: Dict[str, Any] = None) -> List[Tuple[DocumentChunk, float, List[List[int]]]]:
+        """Search for similar chunks across all documents, or those matching filters (see VectorStore.search).
+        
+        Returns (chunk, score, matches) with the character ranges of the query words in the chunk content.
+        """
         try:
-            # Search in vector store
-            results = self.vector_store.search(query, limit=limit)
+            # Search in vector store, over-fetching so diversification has alternatives to choose from
+            pool = limit if Config.DIVERSIFICATION_STRATEGY == 'none' else limit * Config.DIVERSITY_CANDIDATE_POOL
+            with trace_span('retrieval.search'):
+                results = self.vector_store.search(query, limit=pool, filters=filters)
+            trace_count('retrieved_chunks', len(results))
+            
+            with trace_span('retrieval.diversify'):
+                diverse = diversify_results(results, limit)
+            trace_count('diversified_out_chunks', min(len(results), limit) - len(diverse))
+            results = diverse
             
             chunk_results = []
-            for result in results:
-                metadata = result.get('metadata', {})
-                document_id = metadata.get('document_id')
-                chunk_index = metadata.get('chunk_index')
+            with trace_span('retrieval.resolve_chunks'):
+                keys = []
+                for result in results:
+                    metadata = result.get('metadata', {})
+                    if metadata.get('document_id') and metadata.get('chunk_index') is not None:
+                        keys.append((metadata['document_id'], metadata['chunk_index']))
+                
+                # One query for all results, put back in result order below
+                chunks = {}
+                if keys:
+                    for chunk in DocumentChunk.query.filter(
+                            db.tuple_(DocumentChunk.document_id, DocumentChunk.chunk_index).in_(keys)
+                    ).order_by(DocumentChunk.id):
+                        chunks.setdefault((chunk.document_id, chunk.chunk_index), chunk)
                 
-                if document_id and chunk_index is not None:
-                    chunk = DocumentChunk.query.filter_by(
-                        document_id=document_id,
-                        chunk_index=chunk_index
-                    ).first()
-                    
+                for result in results:
+                    metadata = result.get('metadata', {})
+                    chunk = chunks.get((metadata.get('document_id'), metadata.get('chunk_index')))
                     if chunk:
                         similarity_score = result.get('score', 0.0)
-                        chunk_results.append((chunk, similarity_score))
+                        chunk_results.append((chunk, similarity_score, result.get('matches', [])))
             
             return chunk_results
             
@@ -195,10 +308,26 @@ class DocumentProcessor:
     
     def get_document_stats(self) -> dict:
         """Get processing statistics"""
-        return {
-            'total': Document.query.count(),
-            'pending': Document.query.filter_by(processing_status='pending').count(),
-            'processing': Document.query.filter_by(processing_status='processing').count(),
-            'completed': Document.query.filter_by(processing_status='completed').count(),
-            'failed': Document.query.filter_by(processing_status='failed').count(),
-        }
+        stats = self.stats_cache.get()
+        return {status: stats[status] for status in ('total', 'pending', 'processing', 'completed', 'failed')}
+
+
+_document_processor = None
+_document_processor_lock = threading.Lock()
+
+
+def get_document_processor() -> DocumentProcessor:
+    """Return the process-wide document processor, loading the index on first use"""
+    global _document_processor
+    if _document_processor is None:
+        # Loading the index is slow; make concurrent first requests wait for one load
+        with _document_processor_lock:
+            if _document_processor is None:
+                with startup_phase('document_processor'):
+                    _document_processor = DocumentProcessor()
+    return _document_processor
+
+
+def loaded_document_processor() -> Optional[DocumentProcessor]:
+    """The process-wide document processor if it has been built, without loading the index"""
+    return _document_processor
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import fcntl
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple
+from config import Config
+
+# Default latency buckets in seconds, from fast index lookups to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_HELP = {
+    'query_duration_seconds': ('histogram', 'End-to-end query processing time'),
+    'query_stage_seconds': ('histogram', 'Time spent in each query stage'),
+    'ingest_stage_seconds': ('histogram', 'Time spent in each document ingestion stage'),
+    'ingest_documents_total': ('counter', 'Documents ingested by outcome'),
+    'llm_requests_total': ('counter', 'LLM API calls per provider'),
+    'llm_errors_total': ('counter', 'Failed LLM API calls per provider and error kind'),
+    'llm_tokens_total': ('counter', 'Estimated LLM tokens per provider and direction'),
+    'llm_parse_total': ('counter', 'Structured-output parse outcomes per schema'),
+    'cache_requests_total': ('counter', 'Cache lookups per cache and result'),
+    'vector_store_chunks': ('gauge', 'Chunks held in the in-memory index of a worker'),
+    'vector_store_bytes': ('gauge', 'Approximate memory held by the in-memory index of a worker'),
+    'process_resident_memory_bytes': ('gauge', 'Resident memory of a worker process'),
+    'llm_queue_depth': ('gauge', 'Callers waiting in the shared LLM rate limiter'),
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def resident_memory_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is the peak, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MetricsRegistry:
+    """Process-local metrics with file-based aggregation across gunicorn workers.
+
+    Each worker updates counters/histograms in memory and writes a snapshot to
+    ``<directory>/worker_<pid>.json`` at most once per flush interval, so the hot
+    path is a dict update under a lock. ``render`` merges every worker's file
+    into Prometheus text exposition format. Counters and histograms of exited
+    workers are folded into ``archive.json`` so totals never go backwards;
+    their gauges are dropped.
+    """
+
+    def __init__(self, directory: str = None, flush_interval: float = None):
+        self.directory = directory or Config.METRICS_DIR
+        self.flush_interval = Config.METRICS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._last_flush = 0.0
+        self._pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        atexit.register(self.flush)
+
+    def _check_fork(self):
+        # A forked worker must not inherit (and re-report) its parent's values
+        if os.getpid() != self._pid:
+            self._pid = os.getpid()
+            self._counters, self._histograms, self._gauges = {}, {}, {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        with self._lock:
+            self._check_fork()
+            key = (name, _label_key(labels))
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a histogram observation (seconds for latency metrics)"""
+        with self._lock:
+            self._check_fork()
+            key = (name, _label_key(labels))
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist['buckets'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+        self._maybe_flush()
+
+    def set_gauge(self, name: str, value: float, _flush: bool = True, **labels):
+        """Set a per-worker gauge"""
+        with self._lock:
+            self._check_fork()
+            self._gauges[(name, _label_key(labels))] = value
+        if _flush:
+            self._maybe_flush()
+
+    @contextmanager
+    def time(self, name: str, **labels):
+        """Observe the duration of a block in a histogram"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def _maybe_flush(self):
+        if time.time() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'counters': [[name, list(map(list, labels)), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(map(list, labels)), hist['buckets'], hist['sum'], hist['count']]
+                               for (name, labels), hist in self._histograms.items()],
+                'gauges': [[name, list(map(list, labels)), value] for (name, labels), value in self._gauges.items()]
+            }
+
+    def flush(self):
+        """Write this worker's snapshot for other workers to aggregate"""
+        # Another thread is already writing a current snapshot
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.time()
+            self.set_gauge('process_resident_memory_bytes', resident_memory_bytes(), _flush=False)
+            snapshot = self._snapshot()
+            path = os.path.join(self.directory, f"worker_{snapshot['pid']}.json")
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Error flushing metrics: {str(e)}")
+        finally:
+            self._flush_lock.release()
+
+    @staticmethod
+    def _merge(into: Dict[str, Dict], snapshot: Dict[str, Any], include_gauges: bool):
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            into['counters'][key] = into['counters'].get(key, 0) + value
+        for name, labels, buckets, total, count in snapshot.get('histograms', []):
+            key = (name, tuple(map(tuple, labels)))
+            hist = into['histograms'].setdefault(key, {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0})
+            hist['buckets'] = [a + b for a, b in zip(hist['buckets'], buckets)]
+            hist['sum'] += total
+            hist['count'] += count
+        if include_gauges:
+            for name, labels, value in snapshot.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)) + (('pid', str(snapshot['pid'])),))
+                into['gauges'][key] = value
+
+    def _archive_dead_workers(self):
+        """Fold snapshots of exited workers into the archive file"""
+        lock_path = os.path.join(self.directory, 'archive.lock')
+        archive_path = os.path.join(self.directory, 'archive.json')
+        with open(lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                dead = []
+                for filename in os.listdir(self.directory):
+                    if filename.startswith('worker_') and filename.endswith('.json'):
+                        pid = int(filename[len('worker_'):-len('.json')])
+                        if pid != os.getpid() and not _pid_alive(pid):
+                            dead.append(os.path.join(self.directory, filename))
+                if not dead:
+                    return
+
+                merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+                for path in [archive_path] + dead:
+                    if os.path.exists(path):
+                        with open(path) as f:
+                            self._merge(merged, json.load(f), include_gauges=False)
+
+                archive = {
+                    'pid': 0,
+                    'counters': [[name, list(map(list, labels)), value] for (name, labels), value in merged['counters'].items()],
+                    'histograms': [[name, list(map(list, labels)), hist['buckets'], hist['sum'], hist['count']]
+                                   for (name, labels), hist in merged['histograms'].items()]
+                }
+                with open(archive_path + '.tmp', 'w') as f:
+                    json.dump(archive, f)
+                os.replace(archive_path + '.tmp', archive_path)
+                for path in dead:
+                    os.remove(path)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def collect(self) -> Dict[str, Dict]:
+        """Merge the snapshots of all workers, live and exited"""
+        self.flush()
+        try:
+            self._archive_dead_workers()
+        except Exception as e:
+            logging.error(f"Error archiving metrics of exited workers: {str(e)}")
+
+        merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue  # Removed or being replaced by another worker
+            self._merge(merged, snapshot, include_gauges=filename.startswith('worker_'))
+        return merged
+
+    def render(self, extra_gauges: List[Tuple[str, Dict[str, Any], float]] = None) -> str:
+        """Render all metrics in Prometheus text exposition format.
+        
+        ``extra_gauges`` are cluster-wide values computed at scrape time, given as
+        (name, labels, value) and reported without a pid label.
+        """
+        merged = self.collect()
+        for name, labels, value in extra_gauges or []:
+            merged['gauges'][(name, _label_key(labels))] = value
+
+        def fmt_labels(labels):
+            if not labels:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in labels)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + '}'
+
+        lines = []
+        families = {}
+        for kind in ('counters', 'histograms', 'gauges'):
+            for (name, labels), value in merged[kind].items():
+                families.setdefault(name, []).append((kind, labels, value))
+
+        for name in sorted(families):
+            metric_type, help_text = METRIC_HELP.get(name, (None, name))
+            kind = families[name][0][0]
+            metric_type = metric_type or {'counters': 'counter', 'histograms': 'histogram', 'gauges': 'gauge'}[kind]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for kind, labels, value in sorted(families[name], key=lambda item: item[1]):
+                if kind == 'histograms':
+                    cumulative = 0
+                    for bound, count in zip(LATENCY_BUCKETS, value['buckets']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{fmt_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {value['sum']}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {value['count']}")
+                else:
+                    lines.append(f"{name}{fmt_labels(labels)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
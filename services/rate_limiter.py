@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any
+from config import Config
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_BACKGROUND = 'background'
+
+
+class RateLimiter:
+    """Token-bucket scheduler for LLM calls, shared across workers through a locked state file.
+
+    Each provider has two buckets (requests per minute and tokens per minute).
+    Callers block in ``acquire`` until both buckets have capacity instead of
+    failing, and background callers yield to any waiting interactive callers.
+    """
+
+    # Waiters that have not refreshed their heartbeat for this long are assumed dead
+    STALE_WAITER_SECONDS = 30.0
+    MAX_SLEEP_SECONDS = 1.0
+
+    def __init__(self, state_file: str = None, limits: Dict[str, Dict[str, int]] = None):
+        self.state_file = state_file or Config.RATE_LIMIT_STATE_FILE
+        self.limits = limits or Config.LLM_RATE_LIMITS
+        # flock() does not serialize threads sharing a descriptor, so guard in-process too
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+
+    def _provider_limits(self, provider: str) -> Dict[str, int]:
+        return self.limits.get(provider, self.limits.get('default', {'rpm': 60, 'tpm': 100000}))
+
+    @contextmanager
+    def _locked_state(self):
+        """Load the shared state under an exclusive lock and write it back on exit"""
+        with self._thread_lock:
+            with open(self.state_file, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    try:
+                        state = json.loads(raw) if raw else {}
+                    except json.JSONDecodeError:
+                        logging.warning("Rate limiter state file corrupt, resetting")
+                        state = {}
+                    state.setdefault('buckets', {})
+                    state.setdefault('waiters', {})
+
+                    yield state
+
+                    f.seek(0)
+                    f.truncate()
+                    json.dump(state, f)
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state: Dict[str, Any], provider: str, now: float) -> Dict[str, float]:
+        """Refill a provider's buckets based on elapsed time"""
+        limits = self._provider_limits(provider)
+        bucket = state['buckets'].get(provider)
+        if bucket is None:
+            bucket = {'requests': float(limits['rpm']), 'tokens': float(limits['tpm']), 'updated': now}
+        else:
+            elapsed = max(0.0, now - bucket['updated'])
+            bucket['requests'] = min(float(limits['rpm']), bucket['requests'] + elapsed * limits['rpm'] / 60.0)
+            bucket['tokens'] = min(float(limits['tpm']), bucket['tokens'] + elapsed * limits['tpm'] / 60.0)
+            bucket['updated'] = now
+        state['buckets'][provider] = bucket
+        return bucket
+
+    def _prune_waiters(self, state: Dict[str, Any], now: float):
+        stale = [key for key, waiter in state['waiters'].items()
+                 if now - waiter['seen'] > self.STALE_WAITER_SECONDS]
+        for key in stale:
+            del state['waiters'][key]
+
+    def acquire(self, provider: str, tokens: int = 0, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """Block until the provider has capacity for one request of ``tokens`` tokens.
+
+        Returns the number of seconds spent waiting in the queue.
+        """
+        limits = self._provider_limits(provider)
+        # A single oversized request must still be admitted once the bucket is full
+        tokens = min(max(int(tokens), 0), limits['tpm'])
+        waiter_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        start = time.time()
+
+        try:
+            while True:
+                with self._locked_state() as state:
+                    now = time.time()
+                    self._prune_waiters(state, now)
+                    state['waiters'][waiter_id] = {'provider': provider, 'priority': priority, 'seen': now}
+
+                    bucket = self._refill(state, provider, now)
+
+                    interactive_waiting = priority == PRIORITY_BACKGROUND and any(
+                        w['provider'] == provider and w['priority'] == PRIORITY_INTERACTIVE
+                        for w in state['waiters'].values()
+                    )
+
+                    if not interactive_waiting and bucket['requests'] >= 1 and bucket['tokens'] >= tokens:
+                        bucket['requests'] -= 1
+                        bucket['tokens'] -= tokens
+                        del state['waiters'][waiter_id]
+                        waited = now - start
+                        if waited > 0.05:
+                            logging.info(f"Rate limiter queued {priority} {provider} call for {waited:.2f}s")
+                        return waited
+
+                    # Time until both buckets have enough capacity
+                    wait_requests = max(0.0, 1 - bucket['requests']) * 60.0 / limits['rpm']
+                    wait_tokens = max(0.0, tokens - bucket['tokens']) * 60.0 / limits['tpm']
+                    wait = max(wait_requests, wait_tokens, 0.05)
+
+                time.sleep(min(wait, self.MAX_SLEEP_SECONDS))
+        finally:
+            with self._locked_state() as state:
+                state['waiters'].pop(waiter_id, None)
+
+    def penalize(self, provider: str, seconds: float):
+        """Drain a provider's request bucket after the provider reported a rate limit"""
+        limits = self._provider_limits(provider)
+        with self._locked_state() as state:
+            bucket = self._refill(state, provider, time.time())
+            bucket['requests'] = min(bucket['requests'], 0.0) - seconds * limits['rpm'] / 60.0
+
+    def queue_depth(self) -> Dict[str, int]:
+        """Number of callers currently waiting, across all workers, by priority"""
+        try:
+            with self._locked_state() as state:
+                self._prune_waiters(state, time.time())
+                depth = {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+                for waiter in state['waiters'].values():
+                    depth[waiter['priority']] = depth.get(waiter['priority'], 0) + 1
+                return depth
+        except Exception as e:
+            logging.error(f"Error reading rate limiter queue depth: {str(e)}")
+            return {PRIORITY_INTERACTIVE: 0, PRIORITY_BACKGROUND: 0}
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
@@ -0,0 +1,71 @@
+import time
+import logging
+import threading
+from typing import Dict
+from sqlalchemy import func
+from app import db
+from models import Document, Query
+from services.metrics import get_metrics
+from config import Config
+
+STATUSES = ('pending', 'processing', 'completed', 'failed')
+
+
+class StatsCache:
+    """Short-TTL cache of dashboard counts, computed with one GROUP BY per refresh.
+
+    Writers in this worker call invalidate() so their own changes show up at
+    once; changes made by other workers become visible within the TTL.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = Config.STATS_CACHE_TTL if ttl is None else ttl
+        self.metrics = get_metrics()
+        self._lock = threading.Lock()
+        self._stats = None
+        self._expires = 0.0
+
+    def get(self) -> Dict[str, int]:
+        """Return document counts per status plus totals, refreshing when stale"""
+        with self._lock:
+            if self._stats is not None and time.monotonic() < self._expires:
+                self.metrics.inc('cache_requests_total', cache='system_stats', result='hit')
+                return dict(self._stats)
+
+        self.metrics.inc('cache_requests_total', cache='system_stats', result='miss')
+        stats = self._compute()
+        with self._lock:
+            self._stats = stats
+            self._expires = time.monotonic() + self.ttl
+        return dict(stats)
+
+    def invalidate(self):
+        """Drop the cached counts so the next read recomputes them"""
+        with self._lock:
+            self._stats = None
+
+    @staticmethod
+    def _compute() -> Dict[str, int]:
+        try:
+            rows = db.session.query(Document.processing_status, func.count(Document.id)) \
+                .group_by(Document.processing_status).all()
+            stats = {status: 0 for status in STATUSES}
+            for status, count in rows:
+                stats[status or 'pending'] = stats.get(status or 'pending', 0) + count
+            stats['total'] = sum(count for _, count in rows)
+            stats['total_queries'] = db.session.query(func.count(Query.id)).scalar() or 0
+            return stats
+        except Exception as e:
+            logging.error(f"Error computing system stats: {str(e)}")
+            raise
+
+
+_stats_cache = None
+
+
+def get_stats_cache() -> StatsCache:
+    """Return the process-wide stats cache"""
+    global _stats_cache
+    if _stats_cache is None:
+        _stats_cache = StatsCache()
+    return _stats_cache
@@ -0,0 +1,41 @@
+import threading
+
+
+class StatusBroadcaster:
+    """Wakes document status streams when ingestion in this worker changes a document.
+
+    Streams also re-read the database on a short interval, so changes made by
+    other workers are picked up without a notification.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        with self._condition:
+            return self._version
+
+    def publish(self):
+        """Signal that a document's status or progress was committed"""
+        with self._condition:
+            self._version += 1
+            self._condition.notify_all()
+
+    def wait(self, version: int, timeout: float) -> int:
+        """Block until something is published after ``version`` or the timeout expires"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._version != version, timeout)
+            return self._version
+
+
+_status_broadcaster = None
+
+
+def get_status_broadcaster() -> StatusBroadcaster:
+    """Return the process-wide status broadcaster"""
+    global _status_broadcaster
+    if _status_broadcaster is None:
+        _status_broadcaster = StatusBroadcaster()
+    return _status_broadcaster
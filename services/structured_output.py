@@ -0,0 +1,375 @@
+import re
+import json
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from services.metrics import get_metrics
+
+# Field specs are a small JSON-Schema subset:
+# {'type': 'string'|'number'|'boolean'|'array'|'object', 'required': bool,
+#  'properties': {...} for objects, 'items': spec for arrays, 'default': value}
+ANSWER_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'answer': {'type': 'string', 'required': True},
+        'confidence': {'type': 'number', 'default': 0.0, 'minimum': 0.0, 'maximum': 1.0},
+        'relevant': {'type': 'boolean', 'default': False}
+    }
+}
+
+THEMES_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'themes': {
+            'type': 'array',
+            'required': True,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string', 'required': True},
+                    'summary': {'type': 'string', 'required': True},
+                    'supporting_documents': {'type': 'array', 'items': {'type': 'string'}, 'default': []},
+                    'confidence': {'type': 'number', 'default': 0.0, 'minimum': 0.0, 'maximum': 1.0}
+                }
+            }
+        }
+    }
+}
+
+FOLLOW_UP_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'follow_up_questions': {'type': 'array', 'required': True, 'items': {'type': 'string'}}
+    }
+}
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*\n?(.*?)(?:\n?```|$)", re.DOTALL)
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a model response cannot be parsed into the expected schema"""
+
+
+def strip_fences(text: str) -> str:
+    """Remove markdown code fences (```json ... ```) around a model response"""
+    if not text:
+        return ""
+    match = _FENCE_RE.search(text)
+    if match:
+        return match.group(1).strip()
+    return text.strip()
+
+
+def _scan(text: str) -> Tuple[List[str], bool, List[Tuple[int, List[str]]]]:
+    """Scan JSON text, returning the open-container stack, whether a string is open,
+    and the positions where the text can be cut and still form a valid prefix."""
+    stack = []
+    in_string = False
+    escape = False
+    cut_points = []
+
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                cut_points.append((i + 1, list(stack)))
+            continue
+
+        if ch == '"':
+            in_string = True
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            cut_points.append((i + 1, list(stack)))
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+            cut_points.append((i + 1, list(stack)))
+            if not stack:
+                break
+        elif ch == ',':
+            cut_points.append((i, list(stack)))
+        elif ch.isdigit() or ch in 'el':
+            # End of a number or of true/false/null
+            cut_points.append((i + 1, list(stack)))
+
+    return stack, in_string, cut_points
+
+
+def extract_json_text(text: str) -> str:
+    """Return the first complete top-level JSON object/array in text (fences removed)"""
+    text = strip_fences(text)
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        raise StructuredOutputError("No JSON object found in response")
+    text = text[min(starts):]
+
+    stack, in_string, cut_points = _scan(text)
+    if stack or in_string:
+        raise StructuredOutputError("Incomplete JSON object in response")
+    return text[:cut_points[-1][0]]
+
+
+def parse_partial_json(text: str) -> Optional[Any]:
+    """Best-effort parse of a JSON prefix, e.g. a response that is still streaming.
+
+    Open strings, arrays and objects are closed; an unfinished trailing key or
+    literal is dropped. Returns None if nothing usable has arrived yet.
+    """
+    text = strip_fences(text)
+    starts = [i for i in (text.find('{'), text.find('[')) if i >= 0]
+    if not starts:
+        return None
+    text = text[min(starts):]
+
+    stack, in_string, cut_points = _scan(text)
+    if not stack and not in_string:
+        try:
+            return json.loads(text[:cut_points[-1][0]] if cut_points else text)
+        except json.JSONDecodeError:
+            pass
+
+    # Most useful while streaming: keep the partial string that is being written
+    if in_string:
+        try:
+            return json.loads(text + '"' + ''.join(reversed(stack)))
+        except json.JSONDecodeError:
+            pass
+
+    for position, open_stack in reversed(cut_points):
+        candidate = text[:position].rstrip().rstrip(',')
+        try:
+            return json.loads(candidate + ''.join(reversed(open_stack)))
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+class IncrementalJSONParser:
+    """Accumulates streamed text deltas and exposes the best partial parse so far.
+
+    Scanner state is kept between deltas, so each delta is scanned once and a feed
+    costs one json.loads of the current prefix instead of rescanning the buffer.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.value = None
+        self._start = None  # Offset of the first '{' or '[' once seen
+        self._position = 0  # Next offset to scan
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._cut = None  # Last (offset, open stack) where the prefix can be closed
+        self._complete = False
+
+    def feed(self, delta: str) -> Optional[Any]:
+        """Append a text delta and return the current partial value"""
+        if not delta or self._complete:
+            self.buffer += delta or ""
+            return self.value
+        self.buffer += delta
+
+        if self._start is None:
+            starts = [i for i in (self.buffer.find('{'), self.buffer.find('[')) if i >= 0]
+            if not starts:
+                return self.value
+            self._start = self._position = min(starts)
+        self._scan()
+
+        parsed = self._parse()
+        if parsed is not None:
+            self.value = parsed
+        return self.value
+
+    def _scan(self):
+        """Advance the scanner over the unscanned part of the buffer (same rules as _scan)"""
+        text = self.buffer
+        stack = self._stack
+        for i in range(self._position, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._cut = (i + 1, tuple(stack))
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in '{[':
+                stack.append('}' if ch == '{' else ']')
+                self._cut = (i + 1, tuple(stack))
+            elif ch in '}]':
+                if stack:
+                    stack.pop()
+                self._cut = (i + 1, tuple(stack))
+                if not stack:
+                    self._complete = True
+                    break
+            elif ch == ',':
+                self._cut = (i, tuple(stack))
+            elif ch.isdigit() or ch in 'el':
+                self._cut = (i + 1, tuple(stack))
+        self._position = len(text)
+
+    def _parse(self) -> Optional[Any]:
+        text = self.buffer[self._start:]
+        candidates = []
+        if self._complete:
+            candidates.append(self.buffer[self._start:self._cut[0]])
+        elif self._in_string:
+            # Most useful while streaming: keep the partial string that is being written
+            candidates.append(text + '"' + ''.join(reversed(self._stack)))
+        if self._cut is not None and not self._complete:
+            position, open_stack = self._cut
+            candidates.append(self.buffer[self._start:position].rstrip().rstrip(',') + ''.join(reversed(open_stack)))
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        return None
+
+
+def _coerce(value: Any, spec: Dict[str, Any], path: str, errors: List[str]) -> Any:
+    """Coerce a value to its spec, appending validation errors"""
+    expected = spec.get('type')
+
+    if expected == 'string':
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float, bool)):
+            return str(value)
+        errors.append(f"{path}: expected string")
+        return None
+
+    if expected == 'number':
+        if isinstance(value, bool):
+            value = float(value)
+        try:
+            number = float(str(value).strip().rstrip('%')) if isinstance(value, str) else float(value)
+        except (TypeError, ValueError):
+            errors.append(f"{path}: expected number")
+            return None
+        if isinstance(value, str) and value.strip().endswith('%'):
+            number /= 100.0
+        if 'minimum' in spec:
+            number = max(spec['minimum'], number)
+        if 'maximum' in spec:
+            number = min(spec['maximum'], number)
+        return number
+
+    if expected == 'boolean':
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in ('true', 'yes', '1'):
+            return True
+        if isinstance(value, str) and value.strip().lower() in ('false', 'no', '0'):
+            return False
+        if isinstance(value, (int, float)):
+            return bool(value)
+        errors.append(f"{path}: expected boolean")
+        return None
+
+    if expected == 'array':
+        if not isinstance(value, list):
+            errors.append(f"{path}: expected array")
+            return None
+        item_spec = spec.get('items')
+        if not item_spec:
+            return value
+        items = []
+        for i, item in enumerate(value):
+            item_errors = []
+            coerced = _coerce(item, item_spec, f"{path}[{i}]", item_errors)
+            if item_errors:
+                errors.extend(item_errors)
+            else:
+                items.append(coerced)
+        return items
+
+    if expected == 'object':
+        if not isinstance(value, dict):
+            errors.append(f"{path}: expected object")
+            return None
+        result = dict(value)
+        for name, field_spec in spec.get('properties', {}).items():
+            field_path = f"{path}.{name}" if path else name
+            if name not in value or value[name] is None:
+                if field_spec.get('required'):
+                    errors.append(f"{field_path}: missing required field")
+                elif 'default' in field_spec:
+                    result[name] = field_spec['default']
+                continue
+            result[name] = _coerce(value[name], field_spec, field_path, errors)
+        return result
+
+    return value
+
+
+def validate(data: Any, schema: Dict[str, Any]) -> Any:
+    """Validate and coerce parsed JSON against a schema, raising StructuredOutputError"""
+    errors = []
+    result = _coerce(data, schema, '', errors)
+    if errors:
+        raise StructuredOutputError("; ".join(errors[:5]))
+    return result
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Any:
+    """Parse a model response (fenced or embedded in prose) and validate it"""
+    try:
+        data = json.loads(extract_json_text(text))
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"Invalid JSON: {str(e)}")
+    return validate(data, schema)
+
+
+def describe_schema(schema: Dict[str, Any]) -> str:
+    """Render a schema as an example JSON skeleton for repair prompts"""
+    def example(spec):
+        kind = spec.get('type')
+        if kind == 'object':
+            return {name: example(field) for name, field in spec.get('properties', {}).items()}
+        if kind == 'array':
+            return [example(spec['items'])] if spec.get('items') else []
+        return {'string': '...', 'number': 0.0, 'boolean': True}.get(kind)
+    return json.dumps(example(schema), indent=2)
+
+
+class ParseStats:
+    """Thread-safe counters of structured-output parse outcomes per schema"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name: str, outcome: str):
+        """Record an outcome: 'ok', 'repaired' or 'failed'"""
+        with self._lock:
+            counts = self._counts.setdefault(name, {'ok': 0, 'repaired': 0, 'failed': 0})
+            counts[outcome] += 1
+        get_metrics().inc('llm_parse_total', schema=name, outcome=outcome)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            result = {}
+            for name, counts in self._counts.items():
+                total = sum(counts.values())
+                result[name] = dict(counts)
+                result[name]['total'] = total
+                # First-pass failures, whether or not the repair retry recovered them
+                result[name]['parse_failure_rate'] = (
+                    (counts['repaired'] + counts['failed']) / total if total else 0.0
+                )
+            return result
+
+
+parse_stats = ParseStats()
@@ -0,0 +1,100 @@
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+from services.metrics import get_metrics
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class QueryTrace:
+    """Collects timed spans and counters for one query.
+
+    The active trace is held in a context variable, so code deep in the services
+    can record spans without the trace being passed around. Work submitted to
+    thread pools must be run with ``contextvars.copy_context().run`` to inherit it.
+    """
+
+    # Keep individual spans bounded; per-stage aggregates are always complete
+    MAX_SPANS = 200
+
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self.stages = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def activate(self):
+        """Make this the current trace for the duration of the block"""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def record(self, name: str, duration: float, start: float = None, **attrs):
+        """Record a finished span"""
+        with self._lock:
+            stage = self.stages.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stage['count'] += 1
+            stage['total_ms'] += duration * 1000
+            stage['max_ms'] = max(stage['max_ms'], duration * 1000)
+            if len(self.spans) < self.MAX_SPANS:
+                span = {
+                    'name': name,
+                    'start_ms': round(((start or time.time() - duration) - self.started) * 1000, 1),
+                    'duration_ms': round(duration * 1000, 1)
+                }
+                if attrs:
+                    span['attrs'] = attrs
+                self.spans.append(span)
+
+    def add(self, counter: str, value: float = 1):
+        """Increment a counter such as a token count"""
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_ms': round((time.time() - self.started) * 1000, 1),
+                'stages': {
+                    name: {
+                        'count': stage['count'],
+                        'total_ms': round(stage['total_ms'], 1),
+                        'max_ms': round(stage['max_ms'], 1)
+                    }
+                    for name, stage in self.stages.items()
+                },
+                'counters': dict(self.counters),
+                'spans': list(self.spans)
+            }
+
+
+def current_trace() -> Optional[QueryTrace]:
+    """Return the active trace, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_span(name: str, **attrs):
+    """Time a block as a span of the current trace and in the query stage histogram"""
+    trace = _current_trace.get()
+    start = time.time()
+    try:
+        yield
+    finally:
+        duration = time.time() - start
+        get_metrics().observe('query_stage_seconds', duration, stage=name)
+        if trace is not None:
+            trace.record(name, duration, start, **attrs)
+
+
+def trace_count(counter: str, value: float = 1):
+    """Increment a counter on the current trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(counter, value)
@@ -0,0 +1,193 @@
+import os
+import uuid
+import fcntl
+import hashlib
+import logging
+import threading
+from datetime import datetime
+from typing import BinaryIO, Optional
+from app import app, db
+from models import Document, UploadSession
+from utils.file_utils import allowed_file, get_file_type, timestamped_filename
+from config import Config
+
+
+class UploadError(Exception):
+    """Raised for upload requests that cannot be applied; carries the HTTP status to return"""
+
+    def __init__(self, message: str, status_code: int = 400, offset: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.offset = offset
+
+
+class ChunkedUploadService:
+    """Resumable uploads streamed straight to disk and hashed while they stream.
+
+    Parts are appended in order at the offset the client sends; the partial file
+    on disk is the source of truth, so any worker can take the next part. The
+    running SHA-256 is kept in memory per upload and rebuilt from disk when
+    another worker received the previous part.
+    """
+
+    def __init__(self):
+        self._hashes = {}  # upload id -> (bytes hashed, sha256 object)
+        self._lock = threading.Lock()
+        os.makedirs(Config.UPLOAD_PARTIAL_FOLDER, exist_ok=True)
+
+    def create(self, filename: str, total_size: int, expected_sha256: str = None) -> UploadSession:
+        """Start an upload of a file of known size"""
+        if not filename or not allowed_file(filename):
+            raise UploadError('Unsupported file type')
+        if total_size <= 0 or total_size > Config.MAX_UPLOAD_SIZE:
+            raise UploadError(f'File size must be between 1 byte and {Config.MAX_UPLOAD_SIZE} bytes', 413)
+
+        upload_id = uuid.uuid4().hex
+        upload = UploadSession(
+            id=upload_id,
+            original_filename=filename,
+            total_size=total_size,
+            expected_sha256=expected_sha256.lower() if expected_sha256 else None,
+            part_path=os.path.join(Config.UPLOAD_PARTIAL_FOLDER, f"{upload_id}.part")
+        )
+        open(upload.part_path, 'wb').close()
+        db.session.add(upload)
+        db.session.commit()
+        return upload
+
+    def received_size(self, upload: UploadSession) -> int:
+        """Bytes stored so far; the client resumes from here"""
+        try:
+            return os.path.getsize(upload.part_path)
+        except OSError:
+            return upload.received_size or 0
+
+    def append(self, upload: UploadSession, offset: int, stream: BinaryIO) -> int:
+        """Append a part read from stream at offset, returning the new offset"""
+        if upload.status != 'uploading':
+            raise UploadError('Upload is already complete', 409)
+
+        with open(upload.part_path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = os.fstat(f.fileno()).st_size
+                if offset != current:
+                    raise UploadError('Offset does not match the bytes received', 409, offset=current)
+
+                digest = self._digest(upload.id, f, current)
+                f.seek(current)
+                while True:
+                    block = stream.read(Config.UPLOAD_STREAM_BLOCK_SIZE)
+                    if not block:
+                        break
+                    if current + len(block) > upload.total_size:
+                        raise UploadError('Upload exceeds the declared size', 413, offset=current)
+                    f.write(block)
+                    digest.update(block)
+                    current += len(block)
+                f.flush()
+
+                with self._lock:
+                    self._hashes[upload.id] = (current, digest)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        upload.received_size = current
+        upload.updated_at = datetime.utcnow()
+        db.session.commit()
+        return current
+
+    def complete(self, upload: UploadSession) -> Document:
+        """Verify a fully received upload and turn it into a pending Document"""
+        if upload.status != 'uploading':
+            raise UploadError('Upload is already complete', 409)
+
+        with open(upload.part_path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                size = os.fstat(f.fileno()).st_size
+                if size != upload.total_size:
+                    raise UploadError('Upload is incomplete', 409, offset=size)
+                content_hash = self._digest(upload.id, f, size).hexdigest()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+        if upload.expected_sha256 and upload.expected_sha256 != content_hash:
+            # The bytes on disk are wrong somewhere; start over rather than keep a corrupt file
+            self.discard(upload)
+            raise UploadError('SHA-256 does not match the uploaded content', 422)
+
+        filename = timestamped_filename(upload.original_filename)
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        os.replace(upload.part_path, file_path)
+
+        document = Document(
+            filename=filename,
+            original_filename=upload.original_filename,
+            file_path=file_path,
+            file_type=get_file_type(upload.original_filename),
+            file_size=size,
+            content_hash=content_hash,
+            processing_status='pending'
+        )
+        db.session.add(document)
+        db.session.flush()
+
+        upload.status = 'completed'
+        upload.document_id = document.id
+        upload.updated_at = datetime.utcnow()
+        db.session.commit()
+
+        with self._lock:
+            self._hashes.pop(upload.id, None)
+        return document
+
+    def discard(self, upload: UploadSession):
+        """Delete an unfinished upload and its partial file"""
+        with self._lock:
+            self._hashes.pop(upload.id, None)
+        try:
+            if os.path.exists(upload.part_path):
+                os.remove(upload.part_path)
+        except OSError as e:
+            logging.error(f"Error removing partial upload {upload.part_path}: {str(e)}")
+        db.session.delete(upload)
+        db.session.commit()
+
+    def find_duplicate(self, document: Document) -> Optional[Document]:
+        """An earlier completed document with the same content, if any"""
+        return Document.query.filter(
+            Document.content_hash == document.content_hash,
+            Document.id != document.id,
+            Document.processing_status == 'completed'
+        ).order_by(Document.id).first()
+
+    def _digest(self, upload_id: str, f: BinaryIO, size: int):
+        """SHA-256 of the first size bytes, from the in-memory state or re-read from disk"""
+        with self._lock:
+            cached = self._hashes.get(upload_id)
+        if cached and cached[0] == size:
+            # Copy so a failed part leaves the cached state untouched
+            return cached[1].copy()
+
+        digest = hashlib.sha256()
+        f.seek(0)
+        remaining = size
+        while remaining > 0:
+            block = f.read(min(Config.UPLOAD_STREAM_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+        return digest
+
+
+_upload_service = None
+
+
+def get_upload_service() -> ChunkedUploadService:
+    """Return the process-wide upload service"""
+    global _upload_service
+    if _upload_service is None:
+        _upload_service = ChunkedUploadService()
+    return _upload_service
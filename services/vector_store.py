@@ -1,17 +1,37 @@
 import os
+import glob
+import heapq
 import logging
 import json
+import bisect
 import hashlib
-from typing import List, Dict, Any
+import itertools
+import threading
+from contextlib import contextmanager, ExitStack
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Iterator
+from services.chunk_store import ChunkColumns, WORD_RE
 from config import Config
 
+PARTIAL_SCAN_ROW_COST = 300  # Vocabulary term checks that cost about as much as tokenizing one chunk
+
 class VectorStore:
     """Simple in-memory vector store for document embeddings using OpenAI embeddings"""
     
-    def __init__(self):
-        self.documents = {}  # Store documents with their metadata
+    def __init__(self, storage_file: str = None):
+        self.documents = ChunkColumns()  # Store documents with their metadata, column-wise
         self.embeddings = {}  # Store embeddings
-        self.storage_file = os.path.join(Config.CHROMA_PERSIST_DIRECTORY, "vector_store.json")
+        # Postings for filtered search, rebuilt from chunk metadata on load
+        self.type_documents = {}  # file type -> document ids
+        self.upload_timeline = []  # sorted (uploaded_at ISO string, document id)
+        self.storage_file = storage_file or os.path.join(Config.CHROMA_PERSIST_DIRECTORY, "vector_store.json")
+        # Held by searches and writes: deletes can compact the columns, which renumbers rows
+        self._lock = threading.RLock()
+        self._memory_usage = {}  # memory_usage() estimate, refreshed on every save
+        self._saves_deferred = False
+        self._unsaved = False  # Changes not yet written, while saves are deferred
         self._initialize()
     
     def _initialize(self):
@@ -24,8 +44,13 @@ class VectorStore:
             if os.path.exists(self.storage_file):
                 with open(self.storage_file, 'r') as f:
                     data = json.load(f)
-                    self.documents = data.get('documents', {})
-                    logging.info(f"Loaded {len(self.documents)} documents from storage")
+                for vector_id, doc_data in data.get('documents', {}).items():
+                    self.documents[vector_id] = doc_data
+                    self._index_chunk(doc_data['metadata'])
+                # Drop the parsed dicts now that the columns hold everything
+                del data
+                logging.info(f"Loaded {len(self.documents)} documents from storage")
+            self._memory_usage = self.documents.nbytes()
             
             logging.info("Vector store initialized successfully")
             
@@ -33,56 +58,232 @@ class VectorStore:
             logging.error(f"Error initializing vector store: {str(e)}")
             raise
     
+    @staticmethod
+    def vector_id_for(metadata: Dict[str, Any]) -> str:
+        """Vector ID of a chunk, derived from its document ID and chunk index"""
+        return f"doc_{metadata['document_id']}_chunk_{metadata['chunk_index']}"
+    
+    def get_vectors(self, vector_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Content and metadata of the given vectors that exist, read under the store lock"""
+        with self._lock:
+            return {vector_id: self.documents[vector_id] for vector_id in vector_ids if vector_id in self.documents}
+    
     def add_document(self, content: str, metadata: Dict[str, Any]) -> str:
         """Add a document chunk to the vector store"""
-        try:
-            # Generate unique ID
-            vector_id = f"doc_{metadata['document_id']}_chunk_{metadata['chunk_index']}"
-            
-            # Store document with metadata
-            self.documents[vector_id] = {
-                'content': content,
-                'metadata': metadata
-            }
-            
-            # Save to file
-            self._save_to_file()
-            
-            return vector_id
-            
-        except Exception as e:
-            logging.error(f"Error adding document to vector store: {str(e)}")
-            raise
+        with self._lock:
+            try:
+                # Generate unique ID
+                vector_id = self.vector_id_for(metadata)
+                
+                # Store document with metadata
+                self.documents[vector_id] = {
+                    'content': content,
+                    'metadata': metadata
+                }
+                self._index_chunk(metadata)
+                
+                # Save to file
+                self._save_to_file()
+                
+                return vector_id
+                
+            except Exception as e:
+                logging.error(f"Error adding document to vector store: {str(e)}")
+                raise
     
-    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Search for similar documents using simple text matching"""
-        try:
-            results = []
-            query_lower = query.lower()
-            
-            # Simple text matching for now - in production would use embeddings
-            for vector_id, doc_data in self.documents.items():
-                content = doc_data['content'].lower()
-                metadata = doc_data['metadata']
+    def add_documents(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Add a batch of (content, metadata) chunks, saving the store once"""
+        with self._lock:
+            try:
+                vector_ids = []
+                for content, metadata in items:
+                    vector_id = self.vector_id_for(metadata)
+                    self.documents[vector_id] = {
+                        'content': content,
+                        'metadata': metadata
+                    }
+                    self._index_chunk(metadata)
+                    vector_ids.append(vector_id)
+                
+                self._save_to_file()
+                
+                return vector_ids
+                
+            except Exception as e:
+                logging.error(f"Error adding documents to vector store: {str(e)}")
+                raise
+    
+    def search(self, query: str, limit: int = 20, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Search for similar documents using simple text matching.
+        
+        ``filters`` may restrict the search to ``document_ids``, ``file_types`` and an
+        ``uploaded_after`` (inclusive) / ``uploaded_before`` (exclusive) range; only the
+        chunks of matching documents are scored. Each result carries ``matches``, the
+        sorted [start, end) character ranges of the query words found in its content.
+        """
+        with self._lock:
+            try:
+                query_words = set(WORD_RE.findall(query.lower()))
+                if not query_words:
+                    return []
+                rows = self._filter_rows(filters) if filters else None
+                partial_terms = self._partial_terms(query_words, rows)
                 
-                # Calculate simple relevance score based on keyword matches
-                score = self._calculate_relevance_score(query_lower, content)
+                # Simple text matching for now - in production would use embeddings
+                scored = self._score_rows(query_words, partial_terms, rows)
                 
-                if score > 0:
+                # Sort by score, ties in index order, and limit results; only the kept rows are turned into dicts
+                scored.sort(key=lambda x: (-x[0], x[1]))
+                results = []
+                for score, row in scored[:limit]:
+                    content = self.documents.content(row)
                     results.append({
-                        'id': vector_id,
-                        'content': doc_data['content'],
-                        'metadata': metadata,
-                        'score': score
+                        'id': self.documents.vector_id(row),
+                        'content': content,
+                        'metadata': self.documents.metadata(row),
+                        'score': score,
+                        'matches': self._match_ranges(row, content, query_words, partial_terms)
                     })
-            
-            # Sort by score and limit results
-            results.sort(key=lambda x: x['score'], reverse=True)
-            return results[:limit]
-            
-        except Exception as e:
-            logging.error(f"Error searching vector store: {str(e)}")
-            return []
+                return results
+                
+            except Exception as e:
+                logging.error(f"Error searching vector store: {str(e)}")
+                return []
+    
+    def _score_rows(self, query_words: set, partial_terms: Dict[str, List[str]],
+                    rows: Optional[Iterable[int]]) -> List[Tuple[float, int]]:
+        """(score, row) of every chunk the query words match, from the keyword index.
+        
+        Scores equal _calculate_relevance_score on each chunk's text without reading it:
+        the share of query words the chunk contains or, failing that, 0.3 times the
+        share that are substrings of a chunk word (or the other way around).
+        """
+        # Restrict the postings to the filtered rows before counting, so the work tracks the scope
+        allowed = set(rows) if rows is not None else None
+        
+        exact = {}
+        for word in query_words:
+            for row in self.documents.term_rows(word, allowed):
+                exact[row] = exact.get(row, 0) + 1
+        scored = [(min(matches / len(query_words), 1.0), row) for row, matches in exact.items()]
+        
+        partial = {}
+        for word, terms in partial_terms.items():
+            rows_with_word = set()
+            for term in terms:
+                rows_with_word |= self.documents.term_rows(term, allowed)
+            for row in rows_with_word:
+                if row not in exact:
+                    partial[row] = partial.get(row, 0) + 1
+        scored += [(0.3 * (matches / len(query_words)), row) for row, matches in partial.items()]
+        return scored
+    
+    def _partial_terms(self, query_words: set, rows: Optional[List[int]] = None) -> Dict[str, List[str]]:
+        """Indexed terms each query word partially matches, one scan of the vocabulary for all words.
+        
+        A filtered search scans only the words of its rows when they are fewer than the whole
+        vocabulary. Short query words and stop words are not substring-matched.
+        """
+        min_length = Config.PARTIAL_MATCH_MIN_LENGTH
+        words = [word for word in query_words
+                 if len(word) >= min_length and word not in Config.PARTIAL_MATCH_STOP_WORDS]
+        partial = {word: [] for word in query_words}
+        if not words:
+            return partial
+        
+        vocabulary = self.documents.terms()
+        if rows is not None and len(rows) * PARTIAL_SCAN_ROW_COST < len(vocabulary) * len(words):
+            vocabulary = set()
+            for _, content in self.documents.contents(rows):
+                vocabulary.update(WORD_RE.findall(content.lower()))
+        
+        for term in vocabulary:
+            if len(term) < min_length:
+                continue
+            for word in words:
+                if word in term or term in word:
+                    partial[word].append(term)
+        return partial
+    
+    def _match_ranges(self, row: int, content: str, query_words: set,
+                      partial_terms: Dict[str, List[str]]) -> List[List[int]]:
+        """Ranges of the query words in a row's content, read from the positional postings"""
+        terms = [word for word in query_words if self.documents.positions(row, word)]
+        if not terms:
+            # Only partial matches: highlight the chunk words that contain or are part of a query word
+            terms = {term for terms in partial_terms.values() for term in terms}
+        
+        ranges = set()
+        for term in terms:
+            for start in self.documents.positions(row, term):
+                # One anchored match finds the word's end in the original (not lowercased) text
+                ranges.add((start, WORD_RE.match(content, start).end()))
+        return [list(match_range) for match_range in sorted(ranges)]
+    
+    def _filter_rows(self, filters: Dict[str, Any]) -> Iterable[int]:
+        """Rows of the chunks of documents matching every given filter"""
+        document_sets = []
+        
+        if filters.get('document_ids') is not None:
+            document_sets.append({int(document_id) for document_id in filters['document_ids']})
+        
+        if filters.get('file_types') is not None:
+            documents = set()
+            for file_type in filters['file_types']:
+                documents |= self.type_documents.get(file_type, set())
+            document_sets.append(documents)
+        
+        uploaded_after = self._timestamp(filters.get('uploaded_after'))
+        uploaded_before = self._timestamp(filters.get('uploaded_before'))
+        if uploaded_after or uploaded_before:
+            start = bisect.bisect_left(self.upload_timeline, (uploaded_after,)) if uploaded_after else 0
+            end = bisect.bisect_left(self.upload_timeline, (uploaded_before,)) if uploaded_before else len(self.upload_timeline)
+            document_sets.append({document_id for _, document_id in self.upload_timeline[start:end]})
+        
+        if not document_sets:
+            return list(self.documents.rows())
+        
+        # Intersect smallest first so the work tracks the most selective filter
+        document_sets.sort(key=len)
+        matching = document_sets[0].intersection(*document_sets[1:])
+        return [row for document_id in sorted(matching) for row in self.documents.document_rows(document_id)]
+    
+    @staticmethod
+    def _timestamp(value) -> Optional[str]:
+        """Normalize a datetime or ISO date string to the ISO form kept in the timeline"""
+        if not value:
+            return None
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.isoformat()
+    
+    def _index_chunk(self, metadata: Dict[str, Any]):
+        """Add a chunk's document to the filter postings, if it is not there yet"""
+        document_id = metadata.get('document_id')
+        if document_id is None:
+            return
+        
+        if metadata.get('file_type'):
+            self.type_documents.setdefault(metadata['file_type'], set()).add(document_id)
+        if metadata.get('uploaded_at'):
+            entry = (metadata['uploaded_at'], document_id)
+            position = bisect.bisect_left(self.upload_timeline, entry)
+            if position == len(self.upload_timeline) or self.upload_timeline[position] != entry:
+                self.upload_timeline.insert(position, entry)
+    
+    def _unindex_document(self, metadata: Dict[str, Any]):
+        """Remove the document of a chunk from the filter postings"""
+        document_id = metadata.get('document_id')
+        documents = self.type_documents.get(metadata.get('file_type'))
+        if documents is not None:
+            documents.discard(document_id)
+            if not documents:
+                del self.type_documents[metadata['file_type']]
+        if metadata.get('uploaded_at'):
+            entry = (metadata['uploaded_at'], document_id)
+            position = bisect.bisect_left(self.upload_timeline, entry)
+            if position < len(self.upload_timeline) and self.upload_timeline[position] == entry:
+                del self.upload_timeline[position]
     
     def _calculate_relevance_score(self, query: str, content: str) -> float:
         """Calculate simple relevance score based on keyword matches"""
@@ -117,46 +318,304 @@ class VectorStore:
         
         return min(base_score, 1.0)
     
+    def update_document_metadata(self, updates: Dict[int, Dict[str, Any]]):
+        """Merge metadata values into every chunk of the given documents, saving the store once"""
+        with self._lock:
+            try:
+                for document_id, values in updates.items():
+                    rows = self.documents.document_rows(document_id)
+                    if not rows:
+                        continue
+                    # Take the document out first, so its document-level postings are rebuilt
+                    self._unindex_document(self.documents.metadata(rows[0]))
+                    for row in rows:
+                        self.documents.update_metadata(row, values)
+                        self._index_chunk(self.documents.metadata(row))
+                
+                self._save_to_file()
+                
+            except Exception as e:
+                logging.error(f"Error updating document metadata in vector store: {str(e)}")
+                raise
+    
     def delete_vectors(self, vector_ids: List[str]):
         """Delete vectors by IDs"""
-        try:
-            for vector_id in vector_ids:
-                if vector_id in self.documents:
-                    del self.documents[vector_id]
-            
-            self._save_to_file()
-            logging.info(f"Deleted {len(vector_ids)} vectors from store")
-        except Exception as e:
-            logging.error(f"Error deleting vectors: {str(e)}")
+        with self._lock:
+            try:
+                for vector_id in vector_ids:
+                    row = self.documents.row_of(vector_id)
+                    if row is not None:
+                        metadata = self.documents.metadata(row)
+                        del self.documents[vector_id]
+                        if not self.documents.has_document(metadata['document_id']):
+                            self._unindex_document(metadata)
+                
+                self._save_to_file()
+                logging.info(f"Deleted {len(vector_ids)} vectors from store")
+            except Exception as e:
+                logging.error(f"Error deleting vectors: {str(e)}")
     
     def get_collection_stats(self) -> Dict[str, Any]:
         """Get collection statistics"""
         try:
             return {
                 'total_vectors': len(self.documents),
-                'collection_name': Config.CHROMA_COLLECTION_NAME
+                'collection_name': Config.CHROMA_COLLECTION_NAME,
+                'memory_bytes': self.memory_usage()
             }
         except Exception as e:
             logging.error(f"Error getting collection stats: {str(e)}")
             return {'total_vectors': 0, 'collection_name': Config.CHROMA_COLLECTION_NAME}
     
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by the chunk columns, per component, as of the last write"""
+        return dict(self._memory_usage)
+    
     def reset_collection(self):
         """Reset the collection (delete all vectors)"""
+        with self._lock:
+            try:
+                self.documents = ChunkColumns()
+                self.type_documents = {}
+                self.upload_timeline = []
+                self._save_to_file()
+                logging.info("Vector store collection reset successfully")
+            except Exception as e:
+                logging.error(f"Error resetting collection: {str(e)}")
+                raise
+    
+    @contextmanager
+    def deferred_saves(self):
+        """Skip the save after each write inside the block; changes are written by flush() and on exit"""
+        self._saves_deferred = True
         try:
-            self.documents = {}
-            self._save_to_file()
-            logging.info("Vector store collection reset successfully")
-        except Exception as e:
-            logging.error(f"Error resetting collection: {str(e)}")
-            raise
+            yield self
+        finally:
+            self._saves_deferred = False
+            self.flush()
+    
+    def flush(self):
+        """Write changes held back by deferred_saves()"""
+        with self._lock:
+            if self._unsaved:
+                self._write_file()
     
     def _save_to_file(self):
-        """Save documents to file"""
+        """Save documents to file, or only note the change while saves are deferred"""
+        # Every write ends here, so the estimate is refreshed once per write rather than per read
+        self._memory_usage = self.documents.nbytes()
+        if self._saves_deferred:
+            self._unsaved = True
+            return
+        self._write_file()
+    
+    def _write_file(self):
+        """Write every chunk to the storage file"""
+        self._unsaved = False
         try:
-            data = {
-                'documents': self.documents
-            }
-            with open(self.storage_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Write a temporary file and swap it in, so a failed save never leaves a truncated store
+            temp_file = f"{self.storage_file}.tmp"
+            with open(temp_file, 'w') as f:
+                # One chunk at a time, rather than building the whole document dict first
+                f.write('{"documents": {')
+                for position, row in enumerate(self.documents.rows()):
+                    entry = {'content': self.documents.content(row), 'metadata': self.documents.metadata(row)}
+                    f.write(f"{', ' if position else ''}{json.dumps(self.documents.vector_id(row))}: {json.dumps(entry)}")
+                f.write('}}')
+            os.replace(temp_file, self.storage_file)
         except Exception as e:
             logging.error(f"Error saving to file: {str(e)}")
+
+
+
+class ShardedVectorStore:
+    """VectorStore partitioned by document id across independently persisted shards.
+    
+    Each shard is a VectorStore with its own file and lock. Searches fan out to a
+    thread per shard and the per-shard top results are merged by score; a write
+    only locks and saves the shards it touches, so searches of the others go on.
+    """
+    
+    def __init__(self, shard_count: int = None):
+        self.shard_count = shard_count or Config.VECTOR_STORE_SHARDS
+        self.shards = [VectorStore(self._shard_file(index)) for index in range(self.shard_count)]
+        self.documents = _ShardedDocuments(self.shards)
+        # Threads start on the first search, not here
+        self._executor = ThreadPoolExecutor(max_workers=self.shard_count, thread_name_prefix='shard-search')
+        # Resharding here would race between gunicorn workers, so it is left to the CLI command
+        if self._reshard_sources():
+            logging.warning(f"The index is not in the {self.shard_count}-shard layout yet; "
+                            f"run 'flask --app main reshard-vector-store' with the app stopped")
+    
+    vector_id_for = staticmethod(VectorStore.vector_id_for)
+    
+    def _shard_file(self, index: int) -> str:
+        return os.path.join(Config.CHROMA_PERSIST_DIRECTORY,
+                            f"vector_store.shard-{index}-of-{self.shard_count}.json")
+    
+    def shard_for(self, document_id) -> VectorStore:
+        """Shard holding a document's chunks"""
+        return self.shards[int(document_id) % self.shard_count]
+    
+    def _group_by_shard(self, vector_ids: List[str]) -> Dict[int, List[str]]:
+        """Vector IDs per shard index, read from the document ID in each (see vector_id_for)"""
+        by_shard = {}
+        for vector_id in vector_ids:
+            parts = vector_id.split('_')
+            if len(parts) == 4 and parts[0] == 'doc' and parts[1].isdigit():
+                by_shard.setdefault(int(parts[1]) % self.shard_count, []).append(vector_id)
+            else:
+                # Not a derived ID; only probing the shards can find it
+                for index, shard in enumerate(self.shards):
+                    if vector_id in shard.documents:
+                        by_shard.setdefault(index, []).append(vector_id)
+                        break
+        return by_shard
+    
+    def _reshard_sources(self) -> List[str]:
+        """Index files of an unsharded store or another shard count, if this layout has none yet"""
+        if any(os.path.exists(shard.storage_file) for shard in self.shards):
+            return []
+        
+        sources = [os.path.join(Config.CHROMA_PERSIST_DIRECTORY, "vector_store.json")]
+        sources += glob.glob(os.path.join(Config.CHROMA_PERSIST_DIRECTORY, "vector_store.shard-*-of-*.json"))
+        return [source for source in sources if os.path.exists(source)]
+    
+    def reshard_existing(self) -> Tuple[int, int]:
+        """Move chunks from an unsharded store or another shard count into this layout.
+        
+        Run through the reshard-vector-store command with the app stopped; returns (chunks, files).
+        """
+        sources = self._reshard_sources()
+        if not sources:
+            return 0, 0
+        
+        items = []
+        for source in sources:
+            for doc_data in VectorStore(source).documents.values():
+                items.append((doc_data['content'], doc_data['metadata']))
+        self.add_documents(items)
+        
+        # Keep the old files, renamed so they are not picked up again
+        for source in sources:
+            os.replace(source, f"{source}.resharded")
+        logging.info(f"Resharded {len(items)} chunks from {len(sources)} files into {self.shard_count} shards")
+        return len(items), len(sources)
+    
+    def add_document(self, content: str, metadata: Dict[str, Any]) -> str:
+        """Add a document chunk to its shard"""
+        return self.shard_for(metadata['document_id']).add_document(content, metadata)
+    
+    def add_documents(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[str]:
+        """Add a batch of (content, metadata) chunks, saving each affected shard once"""
+        by_shard = {}
+        for content, metadata in items:
+            by_shard.setdefault(int(metadata['document_id']) % self.shard_count, []).append((content, metadata))
+        
+        for index, shard_items in by_shard.items():
+            self.shards[index].add_documents(shard_items)
+        return [self.vector_id_for(metadata) for _, metadata in items]
+    
+    def search(self, query: str, limit: int = 20, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Search every shard that can hold a match (see VectorStore.search) and merge the results"""
+        try:
+            indexes = range(self.shard_count)
+            if filters and filters.get('document_ids') is not None:
+                # Only the shards owning the requested documents can match
+                indexes = sorted({int(document_id) % self.shard_count for document_id in filters['document_ids']})
+            
+            if Config.VECTOR_STORE_SEARCH_THREADS and len(indexes) > 1:
+                shard_results = list(self._executor.map(
+                    lambda index: self.shards[index].search(query, limit, filters), indexes))
+            else:
+                shard_results = [self.shards[index].search(query, limit, filters) for index in indexes]
+            
+            # Each shard's results are sorted by score; merge them lazily and stop at the limit
+            merged = heapq.merge(*shard_results, key=lambda result: result['score'], reverse=True)
+            return list(itertools.islice(merged, limit))
+            
+        except Exception as e:
+            logging.error(f"Error searching sharded vector store: {str(e)}")
+            return []
+    
+    def update_document_metadata(self, updates: Dict[int, Dict[str, Any]]):
+        """Merge metadata values into every chunk of the given documents, saving each affected shard once"""
+        by_shard = {}
+        for document_id, values in updates.items():
+            by_shard.setdefault(int(document_id) % self.shard_count, {})[document_id] = values
+        
+        for index, shard_updates in by_shard.items():
+            self.shards[index].update_document_metadata(shard_updates)
+    
+    @contextmanager
+    def deferred_saves(self):
+        """Defer the saves of every shard (see VectorStore.deferred_saves)"""
+        with ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.deferred_saves())
+            yield self
+    
+    def flush(self):
+        """Write changes held back by deferred_saves() in every shard"""
+        for shard in self.shards:
+            shard.flush()
+    
+    def get_vectors(self, vector_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Content and metadata of the given vectors that exist, from the shards holding them"""
+        vectors = {}
+        for index, shard_ids in self._group_by_shard(vector_ids).items():
+            vectors.update(self.shards[index].get_vectors(shard_ids))
+        return vectors
+    
+    def delete_vectors(self, vector_ids: List[str]):
+        """Delete vectors by IDs from the shards holding them"""
+        for index, shard_ids in self._group_by_shard(vector_ids).items():
+            self.shards[index].delete_vectors(shard_ids)
+    
+    def get_collection_stats(self) -> Dict[str, Any]:
+        """Get collection statistics"""
+        return {
+            'total_vectors': len(self.documents),
+            'collection_name': Config.CHROMA_COLLECTION_NAME,
+            'shards': [len(shard.documents) for shard in self.shards],
+            'memory_bytes': self.memory_usage()
+        }
+    
+    def memory_usage(self) -> Dict[str, int]:
+        """Approximate bytes held by this process's copy of every shard, per component"""
+        usage = {}
+        for shard in self.shards:
+            for component, size in shard.memory_usage().items():
+                usage[component] = usage.get(component, 0) + size
+        return usage
+    
+    def reset_collection(self):
+        """Reset every shard (delete all vectors)"""
+        for shard in self.shards:
+            shard.reset_collection()
+
+
+class _ShardedDocuments(Mapping):
+    """Read-only view of the chunks of all shards, as VectorStore.documents"""
+    
+    def __init__(self, shards: List[VectorStore]):
+        self.shards = shards
+    
+    def __getitem__(self, vector_id: str) -> Dict[str, Any]:
+        for shard in self.shards:
+            if vector_id in shard.documents:
+                return shard.documents[vector_id]
+        raise KeyError(vector_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        return itertools.chain.from_iterable(shard.documents for shard in self.shards)
+    
+    def __len__(self) -> int:
+        return sum(len(shard.documents) for shard in self.shards)
+
+
+def create_vector_store():
+    """The configured vector store: a single VectorStore, or a ShardedVectorStore when VECTOR_STORE_SHARDS > 1"""
+    if Config.VECTOR_STORE_SHARDS > 1:
+        return ShardedVectorStore()
+    return VectorStore()
@@ -7,11 +7,11 @@
 const CONFIG = {
     API_ENDPOINTS: {
         SYSTEM_STATS: '/api/system-stats',
-        DOCUMENT_STATUS: '/api/document-status'
+        DOCUMENT_STATUS: '/api/document-status',
+        DOCUMENT_STATUS_STREAM: '/api/document-status/stream'
     },
     REFRESH_INTERVALS: {
-        SYSTEM_STATS: 10000, // 10 seconds
-        DOCUMENT_STATUS: 5000 // 5 seconds
+        SYSTEM_STATS: 10000 // 10 seconds
     },
     UPLOAD: {
         MAX_FILE_SIZE: 50 * 1024 * 1024, // 50MB
@@ -532,25 +532,37 @@ const App = {
             }
         }, CONFIG.REFRESH_INTERVALS.SYSTEM_STATS);
 
-        // Update document status for processing documents
-        setInterval(async () => {
-            if (AppState.isOnline && AppState.processingDocuments.size > 0) {
-                await this.checkProcessingDocuments();
-            }
-        }, CONFIG.REFRESH_INTERVALS.DOCUMENT_STATUS);
+        // Document status changes are pushed over a single connection
+        this.watchDocumentStatus();
     },
 
-    async checkProcessingDocuments() {
-        const promises = Array.from(AppState.processingDocuments).map(async (docId) => {
-            const status = await API.getDocumentStatus(docId);
-            if (status && status.status !== 'processing') {
-                AppState.processingDocuments.delete(docId);
-                this.updateDocumentStatusDisplay(docId, status);
+    watchDocumentStatus: function() {
+        document.querySelectorAll('tr[data-doc-id][data-status]').forEach(row => {
+            const status = row.getAttribute('data-status');
+            if (status === 'pending' || status === 'processing') {
+                AppState.processingDocuments.add(row.getAttribute('data-doc-id'));
             }
         });
-        
-        await Promise.all(promises);
-        UI.updateProcessingIndicators();
+        if (AppState.processingDocuments.size === 0 || !window.EventSource) return;
+
+        const ids = Array.from(AppState.processingDocuments).join(',');
+        const source = new EventSource(`${CONFIG.API_ENDPOINTS.DOCUMENT_STATUS_STREAM}?ids=${ids}`);
+
+        source.addEventListener('status', (event) => {
+            const status = JSON.parse(event.data);
+            const docId = String(status.id);
+            if (status.status === 'completed' || status.status === 'failed') {
+                if (!AppState.processingDocuments.delete(docId)) return;
+            }
+            this.updateDocumentStatusDisplay(docId, status);
+            UI.updateProcessingIndicators();
+        });
+
+        source.addEventListener('done', async () => {
+            source.close();
+            await API.getSystemStats();
+            this.updateSystemStatsDisplay();
+        });
     },
 
     updateSystemStatsDisplay: function() {
@@ -580,13 +592,28 @@ const App = {
     updateDocumentStatusDisplay: function(docId, status) {
         const row = document.querySelector(`[data-doc-id="${docId}"]`);
         if (!row) return;
+        row.setAttribute('data-status', status.status);
 
-        const statusBadge = row.querySelector('.badge');
+        const statusBadge = row.querySelector('.status-badge');
         if (statusBadge) {
-            statusBadge.className = `badge bg-${status.status === 'completed' ? 'success' : 'danger'}`;
-            statusBadge.textContent = status.status === 'completed' ? 'Completed' : 'Failed';
+            if (status.status === 'completed' || status.status === 'failed') {
+                statusBadge.className = `badge status-badge bg-${status.status === 'completed' ? 'success' : 'danger'}`;
+                statusBadge.textContent = status.status === 'completed' ? 'Completed' : 'Failed';
+            } else if (status.status === 'processing') {
+                statusBadge.className = 'badge status-badge bg-warning';
+                statusBadge.innerHTML = `<i class="fas fa-spinner fa-spin me-1"></i>Processing ${status.progress}%`;
+            }
         }
 
+        const progressBar = row.querySelector('.status-progress .progress-bar');
+        if (progressBar) {
+            progressBar.style.width = `${status.progress}%`;
+            progressBar.closest('.status-progress').classList.toggle('d-none', status.status !== 'processing');
+        }
+
+        // Page-specific handlers (e.g. the documents table) listen for this
+        row.dispatchEvent(new CustomEvent('document-status', { detail: status, bubbles: true }));
+
         if (status.status === 'completed') {
             Utils.showToast(`Document "${status.filename}" processed successfully`, 'success');
         } else if (status.status === 'failed') {
@@ -0,0 +1,35 @@
+import zlib
+from typing import Tuple
+
+# Optional faster/denser codec; zlib from the standard library is used when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 6
+
+
+def compress_text(text: str) -> Tuple[str, bytes]:
+    """Compress text with the best available codec, returning (codec, data)"""
+    raw = (text or "").encode('utf-8')
+    if zstandard is not None:
+        # Compressor objects are not thread-safe, so make one per call
+        return 'zstd', zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, ZLIB_LEVEL)
+
+
+def decompress_text(codec: str, data: bytes) -> str:
+    """Decompress data written by compress_text"""
+    if data is None:
+        return ""
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ValueError("Content is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+    if codec == 'zlib':
+        return zlib.decompress(data).decode('utf-8')
+    if codec == 'none':
+        return data.decode('utf-8')
+    raise ValueError(f"Unknown content codec: {codec}")
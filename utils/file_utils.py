@@ -1,9 +1,38 @@
 import os
+import codecs
+import re
+import mmap
+import time
 import logging
-from typing import Optional
-import PyPDF2
+import zipfile
+from typing import Optional, List, Dict, Callable
+from werkzeug.utils import secure_filename
 from config import Config
 
+# Optional hardened XML parser for untrusted DOCX files; the standard library parser is used otherwise
+try:
+    from defusedxml.ElementTree import iterparse
+except ImportError:
+    from xml.etree.ElementTree import iterparse
+
+# Optional statistical charset detector for text files that are not UTF-8
+try:
+    from charset_normalizer import from_bytes
+except ImportError:
+    from_bytes = None
+
+# Checked longest first: the UTF-32 LE BOM starts with the UTF-16 LE one
+TEXT_BOMS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+HEADING_STYLE_RE = re.compile(r'^heading\s*(\d)$', re.IGNORECASE)
+
 def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return '.' in filename and \
@@ -20,18 +49,24 @@ def get_file_type(filename: str) -> str:
         return 'pdf'
     elif extension in ['png', 'jpg', 'jpeg', 'tiff', 'bmp']:
         return 'image' 
-    elif extension in ['txt', 'docx']:
+    elif extension == 'docx':
+        return 'docx'
+    elif extension == 'txt':
         return 'text'
     else:
         return 'unknown'
 
-def extract_text_from_pdf(file_path: str) -> str:
-    """Extract text from PDF file"""
+def extract_text_from_pdf(file_path: str, on_page: Callable[[int, int], None] = None) -> str:
+    """Extract text from PDF file, calling on_page(pages_done, page_count) after each page"""
+    # Imported on first use to keep app startup fast
+    import PyPDF2
+    
     try:
         text = ""
         
         with open(file_path, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
+            page_count = len(reader.pages)
             
             for page_num, page in enumerate(reader.pages):
                 try:
@@ -41,6 +76,9 @@ def extract_text_from_pdf(file_path: str) -> str:
                 except Exception as e:
                     logging.warning(f"Error extracting text from page {page_num + 1}: {str(e)}")
                     continue
+                finally:
+                    if on_page:
+                        on_page(page_num + 1, page_count)
         
         return text.strip()
         
@@ -48,30 +86,193 @@ def extract_text_from_pdf(file_path: str) -> str:
         logging.error(f"Error extracting text from PDF {file_path}: {str(e)}")
         return ""
 
-def extract_text_from_txt(file_path: str) -> str:
-    """Extract text from text file"""
+def extract_text_from_docx(file_path: str, on_page: Callable[[int, int], None] = None) -> str:
+    """Extract text from a DOCX file, keeping headings, paragraphs and page breaks.
+    
+    word/document.xml is stream-parsed and each paragraph is discarded once read,
+    so memory stays bounded regardless of document size. Headings become
+    markdown-style "#" lines and page breaks become "--- Page N ---" markers,
+    matching the PDF extractor, so citations can refer to them.
+    """
     try:
-        # Try different encodings
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']
+        parts = []
+        page_number = 1
+        paragraphs_on_page = 0
+        depth = 0
+        body = None
+        
+        with zipfile.ZipFile(file_path) as archive, archive.open('word/document.xml') as xml_file:
+            parts.append(f"--- Page {page_number} ---")
+            
+            for event, elem in iterparse(xml_file, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    if elem.tag == f'{WORD_NS}body':
+                        body = elem
+                    continue
+                
+                depth -= 1
+                if elem.tag == f'{WORD_NS}p':
+                    text, style, page_breaks = _read_docx_paragraph(elem)
+                    if text.strip():
+                        heading = _docx_heading_level(style)
+                        parts.append(f"{'#' * heading} {text.strip()}" if heading else text.strip())
+                        paragraphs_on_page += 1
+                    # A break ends the page for the paragraphs that follow
+                    for _ in range(page_breaks if paragraphs_on_page else 0):
+                        page_number += 1
+                        paragraphs_on_page = 0
+                        parts.append(f"--- Page {page_number} ---")
+                        if on_page:
+                            on_page(page_number - 1, page_number)
+                    elem.clear()
+                
+                # Drop finished top-level blocks (paragraphs, tables) so the tree never grows
+                if body is not None and depth == 2:
+                    body.clear()
         
-        for encoding in encodings:
-            try:
-                with open(file_path, 'r', encoding=encoding) as file:
-                    text = file.read()
-                    return text.strip()
-            except UnicodeDecodeError:
-                continue
+        if on_page:
+            on_page(page_number, page_number)
+        return '\n\n'.join(part for part in parts if part).strip()
+        
+    except Exception as e:
+        logging.error(f"Error extracting text from DOCX {file_path}: {str(e)}")
+        return ""
+
+def _read_docx_paragraph(paragraph) -> tuple:
+    """Text, style name and number of page breaks of a w:p element"""
+    pieces = []
+    style = None
+    page_breaks = 0
+    
+    for node in paragraph.iter():
+        tag = node.tag
+        if tag == f'{WORD_NS}t':
+            pieces.append(node.text or '')
+        elif tag == f'{WORD_NS}tab':
+            pieces.append('\t')
+        elif tag == f'{WORD_NS}br':
+            if node.get(f'{WORD_NS}type') == 'page':
+                page_breaks += 1
+            else:
+                pieces.append('\n')
+        elif tag == f'{WORD_NS}lastRenderedPageBreak':
+            # Where Word last laid out a page boundary; the best page estimate a DOCX offers
+            page_breaks += 1
+        elif tag == f'{WORD_NS}pStyle':
+            style = node.get(f'{WORD_NS}val')
+    
+    return ''.join(pieces), style, page_breaks
+
+def _docx_heading_level(style: Optional[str]) -> int:
+    """Heading level (1-6) for a paragraph style, 0 for body text"""
+    if not style:
+        return 0
+    if style.lower() == 'title':
+        return 1
+    match = HEADING_STYLE_RE.match(style.replace('_', ''))
+    return min(int(match.group(1)), 6) if match else 0
+
+def extract_text_from_txt(file_path: str) -> str:
+    """Extract text from text file, reading it once and decoding it once"""
+    try:
+        size = os.path.getsize(file_path)
+        if size == 0:
+            return ""
         
-        # If all encodings fail, try with error handling
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-            text = file.read()
-            logging.warning(f"Used UTF-8 with error handling for {file_path}")
-            return text.strip()
+        with open(file_path, 'rb') as file:
+            if size >= Config.TEXT_MMAP_THRESHOLD:
+                # Decode straight from the page cache instead of copying the file into a bytes object
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return _decode_text(data, file_path).strip()
+            return _decode_text(file.read(), file_path).strip()
             
     except Exception as e:
         logging.error(f"Error extracting text from file {file_path}: {str(e)}")
         return ""
 
+def _decode_text(data, file_path: str) -> str:
+    """Decode a bytes-like object using its BOM, UTF-8 if valid, or a detected encoding"""
+    for bom, encoding in TEXT_BOMS:
+        if data[:len(bom)] == bom:
+            return str(data, encoding)
+    
+    try:
+        return str(data, 'utf-8')
+    except UnicodeDecodeError:
+        pass
+    
+    encoding = detect_encoding(data[:Config.TEXT_DETECTION_SAMPLE_SIZE])
+    try:
+        return str(data, encoding)
+    except (UnicodeDecodeError, LookupError):
+        # A sample can miss bytes the guess cannot decode; latin-1 maps every byte
+        logging.warning(f"Decoding {file_path} as {encoding} failed, falling back to latin-1")
+        return str(data, 'latin-1')
+
+def detect_encoding(sample: bytes) -> str:
+    """Best-guess encoding of non-UTF-8 bytes"""
+    if from_bytes is not None:
+        match = from_bytes(sample).best()
+        if match is not None:
+            return match.encoding
+    
+    # Without a detector: Windows-1252 unless the sample uses its five undefined bytes
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+def split_into_chunks(text: str, chunk_size: int = None) -> List[Dict]:
+    """Split text into paragraph-aligned chunks with estimated page/paragraph numbers"""
+    chunk_size = chunk_size or Config.CHUNK_SIZE
+    chunks = []
+    
+    # Split text into paragraphs
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    
+    current_chunk = ""
+    chunk_index = 0
+    page_number = 1  # Simple page estimation
+    paragraph_number = 1
+    
+    for paragraph in paragraphs:
+        # If adding this paragraph would exceed chunk size, save current chunk
+        if len(current_chunk) + len(paragraph) > chunk_size and current_chunk:
+            chunks.append({
+                'chunk_index': chunk_index,
+                'page_number': page_number,
+                'paragraph_number': paragraph_number,
+                'content': current_chunk.strip()
+            })
+            
+            chunk_index += 1
+            current_chunk = paragraph
+            
+            # Simple page estimation (every 10 chunks = new page)
+            if chunk_index % 10 == 0:
+                page_number += 1
+                paragraph_number = 1
+            else:
+                paragraph_number += 1
+        else:
+            if current_chunk:
+                current_chunk += "\n\n" + paragraph
+            else:
+                current_chunk = paragraph
+    
+    # Add final chunk if there's remaining content
+    if current_chunk.strip():
+        chunks.append({
+            'chunk_index': chunk_index,
+            'page_number': page_number,
+            'paragraph_number': paragraph_number,
+            'content': current_chunk.strip()
+        })
+    
+    return chunks
+
 def get_file_size_human(size_bytes: int) -> str:
     """Convert file size to human readable format"""
     if size_bytes == 0:
@@ -86,6 +287,10 @@ def get_file_size_human(size_bytes: int) -> str:
     
     return f"{size_bytes:.1f}{size_names[i]}"
 
+def timestamped_filename(filename: str) -> str:
+    """Secure stored filename, prefixed with a timestamp to avoid conflicts"""
+    return f"{int(time.time())}_{secure_filename(filename)}"
+
 def sanitize_filename(filename: str) -> str:
     """Sanitize filename for safe storage"""
     # Remove or replace dangerous characters
@@ -0,0 +1,61 @@
+from typing import Any, Dict, List, Sequence
+from config import Config
+
+ELLIPSIS = '…'
+
+
+def build_snippet(content: str, matches: Sequence[Sequence[int]], length: int = None) -> List[Dict[str, Any]]:
+    """Excerpt of content around its densest cluster of matches, as highlighted segments.
+
+    ``matches`` are sorted [start, end) character ranges, as returned in vector store
+    search results, so the text is only sliced here, never tokenized. Returns a list of
+    ``{'text', 'highlight'}`` segments, or an empty list when there is nothing to show.
+    """
+    length = length or Config.SNIPPET_LENGTH
+    matches = [(start, end) for start, end in matches if 0 <= start < end <= len(content)]
+    if not content or not matches:
+        return []
+
+    # The window starting at some match that covers the most matches (two pointers over the sorted ranges)
+    best_first, best_count, last = 0, 0, 0
+    for first, (start, _) in enumerate(matches):
+        last = max(last, first)
+        while last + 1 < len(matches) and matches[last + 1][1] <= start + length:
+            last += 1
+        if last - first + 1 > best_count:
+            best_first, best_count = first, last - first + 1
+    covered = matches[best_first:best_first + best_count]
+
+    # Lead in with some context, then cut both ends at word boundaries
+    span = covered[-1][1] - covered[0][0]
+    window_start = max(0, covered[0][0] - max(0, length - span) // 3)
+    if window_start > 0:
+        # Forward to the next word start, never past the first match
+        space = content.find(' ', window_start - 1, covered[0][0])
+        window_start = space + 1 if space != -1 else window_start
+    window_end = min(len(content), max(window_start + length, covered[-1][1]))
+    if window_end < len(content):
+        space = content.rfind(' ', covered[-1][1], window_end)
+        window_end = space if space != -1 else window_end
+
+    segments = []
+    if window_start > 0:
+        segments.append({'text': ELLIPSIS, 'highlight': False})
+    position = window_start
+    for start, end in matches:
+        if start < window_start or end > window_end:
+            continue
+        if start < position:
+            # Overlapping ranges are merged into the previous highlight
+            start = position
+            if start >= end:
+                continue
+        if start > position:
+            segments.append({'text': content[position:start], 'highlight': False})
+        segments.append({'text': content[start:end], 'highlight': True})
+        position = end
+    if window_end > position:
+        segments.append({'text': content[position:window_end], 'highlight': False})
+    if window_end < len(content):
+        segments.append({'text': ELLIPSIS, 'highlight': False})
+    return segments
@@ -0,0 +1,91 @@
+import re
+import hashlib
+from typing import Any, Dict, List
+from config import Config
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3  # Words per shingle; single words make unrelated chunks on one topic look alike
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of text over word shingles; near-identical texts differ in few bits"""
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return 0
+    if len(words) < SHINGLE_SIZE:
+        shingles = [' '.join(words)]
+    else:
+        shingles = [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    # Stable across processes, unlike hash(); signatures are stored with the chunks
+    bits = ''.join([format(int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big'),
+                           '064b') for shingle in shingles])
+
+    # Per-bit majority vote, most significant bit first; repeated shingles weigh more.
+    # Strided slices count each bit position across all shingles in C.
+    threshold = len(shingles) / 2
+    signature = 0
+    for position in range(SIMHASH_BITS):
+        signature = (signature << 1) | (bits[position::SIMHASH_BITS].count('1') > threshold)
+    return signature
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two signatures"""
+    return bin(a ^ b).count('1')
+
+
+def signature_similarity(a: int, b: int) -> float:
+    """Similarity in [0, 1] from two SimHash signatures; unrelated texts score about 0"""
+    # Unrelated texts differ in about half the bits
+    return max(0.0, 1.0 - 2.0 * hamming_distance(a, b) / SIMHASH_BITS)
+
+
+def diversify_results(results: List[Dict[str, Any]], limit: int, strategy: str = None) -> List[Dict[str, Any]]:
+    """Pick up to limit varied results from score-ordered vector store results.
+
+    Near-duplicate chunks (by SimHash) are dropped and no document contributes more
+    than MAX_CHUNKS_PER_DOCUMENT chunks. With the 'mmr' strategy the remaining
+    candidates are picked by maximal marginal relevance instead of score alone.
+    """
+    strategy = strategy or Config.DIVERSIFICATION_STRATEGY
+    if strategy == 'none':
+        return results[:limit]
+
+    signatures = [_signature(result) for result in results]
+    per_document = {}
+    selected = []
+    remaining = list(range(len(results)))
+    # Highest similarity of each candidate to anything selected so far
+    max_similarity = [0.0] * len(results)
+
+    while remaining and len(selected) < limit:
+        if strategy == 'mmr':
+            best = max(remaining, key=lambda i: Config.MMR_LAMBDA * results[i]['score']
+                       - (1 - Config.MMR_LAMBDA) * max_similarity[i])
+        else:
+            best = remaining[0]
+        remaining.remove(best)
+
+        document_id = results[best]['metadata'].get('document_id')
+        if per_document.get(document_id, 0) >= Config.MAX_CHUNKS_PER_DOCUMENT:
+            continue
+        if any(hamming_distance(signatures[best], signatures[i]) <= Config.NEAR_DUPLICATE_MAX_DISTANCE
+               for i in selected):
+            continue
+
+        selected.append(best)
+        per_document[document_id] = per_document.get(document_id, 0) + 1
+        if strategy == 'mmr':
+            for i in remaining:
+                max_similarity[i] = max(max_similarity[i], signature_similarity(signatures[best], signatures[i]))
+
+    return [results[i] for i in selected]
+
+
+def _signature(result: Dict[str, Any]) -> int:
+    """Signature stored at ingest, or computed for chunks indexed before signatures existed"""
+    signature = result['metadata'].get('simhash')
+    return signature if signature is not None else simhash(result['content'])
@@ -0,0 +1,88 @@
+import logging
+from typing import List, Dict, Tuple, Callable
+
+# Optional exact tokenizer; the estimator below is used when it is not installed
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+# Calibrated against cl100k_base on English prose: ~4 ASCII characters per token,
+# while non-ASCII characters (accents, CJK, symbols) cost roughly one token each
+ASCII_CHARS_PER_TOKEN = 4.0
+NON_ASCII_CHARS_PER_TOKEN = 1.2
+
+
+def count_tokens(text: str) -> int:
+    """Count (or estimate) the number of LLM tokens in text"""
+    if not text:
+        return 0
+
+    if _encoding is not None:
+        try:
+            return len(_encoding.encode(text, disallowed_special=()))
+        except Exception as e:
+            logging.warning(f"Tokenizer failed, falling back to estimate: {str(e)}")
+
+    non_ascii = sum(1 for c in text if ord(c) > 127)
+    ascii_count = len(text) - non_ascii
+    return int(ascii_count / ASCII_CHARS_PER_TOKEN + non_ascii / NON_ASCII_CHARS_PER_TOKEN) + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Truncate text to roughly max_tokens, cutting at a word boundary"""
+    if max_tokens <= 0:
+        return ""
+
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    # Scale by the observed chars/token ratio and refine until it fits
+    cut = int(len(text) * max_tokens / total)
+    while cut > 0:
+        truncated = text[:cut]
+        space = truncated.rfind(' ')
+        if space > cut * 0.8:
+            truncated = truncated[:space]
+        if count_tokens(truncated) <= max_tokens:
+            return truncated.rstrip() + " ..."
+        cut = int(cut * 0.9)
+
+    return ""
+
+
+def pack_answers(answers: List[Dict], budget_tokens: int,
+                 render: Callable[[Dict], str]) -> Tuple[List[Dict], Dict]:
+    """Select the answers that fit a token budget, highest confidence x similarity first.
+
+    ``render`` turns an answer into the text that will be embedded in the prompt.
+    Returns the packed answers (in priority order) and packing statistics.
+    """
+    ranked = sorted(
+        answers,
+        key=lambda a: float(a.get('confidence') or 0.0) * float(a.get('similarity_score') or 0.0),
+        reverse=True
+    )
+
+    packed = []
+    used_tokens = 0
+    dropped_tokens = 0
+
+    for answer in ranked:
+        tokens = count_tokens(render(answer))
+        if used_tokens + tokens <= budget_tokens:
+            packed.append(answer)
+            used_tokens += tokens
+        else:
+            dropped_tokens += tokens
+
+    stats = {
+        'budget_tokens': budget_tokens,
+        'used_tokens': used_tokens,
+        'packed_answers': len(packed),
+        'dropped_answers': len(answers) - len(packed),
+        'dropped_tokens': dropped_tokens
+    }
+    return packed, stats